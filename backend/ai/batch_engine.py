@@ -0,0 +1,269 @@
+"""
+Vectorised simulation of many games at once, used for MCTS playouts and bulk self-play.
+
+Reversi positions are stored as uint64 bitboards (bit index = y * 8 + x), one element per
+game, so legal-move generation, random move choice and flipping are a fixed number of
+NumPy operations per step regardless of the batch size. Gomoku positions are stacked
+boolean planes of shape (games, size, size).
+
+Requires NumPy (optional dependency; callers fall back to the pure-Python AIs without it).
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from board_battle_project.backend.game.types import Grid, Player
+from board_battle_project.backend.ai.reversi_bitboard import grid_to_bitboards
+
+# --- Reversi bitboards ---
+
+FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+NOT_A_FILE = np.uint64(0xFEFEFEFEFEFEFEFE) # Clears x == 0 (bits that wrapped from x == 7)
+NOT_H_FILE = np.uint64(0x7F7F7F7F7F7F7F7F) # Clears x == 7 (bits that wrapped from x == 0)
+
+# (shift, mask) for each of the 8 directions; positive shifts move towards higher bit indexes
+_DIRECTIONS: List[Tuple[int, Optional[np.uint64]]] = []
+for _dy in (-1, 0, 1):
+    for _dx in (-1, 0, 1):
+        if _dx == 0 and _dy == 0:
+            continue
+        _mask = NOT_A_FILE if _dx == 1 else NOT_H_FILE if _dx == -1 else None
+        _DIRECTIONS.append((_dy * 8 + _dx, _mask))
+
+_BIT_INDEX = np.arange(64, dtype=np.uint64)
+
+def _shift(bits: np.ndarray, shift: int, mask: Optional[np.uint64]) -> np.ndarray:
+    shifted = bits << np.uint64(shift) if shift > 0 else bits >> np.uint64(-shift)
+    return shifted & mask if mask is not None else shifted
+
+def legal_moves(own: np.ndarray, opp: np.ndarray) -> np.ndarray:
+    """Bitboard of legal moves for the side owning `own`, per game."""
+    empty = ~(own | opp) & FULL
+    moves = np.zeros_like(own)
+    for shift, mask in _DIRECTIONS:
+        run = _shift(own, shift, mask) & opp
+        for _ in range(5): # A run of opponent discs is at most 6 long
+            run |= _shift(run, shift, mask) & opp
+        moves |= _shift(run, shift, mask) & empty
+    return moves
+
+def compute_flips(own: np.ndarray, opp: np.ndarray, move: np.ndarray) -> np.ndarray:
+    """Discs flipped by playing the single-bit `move` in each game (0 where move == 0)."""
+    flips = np.zeros_like(own)
+    for shift, mask in _DIRECTIONS:
+        run = _shift(move, shift, mask) & opp
+        for _ in range(5):
+            run |= _shift(run, shift, mask) & opp
+        # The run is only captured if it is closed by one of our own discs
+        closed = (_shift(run, shift, mask) & own) != 0
+        flips |= np.where(closed, run, np.uint64(0))
+    return flips
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Number of set bits per element (SWAR, works on any NumPy version)."""
+    bits = bits - ((bits >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    bits = (bits & np.uint64(0x3333333333333333)) + ((bits >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    bits = (bits + (bits >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((bits * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+def random_bit(bits: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Pick one set bit uniformly at random per element (0 where no bit is set)."""
+    unpacked = ((bits[:, None] >> _BIT_INDEX) & np.uint64(1)).astype(bool)
+    weights = rng.random(unpacked.shape) * unpacked
+    choice = np.argmax(weights, axis=1).astype(np.uint64)
+    return np.where(bits != 0, np.uint64(1) << choice, np.uint64(0))
+
+class ReversiBatch:
+    """
+    A batch of Reversi games advanced in lock-step.
+    Boards are kept from the side to move's perspective (`own`/`opp`) and swapped every ply.
+    """
+    def __init__(self, black: np.ndarray, white: np.ndarray, black_to_move: np.ndarray,
+                 rng: Optional[np.random.Generator] = None):
+        self.own = np.where(black_to_move, black, white).astype(np.uint64)
+        self.opp = np.where(black_to_move, white, black).astype(np.uint64)
+        self.black_to_move = black_to_move.astype(bool)
+        self.pass_count = np.zeros(len(black), dtype=np.int8)
+        self.done = np.zeros(len(black), dtype=bool)
+        self.rng = rng or np.random.default_rng()
+
+    @classmethod
+    def new_games(cls, count: int, rng: Optional[np.random.Generator] = None) -> "ReversiBatch":
+        black, white = grid_to_bitboards([
+            [None] * 8, [None] * 8, [None] * 8,
+            [None, None, None, Player.WHITE, Player.BLACK, None, None, None],
+            [None, None, None, Player.BLACK, Player.WHITE, None, None, None],
+            [None] * 8, [None] * 8, [None] * 8,
+        ])
+        return cls.from_bitboards(black, white, True, count, rng)
+
+    @classmethod
+    def from_bitboards(cls, black: int, white: int, black_to_move: bool, count: int,
+                       rng: Optional[np.random.Generator] = None) -> "ReversiBatch":
+        """`count` copies of a single position."""
+        return cls(
+            np.full(count, black, dtype=np.uint64),
+            np.full(count, white, dtype=np.uint64),
+            np.full(count, black_to_move, dtype=bool),
+            rng,
+        )
+
+    @classmethod
+    def from_grid(cls, grid: Grid, player: Player, count: int,
+                  rng: Optional[np.random.Generator] = None) -> "ReversiBatch":
+        black, white = grid_to_bitboards(grid)
+        return cls.from_bitboards(black, white, player == Player.BLACK, count, rng)
+
+    def step(self) -> None:
+        """Play one uniformly random legal move (or a forced pass) in every unfinished game."""
+        active = ~self.done
+        moves = legal_moves(self.own, self.opp)
+        move = random_bit(moves, self.rng)
+        move = np.where(active, move, np.uint64(0))
+        flips = compute_flips(self.own, self.opp, move)
+
+        own = self.own | move | flips
+        opp = self.opp & ~flips
+
+        passed = active & (moves == 0)
+        self.pass_count = np.where(passed, self.pass_count + 1, np.where(active, 0, self.pass_count)).astype(np.int8)
+        self.done |= self.pass_count >= 2
+
+        # Hand the turn over: swap perspectives for games that were still running
+        self.own = np.where(active, opp, own)
+        self.opp = np.where(active, own, opp)
+        self.black_to_move = np.where(active, ~self.black_to_move, self.black_to_move)
+
+    def run(self, max_steps: int = 130) -> "ReversiBatch":
+        """Play every game to the end (60 moves plus passes fits comfortably in max_steps)."""
+        for _ in range(max_steps):
+            if self.done.all():
+                break
+            self.step()
+        return self
+
+    def black_white(self) -> Tuple[np.ndarray, np.ndarray]:
+        black = np.where(self.black_to_move, self.own, self.opp)
+        white = np.where(self.black_to_move, self.opp, self.own)
+        return black, white
+
+    def disc_difference(self) -> np.ndarray:
+        """Black discs minus white discs per game."""
+        black, white = self.black_white()
+        return popcount(black) - popcount(white)
+
+    def winners(self) -> np.ndarray:
+        """+1 where Black wins, -1 where White wins, 0 for draws or unfinished games."""
+        return np.where(self.done, np.sign(self.disc_difference()), 0)
+
+# --- Gomoku planes ---
+
+def _shift_planes(planes: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    """out[:, y, x] = planes[:, y - dy, x - dx], zero-filled at the edges."""
+    out = np.zeros_like(planes)
+    size = planes.shape[1]
+    ys_dst = slice(max(dy, 0), size + min(dy, 0))
+    ys_src = slice(max(-dy, 0), size + min(-dy, 0))
+    xs_dst = slice(max(dx, 0), size + min(dx, 0))
+    xs_src = slice(max(-dx, 0), size + min(-dx, 0))
+    out[:, ys_dst, xs_dst] = planes[:, ys_src, xs_src]
+    return out
+
+def five_in_row(planes: np.ndarray) -> np.ndarray:
+    """True for each game whose plane contains five consecutive stones in any direction."""
+    found = np.zeros(planes.shape[0], dtype=bool)
+    for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        run = planes.copy()
+        for k in range(1, 5):
+            run &= _shift_planes(planes, k * dx, k * dy)
+        found |= run.reshape(planes.shape[0], -1).any(axis=1)
+    return found
+
+class GomokuBatch:
+    """
+    A batch of Gomoku games advanced in lock-step.
+    Random moves are restricted to empty cells within `radius` of an existing stone,
+    like GomokuAIUtils.get_neighbor_moves, which keeps playouts local and meaningful.
+    """
+    def __init__(self, black: np.ndarray, white: np.ndarray, black_to_move: np.ndarray,
+                 radius: int = 1, rng: Optional[np.random.Generator] = None):
+        self.black = black.astype(bool)
+        self.white = white.astype(bool)
+        self.black_to_move = black_to_move.astype(bool)
+        self.size = self.black.shape[1]
+        self.radius = radius
+        self.done = np.zeros(len(black), dtype=bool)
+        self.winner = np.zeros(len(black), dtype=np.int8) # +1 Black, -1 White, 0 draw/unfinished
+        self.rng = rng or np.random.default_rng()
+
+    @classmethod
+    def new_games(cls, count: int, size: int = 15, radius: int = 1,
+                  rng: Optional[np.random.Generator] = None) -> "GomokuBatch":
+        empty = np.zeros((count, size, size), dtype=bool)
+        return cls(empty, empty.copy(), np.ones(count, dtype=bool), radius, rng)
+
+    @classmethod
+    def from_grid(cls, grid: Grid, player: Player, count: int, radius: int = 1,
+                  rng: Optional[np.random.Generator] = None) -> "GomokuBatch":
+        black = np.array([[cell == Player.BLACK for cell in row] for row in grid], dtype=bool)
+        white = np.array([[cell == Player.WHITE for cell in row] for row in grid], dtype=bool)
+        return cls(
+            np.broadcast_to(black, (count,) + black.shape).copy(),
+            np.broadcast_to(white, (count,) + white.shape).copy(),
+            np.full(count, player == Player.BLACK, dtype=bool),
+            radius, rng,
+        )
+
+    def _candidates(self) -> np.ndarray:
+        occupied = self.black | self.white
+        near = np.zeros_like(occupied)
+        for dy in range(-self.radius, self.radius + 1):
+            for dx in range(-self.radius, self.radius + 1):
+                near |= _shift_planes(occupied, dx, dy)
+        candidates = near & ~occupied
+        # Empty boards start in the centre
+        empty_board = ~occupied.reshape(len(occupied), -1).any(axis=1)
+        candidates[empty_board, self.size // 2, self.size // 2] = True
+        return candidates
+
+    def step(self) -> None:
+        """Play one random move in every unfinished game."""
+        count = len(self.black)
+        candidates = self._candidates().reshape(count, -1)
+        active = ~self.done & candidates.any(axis=1)
+        # No candidates left means the board is full: a draw
+        self.done |= ~candidates.any(axis=1)
+
+        weights = self.rng.random(candidates.shape) * candidates
+        choice = np.argmax(weights, axis=1)
+        move = np.zeros_like(candidates)
+        move[np.arange(count), choice] = active
+        move = move.reshape(self.black.shape)
+
+        black_moves = self.black_to_move[:, None, None]
+        self.black |= move & black_moves
+        self.white |= move & ~black_moves
+
+        mover = np.where(black_moves, self.black, self.white)
+        won = active & five_in_row(mover)
+        self.winner = np.where(won, np.where(self.black_to_move, 1, -1), self.winner).astype(np.int8)
+        self.done |= won
+        self.black_to_move = np.where(active, ~self.black_to_move, self.black_to_move)
+
+    def run(self, max_steps: Optional[int] = None) -> "GomokuBatch":
+        for _ in range(max_steps or self.size * self.size):
+            if self.done.all():
+                break
+            self.step()
+        return self
+
+    def winners(self) -> np.ndarray:
+        return self.winner.astype(np.int64)
+
+def self_play_reversi(games: int, seed: Optional[int] = None) -> np.ndarray:
+    """Play `games` random Reversi games from the opening; returns final disc differences (Black - White)."""
+    return ReversiBatch.new_games(games, np.random.default_rng(seed)).run().disc_difference()
+
+def self_play_gomoku(games: int, size: int = 15, seed: Optional[int] = None) -> np.ndarray:
+    """Play `games` random Gomoku games from an empty board; returns winners (+1 Black, -1 White, 0 draw)."""
+    return GomokuBatch.new_games(games, size, rng=np.random.default_rng(seed)).run().winners()
@@ -1,8 +1,13 @@
-from typing import Tuple, List, Optional
+from typing import Dict, Tuple, List, Optional
 import random
-from board_battle_project.backend.models import Player
+from board_battle_project.backend.game.types import Player
+from board_battle_project.backend.game.base import AbstractBoard
 from board_battle_project.backend.game.gomoku import GomokuGame
 from board_battle_project.backend.ai.reversi_ai import AIStrategy
+from board_battle_project.backend.ai.search import PVSearch, SearchPosition, WIN_SCORE
+
+DEFENSE_FACTOR = 1.5
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)] # Horizontal, Vertical, Diagonal (\), Anti-diagonal (/)
 
 class GomokuAIUtils:
     @staticmethod
@@ -19,59 +24,31 @@ class GomokuAIUtils:
             else:
                 return 0
 
+        # Add tiny noise to break ties and add variety
+        return GomokuAIUtils.static_score(game.board, player) + random.randint(-5, 5)
+
+    @staticmethod
+    def static_score(board: AbstractBoard, player: Player) -> int:
         opponent = Player.WHITE if player == Player.BLACK else Player.BLACK
-        
-        board = game.board.get_grid()
-        size = game.board.size
 
-        my_score = GomokuAIUtils.evaluate_lines(board, size, player)
-        op_score = GomokuAIUtils.evaluate_lines(board, size, opponent)
+        my_score = GomokuAIUtils.evaluate_lines(board, player)
+        op_score = GomokuAIUtils.evaluate_lines(board, opponent)
 
         # Defense factor: We should be very afraid of opponent's high scores
         # Increased to 1.5 to mitigate first-move advantage
-        # Add tiny noise to break ties and add variety
-        return my_score - int(op_score * 1.5) + random.randint(-5, 5)
+        return my_score - int(op_score * DEFENSE_FACTOR)
+
+    # Longest pattern in evaluate_single_line is 6 cells, so any match that contains one of
+    # the player's stones lies within 5 cells of it. Sparse boards trim lines to this margin.
+    PATTERN_MARGIN = 5
 
     @staticmethod
-    def evaluate_lines(board, size, player) -> int:
+    def evaluate_lines(board: AbstractBoard, player) -> int:
         score = 0
-        # Convert board lines to strings for easier pattern matching
-        # 1 = player, 0 = empty, 2 = opponent/block
-        # Actually, we can process each line segment
-        
-        lines = []
-        
-        # Rows
-        for y in range(size):
-            lines.append(board[y])
-            
-        # Cols
-        for x in range(size):
-            col = [board[y][x] for y in range(size)]
-            lines.append(col)
-            
-        # Diagonals
-        # (1, 1)
-        for k in range(size * 2 - 1):
-            # Diagonal \
-            line = []
-            for y in range(size):
-                x = y - (size - 1) + k
-                if 0 <= x < size:
-                    line.append(board[y][x])
-            if len(line) >= 5: lines.append(line)
-            
-            # Diagonal /
-            line2 = []
-            for y in range(size):
-                x = k - y
-                if 0 <= x < size:
-                    line2.append(board[y][x])
-            if len(line2) >= 5: lines.append(line2)
-
-        for line in lines:
+        # Diagonals shorter than 5 can never hold a five, so they are skipped
+        for line in board.iter_lines(min_length=5, margin=GomokuAIUtils.PATTERN_MARGIN):
             score += GomokuAIUtils.evaluate_single_line(line, player)
-            
+
         return score
 
     @staticmethod
@@ -133,25 +110,64 @@ class GomokuAIUtils:
 
         return score
 
+    @staticmethod
+    def score_move(board: AbstractBoard, x: int, y: int, player: Player) -> int:
+        """
+        Cheap move-ordering score: how much playing (x, y) changes static_score, looking only at
+        the four lines through the cell (a pattern touching the cell lies within PATTERN_MARGIN of it).
+        """
+        opponent = Player.WHITE if player == Player.BLACK else Player.BLACK
+        margin = GomokuAIUtils.PATTERN_MARGIN
+        gain = 0
+        loss = 0
+        for dx, dy in DIRECTIONS:
+            line = []
+            center = 0
+            for i in range(-margin, margin + 1):
+                nx, ny = x + dx * i, y + dy * i
+                if board.is_valid_coordinate(nx, ny):
+                    if i == 0:
+                        center = len(line)
+                    line.append(board.get_stone(nx, ny))
+            before_mine = GomokuAIUtils.evaluate_single_line(line, player)
+            before_theirs = GomokuAIUtils.evaluate_single_line(line, opponent)
+            line[center] = player
+            gain += GomokuAIUtils.evaluate_single_line(line, player) - before_mine
+            loss += before_theirs - GomokuAIUtils.evaluate_single_line(line, opponent) # Blocked threats
+        return gain + int(loss * DEFENSE_FACTOR)
+
+    @staticmethod
+    def makes_five(board: AbstractBoard, x: int, y: int, player: Player) -> bool:
+        """True if the stone at (x, y) completes five in a row for `player` (same rule as GomokuGame)."""
+        for dx, dy in DIRECTIONS:
+            count = 1
+            for sign in (1, -1):
+                for i in range(1, 5):
+                    if board.get_stone(x + dx * i * sign, y + dy * i * sign) == player:
+                        count += 1
+                    else:
+                        break
+            if count >= 5:
+                return True
+        return False
+
     @staticmethod
     def get_neighbor_moves(game: GomokuGame, radius: int = 1) -> List[Tuple[int, int]]:
         """Returns empty spots that are within `radius` of existing stones."""
         moves = set()
-        board = game.board.get_grid()
-        size = game.board.size
+        board = game.board
+        size = board.size
         has_stones = False
-        
-        for y in range(size):
-            for x in range(size):
-                if board[y][x] is not None:
-                    has_stones = True
-                    for dy in range(-radius, radius + 1):
-                        for dx in range(-radius, radius + 1):
-                            if dy == 0 and dx == 0: continue
-                            nx, ny = x + dx, y + dy
-                            if 0 <= nx < size and 0 <= ny < size and board[ny][nx] is None:
-                                moves.add((nx, ny))
-        
+
+        for x, y, _ in board.iter_stones():
+            has_stones = True
+            for dy in range(-radius, radius + 1):
+                for dx in range(-radius, radius + 1):
+                    if dy == 0 and dx == 0: continue
+                    nx, ny = x + dx, y + dy
+                    if board.is_empty(nx, ny):
+                        moves.add((nx, ny))
+
         if not has_stones:
             return [(size // 2, size // 2)] # First move center
         
@@ -168,9 +184,9 @@ class GreedyGomokuAI(AIStrategy):
         best_moves = [valid_moves[0]]
 
         for x, y in valid_moves:
-            game.board._grid[y][x] = player
+            game.board.place_stone(x, y, player)
             score = GomokuAIUtils.evaluate_board(game, player)
-            game.board._grid[y][x] = None
+            game.board.clear_cell(x, y)
 
             if score > best_score:
                 best_score = score
@@ -180,95 +196,95 @@ class GreedyGomokuAI(AIStrategy):
         
         return random.choice(best_moves)
 
+# Zobrist keys for the search's transposition table, created on first use
+_ZOBRIST: Dict[Tuple[int, int, Player], int] = {}
+
+def _zobrist(x: int, y: int, player: Player) -> int:
+    key = _ZOBRIST.get((x, y, player))
+    if key is None: # setdefault: searches in other AI threads must get the same key
+        key = _ZOBRIST.setdefault((x, y, player), random.getrandbits(64))
+    return key
+
+class GomokuSearchPosition(SearchPosition):
+    """
+    Searches directly on the game's board with place_stone/clear_cell (every move is undone).
+    Scores are static_score from `root_player`'s side, negated when the opponent is to move.
+    """
+    def __init__(self, game: GomokuGame, player: Player, root_width: int = 15, inner_width: int = 10):
+        self.game = game
+        self.board = game.board
+        self.player = player
+        self.root_player = player
+        self.root_width = root_width
+        self.inner_width = inner_width
+        self.hash = 0
+        self.stone_count = 0
+        for x, y, stone in self.board.iter_stones():
+            self.hash ^= _zobrist(x, y, stone)
+            self.stone_count += 1
+        self._stack: List[Tuple[int, int, bool]] = [] # (x, y, made five)
+
+    @property
+    def side(self) -> Player:
+        return self.player
+
+    def key(self):
+        return self.hash, self.player
+
+    def generate_moves(self, ply: int):
+        # Radius 2 at the root to catch disjoint threats, radius 1 deeper to save time
+        if ply == 0:
+            moves = GomokuAIUtils.get_neighbor_moves(self.game, radius=2)
+            random.shuffle(moves) # Vary play between equally good moves
+            width = self.root_width
+        else:
+            moves = GomokuAIUtils.get_neighbor_moves(self.game, radius=1)
+            width = self.inner_width
+        if len(moves) > 1:
+            scores = {move: GomokuAIUtils.score_move(self.board, move[0], move[1], self.player) for move in moves}
+            moves.sort(key=scores.__getitem__, reverse=True)
+        return moves[:width]
+
+    def make_move(self, move: Tuple[int, int]) -> None:
+        x, y = move
+        self.board.place_stone(x, y, self.player)
+        self._stack.append((x, y, GomokuAIUtils.makes_five(self.board, x, y, self.player)))
+        self.hash ^= _zobrist(x, y, self.player)
+        self.stone_count += 1
+        self.player = Player.WHITE if self.player == Player.BLACK else Player.BLACK
+
+    def undo_move(self) -> None:
+        x, y, _ = self._stack.pop()
+        self.player = Player.WHITE if self.player == Player.BLACK else Player.BLACK
+        self.board.clear_cell(x, y)
+        self.hash ^= _zobrist(x, y, self.player)
+        self.stone_count -= 1
+
+    def evaluate(self) -> float:
+        score = GomokuAIUtils.static_score(self.board, self.root_player)
+        return score if self.player == self.root_player else -score
+
+    def terminal_score(self) -> Optional[float]:
+        if self._stack and self._stack[-1][2]:
+            return -WIN_SCORE # The previous move made five, so the side to move has lost
+        if self.stone_count >= self.board.size * self.board.size:
+            return 0
+        return None
+
 class MinimaxGomokuAI(AIStrategy):
+    """
+    Minimax AI for Gomoku: principal-variation search (see search.PVSearch) over the best
+    candidate moves near existing stones, ranked by GomokuAIUtils.score_move.
+    """
     def __init__(self, depth: int = 2):
         self.depth = depth
+        self.search = PVSearch(depth, aspiration=1000)
 
     def make_move(self, game: GomokuGame, player: Player) -> Tuple[int, int]:
-        valid_moves = GomokuAIUtils.get_neighbor_moves(game, radius=2) # Radius 2
-        if not valid_moves:
-            return game.board.size // 2, game.board.size // 2
-        
-        # Heuristic sort
-        scored_moves = []
-        for x, y in valid_moves:
-             game.board._grid[y][x] = player
-             score = GomokuAIUtils.evaluate_board(game, player)
-             game.board._grid[y][x] = None
-             scored_moves.append((score, (x, y)))
-        
-        scored_moves.sort(key=lambda x: x[0], reverse=True)
-        
-        # Dynamic beam width based on stage? Fixed for now.
-        # Keep top 15 moves to ensure we consider blocking moves (which might have high defensive score)
-        sorted_valid_moves = [m[1] for m in scored_moves[:15]] 
-        
-        best_eval = float('-inf')
-        best_moves = [sorted_valid_moves[0]]
-        alpha = float('-inf')
-        beta = float('inf')
-
-        for x, y in sorted_valid_moves:
-            game.board._grid[y][x] = player
-            
-            eval = self._minimax(game, self.depth - 1, alpha, beta, False, player)
-            game.board._grid[y][x] = None
-
-            if eval > best_eval:
-                best_eval = eval
-                best_moves = [(x, y)]
-            elif eval == best_eval:
-                best_moves.append((x, y))
-            
-            alpha = max(alpha, eval)
-            if beta <= alpha:
-                break
-        
-        return random.choice(best_moves)
-
-    def _minimax(self, game: GomokuGame, depth: int, alpha: float, beta: float, maximizing: bool, original_player: Player) -> float:
-        current_score = GomokuAIUtils.evaluate_board(game, original_player)
-        # Terminal check
-        if abs(current_score) > 5000000: 
-            return current_score
-
-        if depth == 0:
-            return current_score
+        if not any(True for _ in game.board.iter_stones()):
+            return game.board.size // 2, game.board.size // 2 # First move center
 
-        current_player = original_player if maximizing else (Player.WHITE if original_player == Player.BLACK else Player.BLACK)
-        valid_moves = GomokuAIUtils.get_neighbor_moves(game, radius=1) # Radius 1 for deeper recursion to save time
-        
-        if len(valid_moves) > 10:
-             temp_scores = []
-             for x, y in valid_moves:
-                 game.board._grid[y][x] = current_player
-                 s = GomokuAIUtils.evaluate_board(game, current_player) # Evaluate for *current* player's perspective
-                 game.board._grid[y][x] = None
-                 temp_scores.append((s, (x, y)))
-             
-             # Sort descending (best moves first)
-             temp_scores.sort(key=lambda x: x[0], reverse=True) 
-             valid_moves = [m[1] for m in temp_scores[:10]]
-
-        if maximizing:
-            max_eval = float('-inf')
-            for x, y in valid_moves:
-                game.board._grid[y][x] = current_player
-                eval = self._minimax(game, depth - 1, alpha, beta, False, original_player)
-                game.board._grid[y][x] = None
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for x, y in valid_moves:
-                game.board._grid[y][x] = current_player
-                eval = self._minimax(game, depth - 1, alpha, beta, True, original_player)
-                game.board._grid[y][x] = None
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval
\ No newline at end of file
+        move, _ = self.search.search(GomokuSearchPosition(game, player))
+        if move is None:
+            return game.board.size // 2, game.board.size // 2
+        return move
@@ -0,0 +1,107 @@
+import math
+import random
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from board_battle_project.backend.game.types import Player
+from board_battle_project.backend.game.reversi import ReversiGame
+from board_battle_project.backend.ai.reversi_ai import AIStrategy
+from board_battle_project.backend.ai.batch_engine import ReversiBatch
+from board_battle_project.backend.ai.reversi_bitboard import flips, grid_to_bitboards, iter_bits, legal_moves
+
+class _Node:
+    """Search node; boards are from the perspective of the side to move."""
+    __slots__ = ("own", "opp", "black_to_move", "move", "parent", "children", "untried", "visits", "wins", "terminal")
+
+    def __init__(self, own: int, opp: int, black_to_move: bool, move: Optional[int], parent: Optional["_Node"]):
+        self.own = own
+        self.opp = opp
+        self.black_to_move = black_to_move
+        self.move = move # Bit of the move that led here, 0 for a pass, None for the root
+        self.parent = parent
+        self.children: List["_Node"] = []
+        self.visits = 0
+        self.wins = 0.0 # From the perspective of the player who moved into this node
+
+        # The tree works on one position at a time: scalar bitboards (batch_engine is for the playouts)
+        moves = legal_moves(own, opp)
+        if moves:
+            self.untried = list(iter_bits(moves))
+        elif legal_moves(opp, own):
+            self.untried = [0] # Forced pass
+        else:
+            self.untried = []
+        self.terminal = not self.untried
+
+    def play(self, move: int) -> "_Node":
+        flipped = flips(self.own, self.opp, move) if move else 0
+        own = self.own | move | flipped
+        opp = self.opp & ~flipped
+        child = _Node(opp, own, not self.black_to_move, move, self)
+        self.children.append(child)
+        return child
+
+    def best_child(self, exploration: float) -> "_Node":
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda c: c.wins / c.visits + exploration * math.sqrt(log_visits / c.visits))
+
+class MCTSReversiAI(AIStrategy):
+    """
+    Monte Carlo Tree Search (UCT) for Reversi.
+    Each selected leaf is scored by a whole batch of random playouts run in lock-step by
+    ReversiBatch, so the per-playout cost is a few vectorised NumPy operations.
+    """
+    def __init__(self, time_limit: float = 1.0, playouts_per_leaf: int = 32, exploration: float = 1.4,
+                 max_iterations: int = 5000):
+        self.time_limit = time_limit
+        self.playouts_per_leaf = playouts_per_leaf
+        self.exploration = exploration
+        self.max_iterations = max_iterations
+
+    def make_move(self, game: ReversiGame, player: Player) -> Tuple[int, int]:
+        valid_moves = game.board.get_valid_moves(player)
+        if not valid_moves:
+            return -1, -1
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        black, white = grid_to_bitboards(game.board.get_grid())
+        is_black = player == Player.BLACK
+        root = _Node(black if is_black else white, white if is_black else black, is_black, None, None)
+        rng = np.random.default_rng()
+
+        deadline = time.monotonic() + self.time_limit
+        for _ in range(self.max_iterations):
+            if time.monotonic() > deadline:
+                break
+
+            # Selection
+            node = root
+            while not node.untried and node.children:
+                node = node.best_child(self.exploration)
+
+            # Expansion
+            if node.untried:
+                move = node.untried.pop(random.randrange(len(node.untried)))
+                node = node.play(move)
+
+            # Simulation: a batch of playouts from the leaf (or the exact result if it is terminal)
+            black_bits, white_bits = (node.own, node.opp) if node.black_to_move else (node.opp, node.own)
+            count = 1 if node.terminal else self.playouts_per_leaf
+            batch = ReversiBatch.from_bitboards(black_bits, white_bits, node.black_to_move, count, rng).run()
+            black_score = float(((batch.winners() + 1) / 2).sum()) # Draws count as half a win
+
+            # Backpropagation
+            while node is not None:
+                node.visits += count
+                mover_is_black = not node.black_to_move
+                node.wins += black_score if mover_is_black else count - black_score
+                node = node.parent
+
+        if not root.children:
+            return random.choice(valid_moves)
+        best = max(root.children, key=lambda c: c.visits)
+        index = best.move.bit_length() - 1
+        return index % 8, index // 8
@@ -2,8 +2,11 @@ from abc import ABC, abstractmethod
 from typing import Tuple, Optional
 import random
 
-from board_battle_project.backend.models import Player
+from board_battle_project.backend.game.types import Player
 from board_battle_project.backend.game.reversi import ReversiGame # Assuming AI is for Reversi for now
+from board_battle_project.backend.ai.reversi_bitboard import flips, grid_to_bitboards, iter_bits, legal_moves
+from board_battle_project.backend.ai.reversi_eval import evaluate
+from board_battle_project.backend.ai.search import PVSearch, SearchPosition, WIN_SCORE
 
 class AIStrategy(ABC):
     @abstractmethod
@@ -74,153 +77,92 @@ class GreedyReversiAI(AIStrategy):
             
         return random.choice(best_moves) if best_moves else (-1, -1)
 
+# Static move order for the search: corners first, X-squares (diagonal to a corner) last
+_SQUARE_PRIORITY = [
+    9, 1, 5, 4, 4, 5, 1, 9,
+    1, 0, 3, 3, 3, 3, 0, 1,
+    5, 3, 6, 5, 5, 6, 3, 5,
+    4, 3, 5, 2, 2, 5, 3, 4,
+    4, 3, 5, 2, 2, 5, 3, 4,
+    5, 3, 6, 5, 5, 6, 3, 5,
+    1, 0, 3, 3, 3, 3, 0, 1,
+    9, 1, 5, 4, 4, 5, 1, 9,
+]
+PASS_MOVE = -1
+
+class ReversiSearchPosition(SearchPosition):
+    """Bitboard position for PVSearch; `own` always belongs to the side to move."""
+    def __init__(self, own: int, opp: int, black_to_move: bool):
+        self.own = own
+        self.opp = opp
+        self.black_to_move = black_to_move
+        self._stack = []
+
+    @property
+    def side(self) -> bool:
+        return self.black_to_move
+
+    def key(self):
+        return self.own, self.opp
+
+    def generate_moves(self, ply: int):
+        moves = legal_moves(self.own, self.opp)
+        if not moves:
+            return [PASS_MOVE] # terminal_score has already ruled out a finished game
+        indexes = [bit.bit_length() - 1 for bit in iter_bits(moves)]
+        if ply == 0:
+            random.shuffle(indexes) # Vary play between equally good moves
+        indexes.sort(key=lambda i: _SQUARE_PRIORITY[i], reverse=True)
+        return indexes
+
+    def make_move(self, move: int) -> None:
+        self._stack.append((self.own, self.opp))
+        if move == PASS_MOVE:
+            own, opp = self.own, self.opp
+        else:
+            bit = 1 << move
+            flipped = flips(self.own, self.opp, bit)
+            own = self.own | bit | flipped
+            opp = self.opp & ~flipped
+        self.own, self.opp = opp, own
+        self.black_to_move = not self.black_to_move
+
+    def undo_move(self) -> None:
+        self.own, self.opp = self._stack.pop()
+        self.black_to_move = not self.black_to_move
+
+    def evaluate(self) -> float:
+        return evaluate(self.own, self.opp)
+
+    def terminal_score(self) -> Optional[float]:
+        if legal_moves(self.own, self.opp) or legal_moves(self.opp, self.own):
+            return None
+        difference = self.own.bit_count() - self.opp.bit_count()
+        if difference > 0:
+            return WIN_SCORE + difference
+        if difference < 0:
+            return -WIN_SCORE + difference
+        return 0
+
 class MinimaxReversiAI(AIStrategy):
     """
-    Minimax AI for Reversi with Alpha-Beta pruning.
+    Minimax AI for Reversi: principal-variation search (see search.PVSearch) on bitboards.
     """
     def __init__(self, depth: int = 3):
         self.depth = depth
+        self.search = PVSearch(depth, aspiration=8)
 
     def make_move(self, game: ReversiGame, player: Player) -> Tuple[int, int]:
-        best_score = float('-inf')
-        
         valid_moves = game.board.get_valid_moves(player)
         if not valid_moves:
             return -1, -1
-            
-        # Initialize with all valid moves to allow random choice if all evals are equal (e.g. start)
-        best_moves = valid_moves[:] 
-
-        for move in valid_moves:
-            x, y = move
-            # Create a deep copy of the game state for simulation
-            sim_game = ReversiGame(game.board_size)
-            sim_game.current_player = game.current_player
-            sim_game.is_game_over = game.is_game_over
-            sim_game.winner = game.winner
-            sim_game.message = game.message
-            sim_game.last_move = game.last_move
-            sim_game.pass_count = game.pass_count
-            sim_game.board._grid = [row[:] for row in game.board._grid] # Deep copy the board grid
-
-            # Simulate the move
-            # Note: make_move in ReversiGame will update current_player and check game over
-            success, _ = sim_game.make_move(x, y) 
-            
-            if success:
-                # Evaluate the state after the move
-                # Minimax assumes the opponent will play optimally (to minimize our score)
-                score = self._minimax(sim_game, self.depth - 1, float('-inf'), float('inf'), False, player)
-                
-                if score > best_score:
-                    best_score = score
-                    best_moves = [(x, y)]
-                elif score == best_score:
-                    best_moves.append((x, y))
-
-        return random.choice(best_moves) if best_moves else (-1, -1)
-
-    def _minimax(self, game: ReversiGame, depth: int, alpha: float, beta: float, maximizing_player: bool, original_player: Player) -> float:
-        if depth == 0 or game.is_game_over:
-            return self._evaluate_board(game, original_player)
-
-        current_ai_player = original_player if maximizing_player else (Player.WHITE if original_player == Player.BLACK else Player.BLACK)
-        
-        valid_moves = game.board.get_valid_moves(current_ai_player)
-
-        if not valid_moves: # If current player has no moves, force a pass
-            sim_game_pass = ReversiGame(game.board_size)
-            sim_game_pass.current_player = game.current_player
-            sim_game_pass.is_game_over = game.is_game_over
-            sim_game_pass.winner = game.winner
-            sim_game_pass.message = game.message
-            sim_game_pass.last_move = game.last_move
-            sim_game_pass.pass_count = game.pass_count
-            sim_game_pass.board._grid = [row[:] for row in game.board._grid]
-            
-            sim_game_pass._switch_player() # Simulate pass
-            # Check if game ends after this pass
-            if game.pass_count + 1 >= 2 and not game.board.get_valid_moves(sim_game_pass.current_player):
-                sim_game_pass.is_game_over = True # Both players passed consecutively
-            
-            return self._minimax(sim_game_pass, depth - 1, alpha, beta, not maximizing_player, original_player)
-
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in valid_moves:
-                x, y = move
-                sim_game = ReversiGame(game.board_size)
-                sim_game.current_player = game.current_player
-                sim_game.is_game_over = game.is_game_over
-                sim_game.winner = game.winner
-                sim_game.message = game.message
-                sim_game.last_move = game.last_move
-                sim_game.pass_count = game.pass_count
-                sim_game.board._grid = [row[:] for row in game.board._grid]
-                
-                sim_game.make_move(x, y) # This will also switch player internally
-                
-                eval = self._minimax(sim_game, depth - 1, alpha, beta, False, original_player)
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in valid_moves:
-                x, y = move
-                sim_game = ReversiGame(game.board_size)
-                sim_game.current_player = game.current_player
-                sim_game.is_game_over = game.is_game_over
-                sim_game.winner = game.winner
-                sim_game.message = game.message
-                sim_game.last_move = game.last_move
-                sim_game.pass_count = game.pass_count
-                sim_game.board._grid = [row[:] for row in game.board._grid]
-                
-                sim_game.make_move(x, y) # This will also switch player internally
-
-                eval = self._minimax(sim_game, depth - 1, alpha, beta, True, original_player)
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval
-
-    def _evaluate_board(self, game: ReversiGame, original_player: Player) -> float:
-        """
-        Evaluation function for Reversi.
-        Calculates a score based on disc count, corners, and mobility.
-        """
-        if game.is_game_over:
-            if game.winner == original_player:
-                return float('inf') # Win
-            elif game.winner == (Player.WHITE if original_player == Player.BLACK else Player.BLACK):
-                return float('-inf') # Loss
-            else:
-                return 0 # Draw
-
-        score = 0
-        opponent_player = Player.WHITE if original_player == Player.BLACK else Player.BLACK
-        
-        # Disc count difference (major factor)
-        player_discs = sum(row.count(original_player) for row in game.board._grid)
-        opponent_discs = sum(row.count(opponent_player) for row in game.board._grid)
-        score += (player_discs - opponent_discs) * 1
-        
-        # Corners (highly valuable)
-        corners = [(0, 0), (0, game.board_size - 1), (game.board_size - 1, 0), (game.board_size - 1, game.board_size - 1)]
-        for x, y in corners:
-            if game.board.get_stone(x, y) == original_player:
-                score += 20 # High value for owning corners
-            elif game.board.get_stone(x, y) == opponent_player:
-                score -= 20 # Penalty for opponent owning corners
-
-        # Mobility (number of valid moves)
-        player_mobility = len(game.board.get_valid_moves(original_player))
-        opponent_mobility = len(game.board.get_valid_moves(opponent_player))
-        score += (player_mobility - opponent_mobility) * 0.5 # Encourage mobility
-
-        return score + random.uniform(-0.5, 0.5) # Add random noise
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        black, white = grid_to_bitboards(game.board._grid)
+        is_black = player == Player.BLACK
+        position = ReversiSearchPosition(black if is_black else white, white if is_black else black, is_black)
+        move, score = self.search.search(position)
+        if move is None or move == PASS_MOVE:
+            return random.choice(valid_moves)
+        return move % 8, move // 8
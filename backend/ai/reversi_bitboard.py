@@ -0,0 +1,126 @@
+"""
+Scalar Reversi bitboards on plain Python ints (bit index = y * 8 + x).
+Used by the Minimax evaluator and search; see batch_engine for the NumPy batch version.
+"""
+from typing import List, Tuple
+
+from board_battle_project.backend.game.types import Grid, Player
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE # Clears x == 0 (bits that wrapped from x == 7)
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F # Clears x == 7 (bits that wrapped from x == 0)
+A_FILE = 0x0101010101010101
+H_FILE = 0x8080808080808080
+RANK_1 = 0x00000000000000FF # y == 0
+RANK_8 = 0xFF00000000000000 # y == 7
+BORDER = A_FILE | H_FILE | RANK_1 | RANK_8
+CORNERS = 0x8100000000000081
+
+# (shift, mask) for each of the 8 directions; positive shifts move towards higher bit indexes
+DIRECTIONS: List[Tuple[int, int]] = [
+    (-9, NOT_H_FILE), (-8, FULL), (-7, NOT_A_FILE),
+    (-1, NOT_H_FILE), (1, NOT_A_FILE),
+    (7, NOT_H_FILE), (8, FULL), (9, NOT_A_FILE),
+]
+
+def shift(bits: int, amount: int, mask: int) -> int:
+    return ((bits << amount) if amount > 0 else (bits >> -amount)) & mask
+
+def grid_to_bitboards(grid: Grid) -> Tuple[int, int]:
+    """Convert an 8x8 grid to (black, white) bitboards."""
+    black = white = 0
+    bit = 1
+    for row in grid:
+        for cell in row:
+            if cell is Player.BLACK:
+                black |= bit
+            elif cell is Player.WHITE:
+                white |= bit
+            bit <<= 1
+    return black, white
+
+def legal_moves(own: int, opp: int) -> int:
+    """Bitboard of legal moves for the side owning `own`."""
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for amount, mask in DIRECTIONS:
+        run = shift(own, amount, mask) & opp
+        for _ in range(5): # A run of opponent discs is at most 6 long
+            run |= shift(run, amount, mask) & opp
+        moves |= shift(run, amount, mask) & empty
+    return moves
+
+def flips(own: int, opp: int, move: int) -> int:
+    """Discs flipped by playing the single-bit `move`."""
+    flipped = 0
+    for amount, mask in DIRECTIONS:
+        run = shift(move, amount, mask) & opp
+        for _ in range(5):
+            run |= shift(run, amount, mask) & opp
+        if shift(run, amount, mask) & own:
+            flipped |= run
+    return flipped
+
+def iter_bits(bits: int):
+    """Yield each set bit of `bits` as a single-bit int."""
+    while bits:
+        low = bits & -bits
+        yield low
+        bits ^= low
+
+def _line_masks(dx: int, dy: int) -> List[int]:
+    """Masks of every full line of the board in direction (dx, dy)."""
+    masks = []
+    for y in range(8):
+        for x in range(8):
+            # Only start a line on a cell whose predecessor is off the board
+            px, py = x - dx, y - dy
+            if 0 <= px < 8 and 0 <= py < 8:
+                continue
+            mask = 0
+            cx, cy = x, y
+            while 0 <= cx < 8 and 0 <= cy < 8:
+                mask |= 1 << (cy * 8 + cx)
+                cx, cy = cx + dx, cy + dy
+            masks.append(mask)
+    return masks
+
+# Per axis: (forward shift, backward shift, cells with an off-board neighbour on the axis, line masks)
+_AXES = [
+    ((1, NOT_A_FILE), (-1, NOT_H_FILE), A_FILE | H_FILE, _line_masks(1, 0)),
+    ((8, FULL), (-8, FULL), RANK_1 | RANK_8, _line_masks(0, 1)),
+    ((9, NOT_A_FILE), (-9, NOT_H_FILE), BORDER, _line_masks(1, 1)),
+    ((7, NOT_H_FILE), (-7, NOT_A_FILE), BORDER, _line_masks(-1, 1)),
+]
+
+def axis_protection(filled: int) -> List[Tuple[Tuple[int, int], Tuple[int, int], int]]:
+    """
+    Per axis: (forward shift, backward shift, cells that cannot be flipped along that axis
+    because they touch the board edge or their line is full). Shared by both colours.
+    """
+    protected = []
+    for forward, backward, edge, lines in _AXES:
+        full_lines = 0
+        for line in lines:
+            if filled & line == line:
+                full_lines |= line
+        protected.append((forward, backward, edge | full_lines))
+    return protected
+
+def stable_discs(own: int, opp: int, protection=None) -> int:
+    """
+    Conservative estimate of `own` discs that can never be flipped.
+    A disc is stable when, on each of the four axes, its line is full, it touches the
+    board edge, or it is next to another stable disc of the same colour.
+    """
+    if protection is None:
+        protection = axis_protection(own | opp)
+
+    stable = 0
+    while True:
+        candidate = own
+        for (f_amount, f_mask), (b_amount, b_mask), static in protection:
+            candidate &= static | shift(stable, f_amount, f_mask) | shift(stable, b_amount, b_mask)
+        if candidate == stable:
+            return stable
+        stable = candidate
@@ -0,0 +1,200 @@
+"""
+Shared alpha-beta search used by the Minimax AIs.
+
+Principal-variation search (negascout) with iterative deepening and aspiration windows.
+Moves are tried hash move first, then the killer moves of the current ply, then the rest
+sorted by the history heuristic (ties keep the game's own static order). Each game only
+has to describe its positions through SearchPosition.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable, List, Optional, Tuple
+
+WIN_SCORE = 1_000_000_000 # Terminal scores are at least this far from zero (minus the ply count)
+MATE_BOUND = WIN_SCORE - 1000 # Scores beyond this are wins/losses with their distance in plies folded in
+
+# Transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class SearchPosition(ABC):
+    """A mutable position searched with make/undo. Scores are from the side to move's perspective."""
+
+    @property
+    @abstractmethod
+    def side(self) -> Hashable:
+        """Side to move (used to keep separate history tables)."""
+        pass
+
+    @abstractmethod
+    def key(self) -> Hashable:
+        """Hashable key of the position including the side to move."""
+        pass
+
+    @abstractmethod
+    def generate_moves(self, ply: int) -> List[Hashable]:
+        """Moves for the side to move, best-looking first. A pass counts as a move."""
+        pass
+
+    @abstractmethod
+    def make_move(self, move: Hashable) -> None:
+        pass
+
+    @abstractmethod
+    def undo_move(self) -> None:
+        pass
+
+    @abstractmethod
+    def evaluate(self) -> float:
+        """Static evaluation of a quiet, non-terminal position."""
+        pass
+
+    @abstractmethod
+    def terminal_score(self) -> Optional[float]:
+        """Final score if the game is over (WIN_SCORE-scaled for wins/losses), else None."""
+        pass
+
+def _to_table(score: float, ply: int) -> float:
+    """Win/loss scores count plies from the root; the table stores them counted from the node."""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def _from_table(score: float, ply: int) -> float:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+class PVSearch:
+    """
+    Iterative deepening PVS. `aspiration` is the half-width of the window around the previous
+    iteration's score; it should be a few "small advantages" in the evaluation's units.
+    One instance serves one player of one game (GameController keeps it between moves), so
+    the transposition table and history carry over from move to move.
+    """
+    MAX_TABLE_SIZE = 200000 # Transposition table is cleared when it grows past this
+
+    def __init__(self, depth: int, aspiration: float):
+        self.depth = depth
+        self.aspiration = aspiration
+        self.table: Dict[Hashable, Tuple[int, int, float, Hashable]] = {} # key -> (depth, bound, score, best move)
+        self.killers: List[List[Hashable]] = []
+        self.history: Dict[Tuple[Hashable, Hashable], int] = {}
+        self.nodes = 0
+
+    def search(self, position: SearchPosition) -> Tuple[Optional[Hashable], float]:
+        """Return (best move, score). The best move is None if there is nothing to play."""
+        self.nodes = 0
+        self.killers = [[] for _ in range(self.depth + 1)]
+        # History carries over between moves of the same game, but fades
+        self.history = {k: v // 4 for k, v in self.history.items() if v >= 4}
+        if len(self.table) > self.MAX_TABLE_SIZE:
+            self.table.clear()
+
+        best_move: Optional[Hashable] = None
+        score = 0.0
+        for depth in range(1, self.depth + 1):
+            if depth == 1:
+                score = self._pvs(position, depth, float('-inf'), float('inf'), 0)
+            else:
+                # Aspiration window around the previous score, widened to full on failure
+                alpha, beta = score - self.aspiration, score + self.aspiration
+                result = self._pvs(position, depth, alpha, beta, 0)
+                if result <= alpha or result >= beta:
+                    result = self._pvs(position, depth, float('-inf'), float('inf'), 0)
+                score = result
+
+            entry = self.table.get(position.key())
+            if entry is not None:
+                best_move = entry[3]
+            if abs(score) >= MATE_BOUND:
+                break # Forced result found, deeper search cannot change it
+        return best_move, score
+
+    def _order_moves(self, position: SearchPosition, moves: List[Hashable], hash_move: Hashable, ply: int) -> List[Hashable]:
+        side = position.side
+        history = self.history
+        killers = self.killers[ply] if ply < len(self.killers) else []
+
+        # Stable sort keeps the static order among moves with equal history
+        ordered = sorted(moves, key=lambda m: history.get((side, m), 0), reverse=True)
+        front = [m for m in killers if m in moves and m != hash_move]
+        if hash_move is not None and hash_move in moves:
+            front.insert(0, hash_move)
+        if not front:
+            return ordered
+        return front + [m for m in ordered if m not in front]
+
+    def _store_cutoff(self, position: SearchPosition, move: Hashable, depth: int, ply: int) -> None:
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+        key = (position.side, move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    def _pvs(self, position: SearchPosition, depth: int, alpha: float, beta: float, ply: int) -> float:
+        self.nodes += 1
+
+        terminal = position.terminal_score()
+        if terminal is not None:
+            # Prefer quicker wins and slower losses
+            if terminal > 0:
+                return terminal - ply
+            if terminal < 0:
+                return terminal + ply
+            return terminal
+        if depth == 0:
+            return position.evaluate()
+
+        key = position.key()
+        entry = self.table.get(key)
+        hash_move = None
+        if entry is not None:
+            entry_depth, bound, entry_score, hash_move = entry
+            entry_score = _from_table(entry_score, ply)
+            if entry_depth >= depth and ply > 0:
+                if bound == EXACT:
+                    return entry_score
+                if bound == LOWER and entry_score >= beta:
+                    return entry_score
+                if bound == UPPER and entry_score <= alpha:
+                    return entry_score
+
+        moves = position.generate_moves(ply)
+        moves = self._order_moves(position, moves, hash_move, ply)
+
+        original_alpha = alpha
+        best_score = float('-inf')
+        best_move = moves[0]
+        for index, move in enumerate(moves):
+            position.make_move(move)
+            if index == 0:
+                score = -self._pvs(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Null window: prove the move is no better than the current best
+                score = -self._pvs(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._pvs(position, depth - 1, -beta, -score, ply + 1)
+            position.undo_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self._store_cutoff(position, move, depth, ply)
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table[key] = (depth, bound, _to_table(best_score, ply), best_move)
+        return best_score
@@ -0,0 +1,142 @@
+"""
+Compact wire encoding for boards.
+
+Grids are packed at 2 bits per cell (0 empty, 1 black, 2 white), row-major, four cells per
+byte starting at the low bits. Valid-move sets are bitsets with bit y * size + x. Packed
+fields are base64 strings in JSON and raw bytes in MessagePack.
+
+Encodings a client can ask for:
+  json     - the normal nested-array JSON (default)
+  compact  - JSON with packed grids, history and valid moves
+  msgpack  - MessagePack binary frames with packed fields (needs the optional msgpack package)
+"""
+import base64
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError: # Optional dependency, msgpack requests fall back to compact JSON
+    msgpack = None
+
+try:
+    import orjson
+except ImportError: # Optional dependency, the standard json module is used instead
+    orjson = None
+
+ENCODING_JSON = "json"
+ENCODING_COMPACT = "compact"
+ENCODING_MSGPACK = "msgpack"
+ENCODINGS = (ENCODING_JSON, ENCODING_COMPACT, ENCODING_MSGPACK)
+
+MEDIA_TYPE_JSON = "application/json"
+MEDIA_TYPE_COMPACT = "application/vnd.boardbattle.compact+json"
+MEDIA_TYPE_MSGPACK = "application/msgpack"
+
+PACKED_FORMAT = "packed2" # Value of the "encoding" field in compact payloads
+
+# Base-4 digit per cell; Player is a str enum so enum members and dumped strings both match
+_CELL_DIGITS = {None: "0", "BLACK": "1", "WHITE": "2"}
+_CELL_CODES = {None: 0, "BLACK": 1, "WHITE": 2}
+_CODE_CELLS = {0: None, 1: "BLACK", 2: "WHITE"}
+
+def available_encoding(encoding: Optional[str]) -> str:
+    """Normalise a requested encoding to one this server can produce."""
+    if encoding == ENCODING_MSGPACK and msgpack is None:
+        return ENCODING_COMPACT
+    return encoding if encoding in ENCODINGS else ENCODING_JSON
+
+def encoding_from_accept(accept: Optional[str]) -> str:
+    """Pick the response encoding from an HTTP Accept header."""
+    accept = (accept or "").lower()
+    if MEDIA_TYPE_MSGPACK in accept or "application/x-msgpack" in accept:
+        return available_encoding(ENCODING_MSGPACK)
+    if MEDIA_TYPE_COMPACT in accept:
+        return ENCODING_COMPACT
+    return ENCODING_JSON
+
+def media_type(encoding: str) -> str:
+    return {ENCODING_COMPACT: MEDIA_TYPE_COMPACT, ENCODING_MSGPACK: MEDIA_TYPE_MSGPACK}.get(encoding, MEDIA_TYPE_JSON)
+
+def pack_grid(grid: Iterable[Iterable[Any]]) -> bytes:
+    """Pack a grid at 2 bits per cell. Cell i (row-major) lands in bits 2i..2i+1."""
+    digits = "".join(_CELL_DIGITS[cell] for row in grid for cell in row)
+    if not digits:
+        return b""
+    # Reversed so cell 0 is the least significant base-4 digit; int() does the packing in C
+    return int(digits[::-1], 4).to_bytes((len(digits) + 3) // 4, "little")
+
+def unpack_grid(data: bytes, size: int) -> List[List[Optional[str]]]:
+    value = int.from_bytes(data, "little")
+    cells = [_CODE_CELLS[(value >> (2 * i)) & 3] for i in range(size * size)]
+    return [cells[y * size:(y + 1) * size] for y in range(size)]
+
+def pack_moves(moves: Iterable[Union[Tuple[int, int], List[int]]], size: int) -> bytes:
+    """Bitset of cells, bit y * size + x."""
+    bits = 0
+    for x, y in moves:
+        bits |= 1 << (y * size + x)
+    return bits.to_bytes((size * size + 7) // 8, "little")
+
+def unpack_moves(data: bytes, size: int) -> List[Tuple[int, int]]:
+    bits = int.from_bytes(data, "little")
+    return [(i % size, i // size) for i in range(size * size) if bits >> i & 1]
+
+def compact_state(state: Dict[str, Any], binary: bool) -> Dict[str, Any]:
+    """Packed copy of a dumped GameState (by_alias, mode="json")."""
+    size = state["boardSize"]
+    wrap = (lambda data: data) if binary else (lambda data: base64.b64encode(data).decode("ascii"))
+    compact = dict(state)
+    compact["encoding"] = PACKED_FORMAT
+    compact["grid"] = wrap(pack_grid(state["grid"]))
+    if "history" in state:
+        compact["history"] = [wrap(pack_grid(entry["grid"])) for entry in state["history"]]
+    compact["validMoves"] = wrap(pack_moves(state.get("validMoves") or [], size))
+    return compact
+
+def compact_delta(delta: Dict[str, Any], binary: bool) -> Dict[str, Any]:
+    """Packed copy of a dumped GameDelta: cell values as 0/1/2 codes, valid moves as a bitset."""
+    wrap = (lambda data: data) if binary else (lambda data: base64.b64encode(data).decode("ascii"))
+    compact = dict(delta)
+    compact["encoding"] = PACKED_FORMAT
+    compact["changes"] = [[x, y, _CELL_CODES[value]] for x, y, value in delta["changes"]]
+    compact["validMoves"] = wrap(pack_moves(delta.get("validMoves") or [], delta["boardSize"]))
+    return compact
+
+def compact_message(message: Dict[str, Any], binary: bool) -> Dict[str, Any]:
+    """
+    Pack the board payloads of a message: a GameState itself, or the "state" / "delta" of a
+    WS message or REST response. Everything else is left alone.
+    """
+    if "grid" in message and "boardSize" in message:
+        return compact_state(message, binary)
+    if isinstance(message.get("history"), list): # HistorySlice
+        wrap = (lambda data: data) if binary else (lambda data: base64.b64encode(data).decode("ascii"))
+        compact = dict(message)
+        compact["encoding"] = PACKED_FORMAT
+        compact["history"] = [wrap(pack_grid(entry["grid"])) for entry in message["history"]]
+        return compact
+    if "state" not in message and "delta" not in message:
+        return message
+    compact = dict(message)
+    if isinstance(message.get("state"), dict):
+        compact["state"] = compact_state(message["state"], binary)
+    if isinstance(message.get("delta"), dict):
+        compact["delta"] = compact_delta(message["delta"], binary)
+    return compact
+
+def json_bytes(message: Any) -> bytes:
+    """Compact UTF-8 JSON, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(message)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def encode(message: Dict[str, Any], encoding: str) -> Union[str, bytes]:
+    """Encode a JSON-compatible message: text for json/compact, bytes for msgpack."""
+    if encoding == ENCODING_MSGPACK and msgpack is not None:
+        return msgpack.packb(compact_message(message, binary=True), use_bin_type=True)
+    if encoding in (ENCODING_COMPACT, ENCODING_MSGPACK):
+        message = compact_message(message, binary=False)
+    if orjson is not None:
+        return orjson.dumps(message).decode("utf-8")
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
@@ -1,30 +1,449 @@
-from typing import Dict, List
-from fastapi import WebSocket
+import asyncio
+from collections import deque
+import os
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+from fastapi import WebSocket, status
+
+from board_battle_project.backend.compact import ENCODING_JSON, available_encoding, encode
+
+# Game update protocols a client can pick when connecting (?protocol=...)
+PROTOCOL_FULL = "full" # GAME_STATE with the whole state after every event
+PROTOCOL_DELTA = "delta" # GAME_DELTA with only the changed cells, GAME_STATE on start/resync
+PROTOCOLS = (PROTOCOL_FULL, PROTOCOL_DELTA)
+
+SEND_TIMEOUT = 5.0 # Seconds a single send may take before the socket is evicted
+
+# Outbound queue policy defaults (see ConnectionManager)
+MAX_QUEUE = 32 # Messages waiting per connection
+MAX_OVERFLOWS = 5 # Full-queue events tolerated before the connection is dropped
+COALESCE_TYPES = ("ROOM_UPDATE", "GAME_STATE") # Only the newest queued one of these is kept
+STATE_TYPES = ("GAME_STATE", "GAME_DELTA") # Replaced by a single resync on overflow
+
+RESYNC = "__RESYNC__" # Queue marker: build a fresh GAME_STATE when it is sent
+
+# Heartbeat: the server sends {"type": "PING"} every PING_INTERVAL seconds and clients answer
+# {"action": "PONG"}. A connection silent for IDLE_TIMEOUT seconds is reaped.
+PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+
+# Spectator channel defaults (see SpectatorChannel)
+SPECTATOR_BUFFER = 64 # Events a room channel keeps; spectators further behind are resynced
+MAX_SPECTATORS = 500 # Spectators per room
+
+def encode_message(message: dict, encoding: str = ENCODING_JSON) -> Union[str, bytes]:
+    """Encode a WS message once: text frames for JSON encodings, bytes for MessagePack."""
+    return encode(message, encoding)
+
+class ConnectionWriter:
+    """
+    Outbound side of one WebSocket: a bounded queue drained by its own writer task, so a slow
+    reader only ever delays itself. Messages are queued already encoded.
+    """
+    def __init__(self, websocket: WebSocket, room_id: str, manager: "ConnectionManager", encoding: str):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.manager = manager
+        self.encoding = encoding
+        self.queue: Deque[Tuple[str, Optional[Union[str, bytes]]]] = deque() # (message type, encoded payload)
+        self.overflows = 0
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def _has(self, message_type: str) -> bool:
+        return any(queued_type == message_type for queued_type, _ in self.queue)
+
+    def enqueue(self, message_type: str, text: Union[str, bytes]) -> bool:
+        """Queue a message. Returns False when the connection has overflowed too often and must go."""
+        if message_type in STATE_TYPES and self._has(RESYNC):
+            return True # The pending resync is built at send time and already includes this event
+
+        if message_type in COALESCE_TYPES:
+            self.queue = deque(entry for entry in self.queue if entry[0] != message_type)
+
+        if len(self.queue) >= self.manager.max_queue:
+            self.overflows += 1
+            if self.overflows > self.manager.max_overflows:
+                return False
+            # Drop-and-resync: queued game updates are replaced by one fresh snapshot. A message the
+            # resync does not cover stays behind it, unless the queue cannot hold both
+            keep = message_type not in STATE_TYPES and message_type != RESYNC and self.manager.max_queue > 1
+            room = 2 if keep else 1
+            self.queue = deque(entry for entry in self.queue if entry[0] not in STATE_TYPES)
+            while len(self.queue) > self.manager.max_queue - room:
+                self.queue.popleft() # Still full of other messages: oldest go first
+            self.queue.append((RESYNC, None))
+            if keep:
+                self.queue.append((message_type, text))
+            self._wakeup.set()
+            return True
+
+        self.queue.append((message_type, text))
+        self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queue:
+                message_type, text = self.queue.popleft()
+                if message_type == RESYNC:
+                    message = self.manager.resync_builder(self.room_id) if self.manager.resync_builder else None
+                    if message is None:
+                        continue
+                    text = encode_message(message, self.encoding)
+                try:
+                    if isinstance(text, bytes):
+                        await asyncio.wait_for(self.websocket.send_bytes(text), SEND_TIMEOUT)
+                    else:
+                        await asyncio.wait_for(self.websocket.send_text(text), SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    print(f"WS Send Error: send timed out after {SEND_TIMEOUT}s. Evicting connection.")
+                    await self.manager.evict(self.websocket, self.room_id)
+                    return
+                except Exception as e:
+                    print(f"WS Send Error: {e}. Removing connection.")
+                    await self.manager.evict(self.websocket, self.room_id)
+                    return
+
+class ChannelEvent:
+    """One broadcast in a spectator channel, encoded at most once per (protocol, encoding)."""
+    def __init__(self, position: int, message_type: str, messages: Dict[Optional[str], dict]):
+        self.position = position
+        self.message_type = message_type
+        self.messages = messages # protocol -> message, or {None: message} when it is the same for all
+        self._encoded: Dict[Tuple[Optional[str], str], Union[str, bytes]] = {}
+
+    def payload(self, protocol: str, encoding: str) -> Union[str, bytes]:
+        key = (protocol if protocol in self.messages else None, encoding)
+        if key not in self._encoded:
+            self._encoded[key] = encode_message(self.messages[key[0]], encoding)
+        return self._encoded[key]
+
+class Spectator:
+    """
+    Read-only connection fed from its room's SpectatorChannel. It keeps only a cursor into the
+    shared event log, no queue of its own; a spectator that falls out of the log is resynced.
+    """
+    def __init__(self, websocket: WebSocket, channel: "SpectatorChannel", manager: "ConnectionManager",
+                 protocol: str, encoding: str):
+        self.websocket = websocket
+        self.channel = channel
+        self.manager = manager
+        self.protocol = protocol
+        self.encoding = encoding
+        self.cursor = channel.head # Position of the last channel event handled
+        self.needs_resync = True # Start with a snapshot
+        self.outbox: Deque[dict] = deque() # Direct messages (room info, errors), sent before channel events
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def send(self, message: dict) -> None:
+        if len(self.outbox) < self.manager.max_queue:
+            self.outbox.append(message)
+        self.wakeup.set()
+
+    def request_resync(self) -> None:
+        self.needs_resync = True
+        self.wakeup.set()
+
+    async def _send(self, text: Union[str, bytes]) -> None:
+        if isinstance(text, bytes):
+            await asyncio.wait_for(self.websocket.send_bytes(text), SEND_TIMEOUT)
+        else:
+            await asyncio.wait_for(self.websocket.send_text(text), SEND_TIMEOUT)
+
+    async def _run(self):
+        room_id = self.channel.room_id
+        try:
+            while True:
+                self.wakeup.clear()
+                while self.outbox:
+                    await self._send(encode_message(self.outbox.popleft(), self.encoding))
+
+                if self.needs_resync:
+                    self.needs_resync = False
+                    self.cursor = self.channel.head # The snapshot covers everything published so far
+                    snapshot = self.channel.snapshot(self.encoding, self.manager.resync_builder)
+                    if snapshot is not None:
+                        await self._send(snapshot)
+                    continue
+
+                event = self.channel.next_event(self.cursor)
+                if event is None:
+                    if self.cursor < self.channel.head:
+                        print("WS: Spectator fell behind the channel buffer. Resyncing.")
+                        self.needs_resync = True
+                        continue
+                    await self.wakeup.wait()
+                    continue
+                await self._send(event.payload(self.protocol, self.encoding))
+                self.cursor = event.position
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            print(f"WS Send Error: spectator send timed out after {SEND_TIMEOUT}s. Evicting spectator.")
+            await self.manager.evict_spectator(self.websocket, room_id)
+        except Exception as e:
+            print(f"WS Send Error: {e}. Removing spectator.")
+            await self.manager.evict_spectator(self.websocket, room_id)
+
+class SpectatorChannel:
+    """
+    Broadcast log of one room for spectators. Each event is stored once and encoded once per
+    (protocol, encoding) however many spectators read it. Only the last `size` events are kept:
+    lag-based dropping means a spectator whose cursor falls off the log skips straight to a
+    fresh snapshot instead of receiving the backlog.
+    """
+    def __init__(self, room_id: str, size: int = SPECTATOR_BUFFER):
+        self.room_id = room_id
+        self.events: Deque[ChannelEvent] = deque(maxlen=size)
+        self.head = 0 # Position of the newest event
+        self.spectators: Dict[WebSocket, Spectator] = {}
+        self._snapshots: Dict[Tuple[int, str, Optional[int]], Union[str, bytes]] = {} # Encoded resyncs at the current head
+
+    def snapshot(self, encoding: str, builder: Optional[Callable[[str], Optional[dict]]]) -> Optional[Union[str, bytes]]:
+        """Encoded resync message, shared by every spectator resyncing at the same point."""
+        message = builder(self.room_id) if builder else None
+        if message is None:
+            return None
+        key = (self.head, encoding, message.get("seq"))
+        if key not in self._snapshots:
+            self._snapshots = {k: v for k, v in self._snapshots.items() if k[0] == self.head}
+            self._snapshots[key] = encode_message(message, encoding)
+        return self._snapshots[key]
+
+    def protocols(self) -> List[str]:
+        return list({spectator.protocol for spectator in self.spectators.values()})
+
+    def publish(self, message_type: str, messages: Dict[Optional[str], dict]) -> None:
+        self.head += 1
+        self.events.append(ChannelEvent(self.head, message_type, messages))
+        for spectator in self.spectators.values():
+            spectator.wakeup.set()
+
+    def next_event(self, cursor: int) -> Optional[ChannelEvent]:
+        """The event after `cursor`, or None if there is none yet or it was dropped from the log."""
+        if not self.events or cursor >= self.head:
+            return None
+        index = cursor + 1 - self.events[0].position
+        return self.events[index] if index >= 0 else None
 
 class ConnectionManager:
-    def __init__(self):
+    """
+    Room connections and their outbound queues.
+    Queue policy: at most `max_queue` messages wait per connection; ROOM_UPDATE/GAME_STATE
+    are coalesced to the newest; on overflow queued game updates are dropped in favour of one
+    resync snapshot (built by `resync_builder(room_id)`), and after `max_overflows` overflows
+    the connection is evicted.
+    Spectators are kept apart in a per-room SpectatorChannel (see watch) and are capped at
+    `max_spectators` per room.
+    Liveness: one shared heartbeat task pings every connection each `ping_interval` seconds and
+    reaps, in one batch, those not heard from (see touch) for `idle_timeout` seconds. Dropped
+    player connections go through `on_disconnect(room_id, user_id)`, the normal leave logic.
+    """
+    def __init__(self, max_queue: int = MAX_QUEUE, max_overflows: int = MAX_OVERFLOWS, max_spectators: int = MAX_SPECTATORS,
+                 ping_interval: float = PING_INTERVAL, idle_timeout: float = IDLE_TIMEOUT):
         # Map room_id -> List of WebSockets
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.protocols: Dict[WebSocket, str] = {}
+        self.encodings: Dict[WebSocket, str] = {}
+        self.writers: Dict[WebSocket, ConnectionWriter] = {}
+        self.max_queue = max_queue
+        self.max_overflows = max_overflows
+        self.max_spectators = max_spectators
+        self.channels: Dict[str, SpectatorChannel] = {}
+        self.resync_builder: Optional[Callable[[str], Optional[dict]]] = None
+        self.users: Dict[WebSocket, Optional[int]] = {}
+        self.on_disconnect: Optional[Callable[[str, Optional[int]], Awaitable[None]]] = None
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.last_seen: Dict[WebSocket, float] = {} # Players and spectators, time.monotonic() of the last message
+        self._heartbeat_task: Optional[asyncio.Task] = None
 
-    async def connect(self, websocket: WebSocket, room_id: str):
+    async def connect(self, websocket: WebSocket, room_id: str, protocol: str = PROTOCOL_FULL, encoding: str = ENCODING_JSON,
+                      user_id: Optional[int] = None):
         await websocket.accept()
+        self._ensure_heartbeat()
+        self.users[websocket] = user_id
+        self.last_seen[websocket] = time.monotonic()
         if room_id not in self.active_connections:
             self.active_connections[room_id] = []
         self.active_connections[room_id].append(websocket)
+        self.protocols[websocket] = protocol if protocol in PROTOCOLS else PROTOCOL_FULL
+        self.encodings[websocket] = available_encoding(encoding)
+        self.writers[websocket] = ConnectionWriter(websocket, room_id, self, self.encodings[websocket])
 
-    def disconnect(self, websocket: WebSocket, room_id: str):
+    def disconnect(self, websocket: WebSocket, room_id: str) -> bool:
+        """Forget a player connection. Returns False if it was already gone."""
+        connected = websocket in self.writers
+        self.users.pop(websocket, None)
+        self.last_seen.pop(websocket, None)
+        self.protocols.pop(websocket, None)
+        self.encodings.pop(websocket, None)
+        writer = self.writers.pop(websocket, None)
+        if writer and writer.task is not asyncio.current_task():
+            writer.task.cancel()
         if room_id in self.active_connections:
             if websocket in self.active_connections[room_id]:
                 self.active_connections[room_id].remove(websocket)
             if not self.active_connections[room_id]:
                 del self.active_connections[room_id]
+        return connected
+
+    async def evict(self, websocket: WebSocket, room_id: str, code: int = status.WS_1013_TRY_AGAIN_LATER):
+        """
+        Drop a connection that failed, was too slow, overflowed its queue or went silent: close
+        the socket and run the normal leave logic (on_disconnect) for its user. The endpoint's
+        receive loop then ends without running it a second time, as the connection is gone.
+        """
+        user_id = self.users.get(websocket)
+        if not self.disconnect(websocket, room_id):
+            return
+        try:
+            await asyncio.wait_for(websocket.close(code=code), SEND_TIMEOUT)
+        except Exception:
+            pass # Already closed or unresponsive, nothing more to do
+        if self.on_disconnect:
+            try:
+                await self.on_disconnect(room_id, user_id)
+            except Exception as e:
+                print(f"WS: Error in disconnect handler for room {room_id}: {e}")
+
+    def touch(self, websocket: WebSocket):
+        """Record that the client is alive (any message from it counts, PONG included)."""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = time.monotonic()
+
+    def _ensure_heartbeat(self):
+        if self.ping_interval > 0 and (self._heartbeat_task is None or self._heartbeat_task.done()):
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        """The single scheduler task behind all pings and idle reaping."""
+        while self.writers or self.channels:
+            await asyncio.sleep(self.ping_interval)
+            await self.heartbeat_tick()
+        self._heartbeat_task = None # Restarted by the next connect
+
+    async def heartbeat_tick(self):
+        """
+        Reap silent connections as one batch, then ping everyone left (encoded once per encoding).
+        Evictions run concurrently: each may wait on a close and on on_disconnect's DB work.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        idle_players = [(ws, room_id) for room_id, connections in self.active_connections.items()
+                        for ws in connections if self.last_seen.get(ws, 0) < deadline]
+        idle_spectators = [(ws, room_id) for room_id, channel in self.channels.items()
+                           for ws in channel.spectators if self.last_seen.get(ws, 0) < deadline]
+        if idle_players or idle_spectators:
+            print(f"WS: Reaping {len(idle_players)} idle connections and {len(idle_spectators)} idle spectators.")
+        await asyncio.gather(
+            *(self.evict_spectator(ws, room_id, code=status.WS_1001_GOING_AWAY) for ws, room_id in idle_spectators),
+            *(self.evict(ws, room_id, code=status.WS_1001_GOING_AWAY) for ws, room_id in idle_players),
+            return_exceptions=True,
+        )
+
+        ping = {"type": "PING"}
+        payloads: Dict[str, Union[str, bytes]] = {}
+        overflowed = []
+        for ws, writer in list(self.writers.items()):
+            if writer.encoding not in payloads:
+                payloads[writer.encoding] = encode_message(ping, writer.encoding)
+            if not writer.enqueue("PING", payloads[writer.encoding]):
+                overflowed.append((ws, writer.room_id))
+        for channel in self.channels.values():
+            for spectator in channel.spectators.values():
+                spectator.send(ping)
+        await asyncio.gather(*(self.evict(ws, room_id) for ws, room_id in overflowed), return_exceptions=True)
+
+    async def watch(self, websocket: WebSocket, room_id: str, protocol: str = PROTOCOL_FULL,
+                    encoding: str = ENCODING_JSON, limit: Optional[int] = None) -> Optional[Spectator]:
+        """
+        Accept a spectator. Returns None (and closes the socket) when the channel already has
+        `limit` (default max_spectators) readers.
+        """
+        await websocket.accept()
+        channel = self.channels.get(room_id)
+        if channel and len(channel.spectators) >= (limit or self.max_spectators):
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return None
+        if channel is None:
+            channel = self.channels[room_id] = SpectatorChannel(room_id)
+        spectator = Spectator(websocket, channel, self, protocol if protocol in PROTOCOLS else PROTOCOL_FULL,
+                              available_encoding(encoding))
+        channel.spectators[websocket] = spectator
+        self.last_seen[websocket] = time.monotonic()
+        self._ensure_heartbeat()
+        return spectator
+
+    def unwatch(self, websocket: WebSocket, room_id: str):
+        self.last_seen.pop(websocket, None)
+        channel = self.channels.get(room_id)
+        if not channel:
+            return
+        spectator = channel.spectators.pop(websocket, None)
+        if spectator and spectator.task is not asyncio.current_task():
+            spectator.task.cancel()
+        if not channel.spectators:
+            del self.channels[room_id]
+
+    async def evict_spectator(self, websocket: WebSocket, room_id: str, code: int = status.WS_1013_TRY_AGAIN_LATER):
+        self.unwatch(websocket, room_id)
+        try:
+            await asyncio.wait_for(websocket.close(code=code), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _enqueue(self, room_id: str, sends: List[Tuple[WebSocket, str, Union[str, bytes]]]):
+        """Queue (connection, message type, text) entries, evicting connections that overflowed too often."""
+        for connection, message_type, text in sends:
+            writer = self.writers.get(connection)
+            if writer and not writer.enqueue(message_type, text):
+                print(f"WS: Outbound queue overflowed {writer.overflows} times. Evicting connection.")
+                await self.evict(connection, room_id)
+
+    async def send(self, websocket: WebSocket, room_id: str, message: dict):
+        """Send to one connection through its queue (keeps ordering with broadcasts)."""
+        encoding = self.encodings.get(websocket, ENCODING_JSON)
+        await self._enqueue(room_id, [(websocket, message.get("type", ""), encode_message(message, encoding))])
 
     async def broadcast(self, room_id: str, message: dict):
+        channel = self.channels.get(room_id)
+        if channel:
+            channel.publish(message.get("type", ""), {None: message})
         if room_id in self.active_connections:
-            # Create a copy of the list to iterate safely while modifying
+            message_type = message.get("type", "")
+            payloads: Dict[str, Union[str, bytes]] = {} # Serialized once per encoding for the whole room
+            sends = []
+            # Copy of the list so evictions while queueing are safe
             for connection in self.active_connections[room_id][:]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"WS Broadcast Error: {e}. Removing connection.")
-                    self.disconnect(connection, room_id)
+                encoding = self.encodings.get(connection, ENCODING_JSON)
+                if encoding not in payloads:
+                    payloads[encoding] = encode_message(message, encoding)
+                sends.append((connection, message_type, payloads[encoding]))
+            await self._enqueue(room_id, sends)
+
+    async def broadcast_per_protocol(self, room_id: str, build_message: Callable[[str], dict]):
+        """Broadcast a message whose payload depends on the connection's protocol (each variant is encoded once)."""
+        messages: Dict[str, dict] = {}
+        channel = self.channels.get(room_id)
+        if channel:
+            for protocol in channel.protocols():
+                messages.setdefault(protocol, build_message(protocol))
+            if messages:
+                channel.publish(next(iter(messages.values())).get("type", ""), dict(messages))
+        if room_id in self.active_connections:
+            encoded: Dict[Tuple[str, str], Tuple[str, Union[str, bytes]]] = {}
+            sends = []
+            for connection in self.active_connections[room_id][:]:
+                protocol = self.protocols.get(connection, PROTOCOL_FULL)
+                encoding = self.encodings.get(connection, ENCODING_JSON)
+                if protocol not in messages:
+                    messages[protocol] = build_message(protocol)
+                if (protocol, encoding) not in encoded:
+                    message = messages[protocol]
+                    encoded[(protocol, encoding)] = (message.get("type", ""), encode_message(message, encoding))
+                sends.append((connection, *encoded[(protocol, encoding)]))
+            await self._enqueue(room_id, sends)
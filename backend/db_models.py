@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from board_battle_project.backend.database import Base
@@ -32,4 +32,45 @@ class Match(Base):
 
     player_black = relationship("User", foreign_keys=[player_black_id], back_populates="matches_as_black")
     player_white = relationship("User", foreign_keys=[player_white_id], back_populates="matches_as_white")
+    move_log = relationship("MatchMoves", uselist=False, cascade="all, delete-orphan", back_populates="match")
 
+    # Keyset pagination: open rooms by status, replay lists by player, both newest first
+    __table_args__ = (
+        Index("ix_matches_status_start_time", "status", "start_time"),
+        Index("ix_matches_black_start_time", "player_black_id", "start_time"),
+        Index("ix_matches_white_start_time", "player_white_id", "start_time"),
+    )
+
+class MatchMoves(Base):
+    """
+    Compressed move log of a finished or saved match (see move_log.py).
+    Matches saved before this table existed keep their boards in Match.moves_json["history"].
+    """
+    __tablename__ = "match_moves"
+
+    match_id = Column(Integer, ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+    ply_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary(length=2**24), nullable=False) # MEDIUMBLOB on MySQL
+
+    match = relationship("Match", back_populates="move_log")
+
+class Rating(Base):
+    """
+    Elo rating of a user in one game type, updated as rated matches are saved (see leaderboard.py).
+    Users get a row with their first rated match of that type.
+    """
+    __tablename__ = "ratings"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    game_type = Column(String(20), primary_key=True)
+    rating = Column(Float, nullable=False)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    draws = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Leaderboard order within a game type
+    __table_args__ = (
+        Index("ix_ratings_game_type_rating", "game_type", "rating"),
+    )
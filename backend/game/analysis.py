@@ -0,0 +1,129 @@
+import copy
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from board_battle_project.backend.game.types import Player
+from board_battle_project.backend.game.persistent import PersistentGrid
+
+if TYPE_CHECKING:
+    from board_battle_project.backend.game.base import AbstractGame
+
+class VariationNode:
+    """One position in an analysis tree. `move` is None for the root and for passes."""
+    __slots__ = ("node_id", "parent", "move", "player", "grid", "position", "children")
+
+    def __init__(self, node_id: int, parent: Optional["VariationNode"], move: Optional[Tuple[int, int]],
+                 player: Optional[Player], grid: PersistentGrid, position: Dict[str, Any]):
+        self.node_id = node_id
+        self.parent = parent
+        self.move = move
+        self.player = player # Player who made `move` (None for the root)
+        self.grid = grid
+        self.position = position # Scalar game state captured by AbstractGame._capture_position
+        self.children: List["VariationNode"] = []
+
+    @property
+    def is_pass(self) -> bool:
+        return self.parent is not None and self.move is None
+
+class AnalysisTree:
+    """
+    Variation tree of what-if branches rooted at a game position.
+    Positions are stored as PersistentGrid snapshots, so each node only owns the rows its
+    move changed. Moves are validated by replaying them on a private scratch copy of the
+    game, which keeps all rule logic in the game classes.
+    """
+    MAX_NODES = 5000
+
+    def __init__(self, game: "AbstractGame"):
+        self._scratch = copy.copy(game)
+        self._scratch.board = game._create_board(game.board_size)
+        self._scratch.history = []
+        self._scratch.analysis = None
+
+        self._next_id = 0
+        self._nodes: Dict[int, VariationNode] = {}
+        self.root = self._add_node(None, None, None, PersistentGrid.from_grid(game.board.get_grid()), game._capture_position())
+
+    def _add_node(self, parent: Optional[VariationNode], move: Optional[Tuple[int, int]], player: Optional[Player],
+                  grid: PersistentGrid, position: Dict[str, Any]) -> VariationNode:
+        if len(self._nodes) >= self.MAX_NODES:
+            raise ValueError(f"Analysis tree is limited to {self.MAX_NODES} positions.")
+        node = VariationNode(self._next_id, parent, move, player, grid, position)
+        self._nodes[node.node_id] = node
+        self._next_id += 1
+        if parent is not None:
+            parent.children.append(node)
+        return node
+
+    def get_node(self, node_id: int) -> Optional[VariationNode]:
+        return self._nodes.get(node_id)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def _load_scratch(self, node: VariationNode) -> "AbstractGame":
+        self._scratch.board.load_grid(node.grid.to_grid())
+        self._scratch._restore_position(node.position)
+        self._scratch.history = []
+        return self._scratch
+
+    def play(self, node_id: int, x: int, y: int) -> Tuple[bool, str, Optional[VariationNode]]:
+        """Play (x, y) from the given node. Returns the existing child if the move was already explored."""
+        node = self._nodes.get(node_id)
+        if node is None:
+            return False, "Variation not found.", None
+
+        for child in node.children:
+            if child.move == (x, y):
+                return True, child.position.get("message") or "", child
+
+        scratch = self._load_scratch(node)
+        player = scratch.current_player
+        success, message = scratch.make_move(x, y)
+        if not success:
+            return False, message, None
+
+        grid = node.grid.update(node.grid.diff(scratch.board.get_grid()))
+        return True, message, self._add_node(node, (x, y), player, grid, scratch._capture_position())
+
+    def pass_turn(self, node_id: int) -> Tuple[bool, str, Optional[VariationNode]]:
+        """Pass from the given node (only where the game rules allow it)."""
+        node = self._nodes.get(node_id)
+        if node is None:
+            return False, "Variation not found.", None
+
+        for child in node.children:
+            if child.is_pass:
+                return True, child.position.get("message") or "", child
+
+        scratch = self._load_scratch(node)
+        player = scratch.current_player
+        success, message = scratch.pass_turn(player)
+        if not success:
+            return False, message, None
+
+        grid = node.grid.update(node.grid.diff(scratch.board.get_grid()))
+        return True, message, self._add_node(node, None, player, grid, scratch._capture_position())
+
+    def remove_branch(self, node_id: int) -> bool:
+        """Delete a node and everything below it. The root cannot be removed."""
+        node = self._nodes.get(node_id)
+        if node is None or node.parent is None:
+            return False
+        node.parent.children.remove(node)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            del self._nodes[current.node_id]
+            stack.extend(current.children)
+        return True
+
+    def line(self, node_id: int) -> List[VariationNode]:
+        """Return the nodes from the root down to `node_id`."""
+        node = self._nodes.get(node_id)
+        path = []
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        path.reverse()
+        return path
@@ -1,14 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple # Added Tuple
+import copy
+from datetime import datetime, timezone
+import itertools
+from typing import Iterator, List, Optional, Tuple # Added Tuple
 import uuid
 
-from board_battle_project.backend.models import Player, GameState, GameType, Move, BoardGrid
+from board_battle_project.backend.game.types import Player, GameType, Grid, MoveRecord
+from board_battle_project.backend.game.persistent import PersistentGrid
+from board_battle_project.backend.game.analysis import AnalysisTree
 
 class AbstractBoard(ABC):
+    MIN_SIZE: int = 8
+    MAX_SIZE: int = 19
+
     def __init__(self, size: int):
-        if not (8 <= size <= 19):
-            raise ValueError("Board size must be between 8 and 19.")
+        if not (self.MIN_SIZE <= size <= self.MAX_SIZE):
+            raise ValueError(f"Board size must be between {self.MIN_SIZE} and {self.MAX_SIZE}.")
         self.size = size
+        self._init_cells(size)
+
+    def _init_cells(self, size: int) -> None:
+        """Allocate cell storage. Dense boards keep a full size x size grid."""
         self._grid: List[List[Optional[Player]]] = [[None for _ in range(size)] for _ in range(size)]
 
     @abstractmethod
@@ -39,18 +51,80 @@ class AbstractBoard(ABC):
         if self.is_valid_coordinate(x, y):
             self._grid[y][x] = None
 
+    def load_grid(self, grid: List[List[Optional[Player]]]) -> None:
+        """Replace the board contents with a copy of `grid`."""
+        self._grid = [row[:] for row in grid]
+
+    def iter_stones(self) -> Iterator[Tuple[int, int, Player]]:
+        """Yield (x, y, player) for every occupied cell."""
+        for y, row in enumerate(self._grid):
+            for x, stone in enumerate(row):
+                if stone is not None:
+                    yield x, y, stone
+
+    def is_full(self) -> bool:
+        """Check if every cell is occupied."""
+        return all(stone is not None for row in self._grid for stone in row)
+
+    def iter_lines(self, min_length: int = 1, margin: int = 4, dense: bool = False) -> Iterator[List[Optional[Player]]]:
+        """
+        Yield every row, column and diagonal (both directions) as a list of cells.
+        Diagonals shorter than `min_length` are skipped.
+        Unless `dense` is set, implementations may skip empty lines and trim the others to the
+        occupied span plus `margin` cells on each side (4 is enough to see any five-in-a-row
+        through a stone). The dense board always yields whole lines.
+        """
+        return self._grid_lines(self._grid, min_length)
+
+    @staticmethod
+    def _grid_lines(board: List[List[Optional[Player]]], min_length: int) -> Iterator[List[Optional[Player]]]:
+        """Yield all rows, columns and diagonals of a dense grid."""
+        size = len(board)
+
+        # Rows
+        for y in range(size):
+            yield board[y]
+
+        # Cols
+        for x in range(size):
+            yield [board[y][x] for y in range(size)]
+
+        # Diagonals
+        for k in range(size * 2 - 1):
+            # Diagonal \
+            line = []
+            for y in range(size):
+                x = y - (size - 1) + k
+                if 0 <= x < size:
+                    line.append(board[y][x])
+            if len(line) >= min_length: yield line
+
+            # Diagonal /
+            line2 = []
+            for y in range(size):
+                x = k - y
+                if 0 <= x < size:
+                    line2.append(board[y][x])
+            if len(line2) >= min_length: yield line2
+
+_instance_ids = itertools.count(1) # Process-wide, never reused (unlike id())
+
 class AbstractGame(ABC):
     def __init__(self, board_size: int, game_type: GameType):
         self.game_id: str = str(uuid.uuid4())
+        self.instance_id: int = next(_instance_ids) # Tells a rematch apart from the game it replaced, see state_key
         self.board_size: int = board_size
         self.game_type: GameType = game_type
         self.current_player: Player = Player.BLACK # Black always starts
         self.is_game_over: bool = False
         self.winner: Optional[Player] = None
         self.message: Optional[str] = None
-        self.history: List[BoardGrid] = [] # Stores previous BoardGrids for undo
-        self.last_move: Optional[Move] = None # Stores the last move made
+        self.history: List[PersistentGrid] = [] # Board snapshots for undo/replay, rows shared between plies
+        self.last_move: Optional[MoveRecord] = None # Stores the last move made
         self.prisoners: dict[Player, int] = {Player.BLACK: 0, Player.WHITE: 0} # For Go
+        self.analysis: Optional[AnalysisTree] = None # What-if variation tree, see start_analysis
+        self.version: int = 0 # Bumped on every position change; the API layer caches serialized state against it
+        self.started_at: datetime = datetime.now(timezone.utc) # Archived as the match's start_time
 
     @abstractmethod
     def _create_board(self, size: int) -> AbstractBoard:
@@ -78,22 +152,24 @@ class AbstractGame(ABC):
         """
         return []
 
-    def get_state(self) -> GameState:
-        """Return the current game state as a Pydantic model."""
-        return GameState(
-            gameId=self.game_id,
-            grid=self.board.get_grid(),
-            currentPlayer=self.current_player,
-            history=self.history,
-            prisoners=self.prisoners,
-            isGameOver=self.is_game_over,
-            winner=self.winner,
-            message=self.message,
-            lastMove=self.last_move,
-            gameType=self.game_type,
-            boardSize=self.board_size,
-            validMoves=self.get_valid_moves_for_current_player() # Include valid moves
-        )
+    def _record_history(self, changes: Optional[List[Tuple[int, int, Optional[Player]]]] = None) -> None:
+        """
+        Append the current board to history, sharing unchanged rows with the previous snapshot.
+        `changes` lists the cells (x, y, player) the move changed (for the first snapshot: the
+        cells that differ from an empty board), so the snapshot costs O(changes) instead of a
+        full get_grid and diff. Without it the whole board is compared.
+        """
+        self.version += 1
+        if changes is not None:
+            previous = self.history[-1] if self.history else PersistentGrid.empty(self.board.size)
+            self.history.append(previous.update(changes))
+            return
+        grid = self.board.get_grid()
+        if self.history:
+            previous = self.history[-1]
+            self.history.append(previous.update(previous.diff(grid)))
+        else:
+            self.history.append(PersistentGrid.from_grid(grid))
 
     def undo_last_move(self) -> tuple[bool, str]:
         """Undo the last move."""
@@ -104,8 +180,9 @@ class AbstractGame(ABC):
 
         # Revert board to previous state
         previous_board_grid = self.history.pop(-1) # Pop current state
-        self.board._grid = [row[:] for row in self.history[-1].grid] # Load the state before the last move
+        self.board.load_grid(self.history[-1].to_grid()) # Load the state before the last move
         self._switch_player() # Switch player back
+        self.version += 1
 
         self.message = "Last move undone."
         self.last_move = None # Clear last move after undo
@@ -113,28 +190,67 @@ class AbstractGame(ABC):
 
         return True, "Successfully undone last move."
 
+    def _capture_position(self) -> dict:
+        """
+        Capture the non-board state needed to continue play from the current position.
+        Subclasses with extra turn state (pass counters etc.) extend this.
+        """
+        return {
+            "current_player": self.current_player,
+            "is_game_over": self.is_game_over,
+            "winner": self.winner,
+            "message": self.message,
+            "last_move": self.last_move,
+            "prisoners": dict(self.prisoners),
+        }
+
+    def _restore_position(self, position: dict) -> None:
+        """Restore state captured by _capture_position (the board is restored separately)."""
+        for name, value in position.items():
+            setattr(self, name, dict(value) if isinstance(value, dict) else value)
+        self.version += 1
+
+    def search_copy(self) -> "AbstractGame":
+        """
+        A copy with its own board, for AI searches running off the event loop (they place and
+        clear stones on the board they get). History and other state are shared, do not modify.
+        """
+        snapshot = copy.copy(self)
+        snapshot.board = copy.deepcopy(self.board)
+        return snapshot
+
+    def start_analysis(self) -> AnalysisTree:
+        """Start (or restart) analysis mode with a variation tree rooted at the current position."""
+        self.analysis = AnalysisTree(self)
+        return self.analysis
+
     def resign(self, player: Player) -> None:
         """A player resigns the game."""
         self.is_game_over = True
         self.winner = Player.WHITE if player == Player.BLACK else Player.BLACK
         self.message = f"{player.value} has resigned. {self.winner.value} wins!"
+        self.version += 1
 
     @abstractmethod
     def pass_turn(self, player: Player) -> tuple[bool, str]:
         """Pass the current turn (primarily for Go)."""
         pass
 
-    def load_from_state(self, state: GameState):
-        """Load game state from a GameState object."""
-        self.current_player = state.current_player
-        self.is_game_over = state.is_game_over
-        self.winner = state.winner
-        self.message = state.message
-        self.last_move = state.last_move
-        self.prisoners = state.prisoners
-        self.history = state.history
-        
+    def load_position(self, grid: Grid, history: List[Grid], current_player: Player, is_game_over: bool,
+                      winner: Optional[Player], message: Optional[str], last_move: Optional[MoveRecord],
+                      prisoners: dict) -> None:
+        """Load a saved position (see state_adapter.load_game_state for the API model version)."""
+        self.current_player = current_player
+        self.is_game_over = is_game_over
+        self.winner = winner
+        self.message = message
+        self.last_move = last_move
+        self.prisoners = dict(prisoners)
+        self.history = []
+        for history_grid in history:
+            self.board.load_grid(history_grid)
+            self._record_history()
+
         # Restore board grid
-        # state.grid is List[List[Optional[Player]]]
-        # self.board._grid is the same structure
-        self.board._grid = [row[:] for row in state.grid]
+        self.board.load_grid(grid)
+        self.version += 1
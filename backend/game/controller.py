@@ -1,5 +1,9 @@
-from typing import Dict, Optional, Tuple
-from sqlalchemy.orm import Session
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from pydantic import BaseModel # Added BaseModel
 from board_battle_project.backend.game.base import AbstractGame
 from board_battle_project.backend.game.gomoku import GomokuGame
@@ -8,8 +12,22 @@ from board_battle_project.backend.game.reversi import ReversiGame
 from board_battle_project.backend.models import GameType, Player, MoveResult, GameState, GameConfig, AILevel
 from board_battle_project.backend.ai.reversi_ai import GreedyReversiAI, MinimaxReversiAI, AIStrategy
 from board_battle_project.backend.ai.gomoku_ai import GreedyGomokuAI, MinimaxGomokuAI
-from board_battle_project.backend.db_models import Match, User 
-import json 
+try:
+    from board_battle_project.backend.ai.mcts_ai import MCTSReversiAI
+except ImportError: # NumPy not installed, Hard falls back to deeper Minimax
+    MCTSReversiAI = None
+from board_battle_project.backend.state_adapter import build_game_state, load_game_state
+from board_battle_project.backend.persistence import FinishedGame, PersistenceQueue
+from board_battle_project.backend.game_clock import GameClock
+from board_battle_project.backend.timer_wheel import Timer, TimerWheel
+from board_battle_project.backend.room_stream import RoomStream
+
+# AI searches run here, off the event loop (MCTS thinks for a full second)
+AI_WORKERS = int(os.getenv("AI_WORKERS", "4"))
+ai_executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="ai")
+
+# Seconds a player who drops out of a running room game keeps their seat before they lose
+RECONNECT_GRACE = float(os.getenv("RECONNECT_GRACE", "30"))
 
 class RoomSession(BaseModel):
     match_id: str
@@ -20,13 +38,24 @@ class RoomSession(BaseModel):
     config: Optional[GameConfig] = None
     swap_request_from: Optional[int] = None # User ID who requested swap
     last_action_was_undo: bool = False # Track consecutive undos
+    away_player_ids: List[int] = [] # Seated players who dropped and are within their reconnect grace
 
 class GameController:
     _instance: Optional['GameController'] = None
     _active_games: Dict[str, AbstractGame] = {}
     _ai_configs: Dict[str, Dict[Player, AILevel]] = {} 
+    _ai_strategies: Dict[str, Dict[Player, AIStrategy]] = {} # Kept for the whole game: the Minimax AIs reuse their search tables
     _game_player_map: Dict[str, Tuple[Optional[int], Optional[int]]] = {} 
     _room_sessions: Dict[str, RoomSession] = {} # New: track room lobby state
+    _room_streams: Dict[str, RoomStream] = {} # Sequenced WS game events per room
+    _ai_thinking: Set[str] = set() # Games with an AI search running
+    persistence = PersistenceQueue() # Write-behind queue for finished games
+    timers = TimerWheel() # Clock flags and reconnect grace periods of all rooms
+    _clocks: Dict[str, GameClock] = {}
+    _clock_timers: Dict[str, Timer] = {}
+    _grace_timers: Dict[Tuple[str, int], Timer] = {}
+    on_clock_timeout: Optional[Callable[[str, Player], Awaitable[None]]] = None # (game id, player out of time)
+    on_grace_expired: Optional[Callable[[str, int], Awaitable[None]]] = None # (room id, user id that did not return)
 
     def __new__(cls):
         if cls._instance is None:
@@ -43,18 +72,30 @@ class GameController:
             )
         return self._room_sessions[match_id]
 
-    def update_session_players(self, match_id: str, user_id: int):
+    def get_session(self, match_id: str) -> Optional[RoomSession]:
+        return self._room_sessions.get(match_id)
+
+    def get_room_stream(self, match_id: str) -> RoomStream:
+        if match_id not in self._room_streams:
+            self._room_streams[match_id] = RoomStream()
+        return self._room_streams[match_id]
+
+    def update_session_players(self, match_id: str, user_id: int) -> bool:
+        """Seat the user in a free slot. Returns True if the session changed."""
         session = self._room_sessions.get(match_id)
-        if not session: return
+        if not session: return False
         
         # Assign user to a slot if not already assigned
         if session.black_player_id == user_id or session.white_player_id == user_id:
-            return # Already in
+            return False # Already in
         
         if session.black_player_id is None:
             session.black_player_id = user_id
         elif session.white_player_id is None:
             session.white_player_id = user_id
+        else:
+            return False # Room is full
+        return True
     
     def request_switch_sides(self, match_id: str, user_id: int) -> RoomSession:
         session = self._room_sessions.get(match_id)
@@ -83,6 +124,7 @@ class GameController:
         return session
 
     def handle_player_disconnect(self, match_id: str, user_id: int) -> Tuple[Optional[RoomSession], Optional[AbstractGame], bool]: # Added bool for cleanup status
+        self.end_reconnect_grace(match_id, user_id) # Leaving for good
         session = self._room_sessions.get(match_id)
         game = self.get_game(match_id)
         
@@ -108,15 +150,104 @@ class GameController:
                 if player_color:
                     print(f"Player {user_id} disconnected during game. Triggering resign.")
                     game.resign(player_color)
+                    self._sync_clock(match_id, increment=False)
             
             # Check if room is empty
             if session.black_player_id is None and session.white_player_id is None:
                 self.remove_game(match_id) # Remove active game instance
                 del self._room_sessions[match_id] # Remove room session
+                self._room_streams.pop(match_id, None)
                 cleaned_up = True
 
         return session, game, cleaned_up
 
+    def begin_reconnect_grace(self, match_id: str, user_id: int) -> bool:
+        """
+        Keep the seat of a player who dropped out of a running game for RECONNECT_GRACE seconds
+        instead of resigning at once (their clock keeps running). If they do not come back,
+        on_grace_expired runs the normal leave logic. Returns False if no grace applies.
+        """
+        game = self.get_game(match_id)
+        session = self._room_sessions.get(match_id)
+        if RECONNECT_GRACE <= 0 or not game or not session or game.is_game_over:
+            return False
+        if user_id not in self._game_player_map.get(match_id, (None, None)):
+            return False
+        if (match_id, user_id) not in self._grace_timers:
+            print(f"Player {user_id} dropped from game {match_id}. Holding the seat for {RECONNECT_GRACE:.0f}s.")
+            self._grace_timers[(match_id, user_id)] = self.timers.schedule(RECONNECT_GRACE, self._grace_expired, match_id, user_id)
+            session.away_player_ids.append(user_id)
+        return True
+
+    def end_reconnect_grace(self, match_id: str, user_id: int) -> bool:
+        """Cancel a player's reconnect grace (they are back, or left). Returns False if none was running."""
+        timer = self._grace_timers.pop((match_id, user_id), None)
+        if timer is None:
+            return False
+        timer.cancel()
+        session = self._room_sessions.get(match_id)
+        if session and user_id in session.away_player_ids:
+            session.away_player_ids.remove(user_id)
+        return True
+
+    async def _grace_expired(self, match_id: str, user_id: int):
+        if self._grace_timers.pop((match_id, user_id), None) is None:
+            return
+        session = self._room_sessions.get(match_id)
+        if session and user_id in session.away_player_ids:
+            session.away_player_ids.remove(user_id)
+        print(f"Player {user_id} did not return to game {match_id}.")
+        if self.on_grace_expired:
+            await self.on_grace_expired(match_id, user_id)
+
+    def clock_state(self, game_id: str) -> Optional[dict]:
+        """The game's clocks as of now (see GameClock.state), None for untimed games."""
+        clock = self._clocks.get(game_id)
+        return clock.state(time.monotonic()) if clock else None
+
+    def _start_clock(self, game: AbstractGame, config: GameConfig) -> None:
+        """Timed games: human against human with a time control."""
+        ai_config = self._ai_configs.get(game.game_id, {})
+        if config.time_control and all(level == AILevel.HUMAN for level in ai_config.values()):
+            self._clocks[game.game_id] = GameClock(config.time_control, None, time.monotonic())
+            self._sync_clock(game.game_id)
+
+    def _sync_clock(self, game_id: str, increment: bool = True) -> None:
+        """
+        After every change of a timed game: charge the time spent to whoever's clock was running,
+        start the clock of the player to move (or stop both when the game is over) and move the
+        flag timer to when that player would run out of time.
+        """
+        clock = self._clocks.get(game_id)
+        game = self.get_game(game_id)
+        if not clock or not game:
+            return
+        timer = self._clock_timers.pop(game_id, None)
+        if timer:
+            timer.cancel()
+        now = time.monotonic()
+        clock.switch(None if game.is_game_over else game.current_player, now, increment)
+        if clock.running is not None:
+            self._clock_timers[game_id] = self.timers.schedule(clock.time_to_flag(now), self._clock_expired, game_id)
+
+    def _stop_clock(self, game_id: str) -> None:
+        timer = self._clock_timers.pop(game_id, None)
+        if timer:
+            timer.cancel()
+        self._clocks.pop(game_id, None)
+
+    async def _clock_expired(self, game_id: str):
+        self._clock_timers.pop(game_id, None)
+        clock = self._clocks.get(game_id)
+        game = self.get_game(game_id)
+        if not clock or not game or game.is_game_over or clock.running is None:
+            return
+        player = clock.running
+        clock.switch(None, time.monotonic(), increment=False)
+        print(f"Game {game_id}: {player.value} ran out of time.")
+        if self.on_clock_timeout:
+            await self.on_clock_timeout(game_id, player)
+
     def toggle_ready(self, match_id: str, user_id: int) -> RoomSession:
         session = self._room_sessions.get(match_id)
         if session:
@@ -139,6 +270,8 @@ class GameController:
         
         if game_id_override:
             game.game_id = game_id_override
+            self._stop_clock(game.game_id) # A restarted room game gets fresh clocks
+            self._ai_strategies.pop(game.game_id, None)
         
         self._active_games[game.game_id] = game
         self._game_player_map[game.game_id] = (black_user_id, white_user_id)
@@ -155,11 +288,8 @@ class GameController:
             ai_config_for_game[Player.WHITE] = AILevel.HUMAN
         
         self._ai_configs[game.game_id] = ai_config_for_game
-
-        # If the first player is AI, make a move immediately
-        if self._ai_configs[game.game_id].get(game.current_player) != AILevel.HUMAN:
-            self._make_ai_move_if_possible(game.game_id)
-        
+        self._start_clock(game, config)
+        # If the first player is AI, the caller awaits play_ai_turn
         return game
 
     def get_game(self, game_id: str) -> Optional[AbstractGame]:
@@ -172,7 +302,8 @@ class GameController:
             elif ai_level == AILevel.MINIMAX:
                 return MinimaxReversiAI(depth=3) # Default depth
             elif ai_level == AILevel.MCTS:
-                # Placeholder: MCTS not fully implemented, using Minimax with higher depth
+                if MCTSReversiAI is not None:
+                    return MCTSReversiAI()
                 return MinimaxReversiAI(depth=4)
         elif game_type == GameType.GOMOKU:
             if ai_level == AILevel.GREEDY:
@@ -199,11 +330,9 @@ class GameController:
             session = self._room_sessions.get(game_id)
             if session:
                 session.last_action_was_undo = False
-
-            # After human move, check for AI opponent
-            if not game.is_game_over:
-                self._make_ai_move_if_possible(game_id)
-            return MoveResult(success=True, state=game.get_state())
+            self._sync_clock(game_id)
+            # The AI reply (if any) is played by play_ai_turn
+            return MoveResult(success=True, state=build_game_state(game))
         else:
             return MoveResult(success=False, error=message)
 
@@ -247,39 +376,52 @@ class GameController:
             game.undo_last_move()
         
         session.last_action_was_undo = True
-        return MoveResult(success=True, state=game.get_state())
-
-    def _make_ai_move_if_possible(self, game_id: str):
+        self._sync_clock(game_id, increment=False)
+        return MoveResult(success=True, state=build_game_state(game))
+
+    async def play_ai_turn(self, game_id: str) -> None:
+        """
+        If an AI is to move, search for its move in the AI thread pool and play it.
+        The search runs on a copy of the game (the AIs try moves on the board they are given),
+        and its move is dropped if the game changed meanwhile (e.g. an undo).
+        """
         game = self.get_game(game_id)
-        if not game or game.is_game_over:
+        if not game or game.is_game_over or game_id in self._ai_thinking:
             return
 
-        ai_level = self._ai_configs.get(game_id, {}).get(game.current_player)
-        print(f"DEBUG: _make_ai_move game={game_id} current={game.current_player} level={ai_level}") # DEBUG
-
-        if ai_level and ai_level != AILevel.HUMAN:
+        player = game.current_player
+        ai_level = self._ai_configs.get(game_id, {}).get(player)
+        print(f"DEBUG: play_ai_turn game={game_id} current={player} level={ai_level}") # DEBUG
+        if not ai_level or ai_level == AILevel.HUMAN or not isinstance(game, (ReversiGame, GomokuGame)):
+            return
+        strategies = self._ai_strategies.setdefault(game_id, {})
+        ai_strategy = strategies.get(player)
+        if ai_strategy is None:
             ai_strategy = self._get_ai_strategy(game.game_type, ai_level)
-            if ai_strategy:
-                print(f"DEBUG: AI Strategy found for {game.game_type}") # DEBUG
-                if isinstance(game, ReversiGame):
-                    ai_move_x, ai_move_y = ai_strategy.make_move(game, game.current_player)
-                    print(f"DEBUG: AI calculated move ({ai_move_x}, {ai_move_y})") # DEBUG
-                    if (ai_move_x, ai_move_y) != (-1, -1): 
-                        success, msg = game.make_move(ai_move_x, ai_move_y)
-                        print(f"DEBUG: AI make_move result: {success}, {msg}") # DEBUG
-                    else:
-                        print("DEBUG: AI passing turn") # DEBUG
-                        game.pass_turn(game.current_player) 
-                elif isinstance(game, GomokuGame):
-                    ai_move_x, ai_move_y = ai_strategy.make_move(game, game.current_player)
-                    print(f"DEBUG: AI calculated move ({ai_move_x}, {ai_move_y})") # DEBUG
-                    if (ai_move_x, ai_move_y) != (-1, -1):
-                        success, msg = game.make_move(ai_move_x, ai_move_y)
-                        print(f"DEBUG: AI make_move result: {success}, {msg}") # DEBUG
-                    else:
-                        pass
-                
-    def trigger_ai_move(self, game_id: str) -> MoveResult:
+            if not ai_strategy:
+                return
+            strategies[player] = ai_strategy
+
+        version = game.version
+        self._ai_thinking.add(game_id)
+        try:
+            ai_move_x, ai_move_y = await asyncio.get_running_loop().run_in_executor(
+                ai_executor, ai_strategy.make_move, game.search_copy(), player)
+        finally:
+            self._ai_thinking.discard(game_id)
+        print(f"DEBUG: AI calculated move ({ai_move_x}, {ai_move_y})") # DEBUG
+
+        if self.get_game(game_id) is not game or game.version != version:
+            print(f"Game {game_id}: position changed during the AI search, move dropped.")
+            return
+        if (ai_move_x, ai_move_y) != (-1, -1):
+            success, msg = game.make_move(ai_move_x, ai_move_y)
+            print(f"DEBUG: AI make_move result: {success}, {msg}") # DEBUG
+        elif isinstance(game, ReversiGame):
+            print("DEBUG: AI passing turn") # DEBUG
+            game.pass_turn(player)
+
+    async def trigger_ai_move(self, game_id: str) -> MoveResult:
         game = self.get_game(game_id)
         if not game:
             return MoveResult(success=False, error="Game not found.")
@@ -294,9 +436,9 @@ class GameController:
              return MoveResult(success=False, error="It's not AI's turn.")
         
         # Execute AI move
-        self._make_ai_move_if_possible(game_id)
+        await self.play_ai_turn(game_id)
         
-        return MoveResult(success=True, state=game.get_state())
+        return MoveResult(success=True, state=build_game_state(game))
 
     def undo_move(self, game_id: str) -> MoveResult:
         game = self.get_game(game_id)
@@ -308,7 +450,7 @@ class GameController:
             # If the last move undone was an AI move, undo the human move before it too
             # This needs more sophisticated history tracking to distinguish human/AI moves
             # For now, a simple undo only reverts one step.
-            return MoveResult(success=True, state=game.get_state())
+            return MoveResult(success=True, state=build_game_state(game))
         else:
             return MoveResult(success=False, error=message)
 
@@ -323,9 +465,8 @@ class GameController:
 
         success, message = game.pass_turn(player)
         if success:
-            if not game.is_game_over:
-                self._make_ai_move_if_possible(game_id) # After human pass, check for AI opponent
-            return MoveResult(success=True, state=game.get_state())
+            self._sync_clock(game_id)
+            return MoveResult(success=True, state=build_game_state(game))
         else:
             return MoveResult(success=False, error=message)
 
@@ -335,13 +476,16 @@ class GameController:
             return MoveResult(success=False, error="Game not found.")
         
         game.resign(player)
-        return MoveResult(success=True, state=game.get_state())
+        self._sync_clock(game_id, increment=False)
+        return MoveResult(success=True, state=build_game_state(game))
 
     def remove_game(self, game_id: str) -> None:
+        self._stop_clock(game_id)
         if game_id in self._active_games:
             del self._active_games[game_id]
         if game_id in self._ai_configs:
             del self._ai_configs[game_id]
+        self._ai_strategies.pop(game_id, None)
         if game_id in self._game_player_map:
             del self._game_player_map[game_id]
 
@@ -349,13 +493,16 @@ class GameController:
         # Create a new game instance with a fresh ID
         game = self.create_game(config, black_user_id, white_user_id) # Create with new config, which will set up _ai_configs and _game_player_map
         # Load the state into this new instance
-        game.load_from_state(state)
-        # Re-check AI move if current player is AI after loading
-        if self._ai_configs[game.game_id].get(game.current_player) != AILevel.HUMAN:
-            self._make_ai_move_if_possible(game.game_id)
+        load_game_state(game, state)
+        # If the current player is AI after loading, the caller awaits play_ai_turn
         return game
 
-    def save_game_result(self, game_id: str, db: Session, black_player_id_override: Optional[int] = None, white_player_id_override: Optional[int] = None) -> None:
+    async def save_game_result(self, game_id: str, black_player_id_override: Optional[int] = None, white_player_id_override: Optional[int] = None) -> None:
+        """
+        Archive a finished game as a Match and update the players' stats.
+        The game is read and removed here; the write itself is queued and happens in the
+        background (see persistence.py), so callers can broadcast the game over right away.
+        """
         game = self.get_game(game_id)
         if not game:
             print(f"Game with ID {game_id} not found for saving.")
@@ -367,12 +514,6 @@ class GameController:
         black_user_id = black_player_id_override if black_player_id_override is not None else black_user_id
         white_user_id = white_player_id_override if white_player_id_override is not None else white_user_id
 
-        # Prepare moves_json
-        # Convert history of BoardGrid objects to a list of dicts/JSON compatible
-        moves_history = []
-        for board_grid in game.history:
-            moves_history.append(json.loads(board_grid.model_dump_json()))
-
         # Get AI config
         game_ai_config = self._ai_configs.get(game_id, {})
         black_ai = game_ai_config.get(Player.BLACK)
@@ -385,7 +526,7 @@ class GameController:
                 "black_ai_level": black_ai.value if black_ai else None,
                 "white_ai_level": white_ai.value if white_ai else None
             },
-            "history": moves_history
+            "history": [] # See move_log
         }
 
         # Determine result string
@@ -397,39 +538,20 @@ class GameController:
         elif game.winner is None and game.is_game_over:
             result_str = "DRAW" # Assuming draw if game over but no winner (e.g. board full)
 
-        from board_battle_project.backend.models import MatchStatus # Ensure MatchStatus is imported if not already available in scope (it is imported from models)
-
-        new_match = Match(
-            player_black_id=black_user_id,
-            player_white_id=white_user_id,
-            game_type=game.game_type.value, # Store enum value as string
-            result=result_str,
-            status=MatchStatus.COMPLETED, # Fix: Archive should be COMPLETED
-            moves_json=moves_data, 
-        )
-        db.add(new_match)
-        db.commit()
-        db.refresh(new_match)
-        print(f"Game {game_id} saved as match {new_match.id}")
-        
-        # Update user stats (wins/total games) if applicable
-        if black_user_id:
-            user_black = db.query(User).filter(User.id == black_user_id).first()
-            if user_black:
-                user_black.total_games += 1
-                if result_str == "BLACK_WON":
-                    user_black.wins += 1
-                db.add(user_black)
-        if white_user_id:
-            user_white = db.query(User).filter(User.id == white_user_id).first()
-            if user_white:
-                user_white.total_games += 1
-                if result_str == "WHITE_WON":
-                    user_white.wins += 1
-                db.add(user_white)
-        db.commit() # Commit stat updates
-
-        # Remove game from active games after saving
+        # Remove game from active games first, so no other game-over path saves it twice
         self.remove_game(game_id)
 
-
+        # History snapshots are immutable, so the persistence worker can read them later
+        await self.persistence.submit(FinishedGame(
+            game_id=game_id,
+            game_type=game.game_type,
+            board_size=game.board_size,
+            history=list(game.history),
+            final_grid=game.board.get_grid(),
+            black_user_id=black_user_id,
+            white_user_id=white_user_id,
+            moves_data=moves_data,
+            result=result_str,
+            start_time=game.started_at,
+            end_time=datetime.now(timezone.utc), # Same clock as started_at
+        ))
@@ -1,6 +1,6 @@
 from typing import Optional, List, Set, Tuple
 from board_battle_project.backend.game.base import AbstractBoard, AbstractGame
-from board_battle_project.backend.models import Player, GameType, Move, BoardGrid
+from board_battle_project.backend.game.types import Player, GameType, MoveRecord
 
 class GoBoard(AbstractBoard):
     def __init__(self, size: int):
@@ -20,7 +20,7 @@ class GoGame(AbstractGame):
     def __init__(self, board_size: int):
         super().__init__(board_size, GameType.GO)
         self.board: GoBoard = self._create_board(board_size)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()]))
+        self._record_history()
         self._consecutive_passes = 0 # For Go game ending condition
 
     def _create_board(self, size: int) -> GoBoard:
@@ -119,8 +119,9 @@ class GoGame(AbstractGame):
         self.board._grid = [row[:] for row in self.board.get_grid()] # Finalize the board state
 
         self.prisoners[self.current_player] += captured_by_move
-        self.last_move = Move(x=x, y=y, player=self.current_player)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()])) # Save state after valid move
+        self.last_move = MoveRecord(x=x, y=y, player=self.current_player)
+        captured = [(cx, cy, None) for group in captured_groups_after_move for cx, cy in group]
+        self._record_history([(x, y, self.current_player)] + captured) # Save state after valid move
         self._consecutive_passes = 0 # Reset consecutive passes on a valid move
 
         self.check_game_over() # Check if two consecutive passes occurred
@@ -142,7 +143,7 @@ class GoGame(AbstractGame):
         self.last_move = None # No physical move
         self.message = f"{player.value} passed."
         self._consecutive_passes += 1
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()])) # Save current board state for history/undo
+        self._record_history([]) # Nothing changed on the board
 
         self.check_game_over() # Check for two consecutive passes
 
@@ -151,6 +152,11 @@ class GoGame(AbstractGame):
         
         return True, self.message
 
+    def _capture_position(self) -> dict:
+        position = super()._capture_position()
+        position["_consecutive_passes"] = self._consecutive_passes
+        return position
+
     def check_game_over(self) -> None:
         if self._consecutive_passes >= 2:
             self.is_game_over = True
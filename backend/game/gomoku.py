@@ -1,6 +1,6 @@
-from typing import Optional, List
+from typing import Dict, Iterator, Optional, List, Set, Tuple
 from board_battle_project.backend.game.base import AbstractBoard, AbstractGame
-from board_battle_project.backend.models import Player, GameType, Move, BoardGrid
+from board_battle_project.backend.game.types import Player, GameType, MoveRecord
 
 class GomokuBoard(AbstractBoard):
     def __init__(self, size: int):
@@ -12,13 +12,133 @@ class GomokuBoard(AbstractBoard):
         self._grid[y][x] = player
         return True
 
+class SparseGomokuBoard(GomokuBoard):
+    """
+    Gomoku board that stores only occupied cells.
+    Stones live in a hash map keyed by (x, y), and every row, column and diagonal keeps an
+    index of its occupied positions, so memory and line scans scale with stones placed
+    rather than with the board area. Used for boards larger than the dense limit.
+    """
+    MAX_SIZE: int = 50
+
+    # Line directions: row, column, diagonal (\), anti-diagonal (/)
+    LINE_DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+
+    def _init_cells(self, size: int) -> None:
+        self._stones: Dict[Tuple[int, int], Player] = {}
+        # (direction index, line key) -> positions along that line which hold a stone
+        self._line_index: Dict[Tuple[int, int], Set[int]] = {}
+
+    @staticmethod
+    def _line_of(direction: int, x: int, y: int) -> Tuple[int, int]:
+        """Return (line key, position along the line) of cell (x, y) for the given direction."""
+        if direction == 0:
+            return y, x
+        if direction == 1:
+            return x, y
+        if direction == 2:
+            return x - y, x
+        return x + y, x
+
+    @staticmethod
+    def _cell_of(direction: int, key: int, pos: int) -> Tuple[int, int]:
+        """Inverse of `_line_of`: the (x, y) cell at `pos` on line `key`."""
+        if direction == 0:
+            return pos, key
+        if direction == 1:
+            return key, pos
+        if direction == 2:
+            return pos, pos - key
+        return pos, key - pos
+
+    def _line_bounds(self, direction: int, key: int) -> Tuple[int, int]:
+        """Inclusive range of positions that lie on the board for line `key`."""
+        last = self.size - 1
+        if direction == 2:
+            return max(0, key), min(last, last + key)
+        if direction == 3:
+            return max(0, key - last), min(last, key)
+        return 0, last
+
+    def _index_add(self, x: int, y: int) -> None:
+        for direction in range(len(self.LINE_DIRECTIONS)):
+            key, pos = self._line_of(direction, x, y)
+            self._line_index.setdefault((direction, key), set()).add(pos)
+
+    def _index_remove(self, x: int, y: int) -> None:
+        for direction in range(len(self.LINE_DIRECTIONS)):
+            key, pos = self._line_of(direction, x, y)
+            positions = self._line_index.get((direction, key))
+            if positions is not None:
+                positions.discard(pos)
+                if not positions:
+                    del self._line_index[(direction, key)]
+
+    def place_stone(self, x: int, y: int, player: Player) -> bool:
+        if not self.is_valid_coordinate(x, y) or (x, y) in self._stones:
+            return False
+        self._stones[(x, y)] = player
+        self._index_add(x, y)
+        return True
+
+    def get_stone(self, x: int, y: int) -> Optional[Player]:
+        return self._stones.get((x, y))
+
+    def is_empty(self, x: int, y: int) -> bool:
+        return self.is_valid_coordinate(x, y) and (x, y) not in self._stones
+
+    def get_grid(self) -> List[List[Optional[Player]]]:
+        grid: List[List[Optional[Player]]] = [[None] * self.size for _ in range(self.size)]
+        for (x, y), player in self._stones.items():
+            grid[y][x] = player
+        return grid
+
+    def clear_cell(self, x: int, y: int):
+        if self._stones.pop((x, y), None) is not None:
+            self._index_remove(x, y)
+
+    def load_grid(self, grid: List[List[Optional[Player]]]) -> None:
+        self._init_cells(self.size)
+        for y, row in enumerate(grid):
+            for x, stone in enumerate(row):
+                if stone is not None:
+                    self.place_stone(x, y, stone)
+
+    def iter_stones(self) -> Iterator[Tuple[int, int, Player]]:
+        for (x, y), player in self._stones.items():
+            yield x, y, player
+
+    def is_full(self) -> bool:
+        return len(self._stones) == self.size * self.size
+
+    def iter_lines(self, min_length: int = 1, margin: int = 4, dense: bool = False) -> Iterator[List[Optional[Player]]]:
+        if dense:
+            # Caller needs every full line, including empty ones (builds the whole grid)
+            yield from self._grid_lines(self.get_grid(), min_length)
+            return
+
+        for (direction, key), positions in self._line_index.items():
+            lo, hi = self._line_bounds(direction, key)
+            if hi - lo + 1 < min_length:
+                continue
+            start = max(lo, min(positions) - margin)
+            end = min(hi, max(positions) + margin)
+            line = []
+            for pos in range(start, end + 1):
+                line.append(self._stones.get(self._cell_of(direction, key, pos)))
+            yield line
+
 class GomokuGame(AbstractGame):
-    def __init__(self, board_size: int):
+    def __init__(self, board_size: int, sparse: Optional[bool] = None):
         super().__init__(board_size, GameType.GOMOKU)
+        # Boards beyond the dense size limit always use the sparse representation
+        self.sparse: bool = board_size > GomokuBoard.MAX_SIZE if sparse is None else sparse
         self.board: GomokuBoard = self._create_board(board_size)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()]))
+        self._record_history([]) # Empty board
 
     def _create_board(self, size: int) -> GomokuBoard:
+        if self.sparse:
+            return SparseGomokuBoard(size)
         return GomokuBoard(size)
 
     def make_move(self, x: int, y: int) -> tuple[bool, str]:
@@ -28,8 +148,8 @@ class GomokuGame(AbstractGame):
         if not self.board.place_stone(x, y, self.current_player):
             return False, "Invalid move: position is out of bounds or already occupied."
 
-        self.last_move = Move(x=x, y=y, player=self.current_player)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()])) # Save state after valid move
+        self.last_move = MoveRecord(x=x, y=y, player=self.current_player)
+        self._record_history([(x, y, self.current_player)]) # Save state after valid move
 
         self.check_game_over()
 
@@ -46,7 +166,6 @@ class GomokuGame(AbstractGame):
             return
 
         x, y, player = self.last_move.x, self.last_move.y, self.last_move.player
-        board_grid = self.board.get_grid()
 
         # Check for 5-in-a-row in all 8 directions
         directions = [
@@ -55,17 +174,15 @@ class GomokuGame(AbstractGame):
 
         for dx, dy in directions:
             count = 1
-            # Check one direction
+            # Check one direction (get_stone returns None out of bounds)
             for i in range(1, 5):
-                nx, ny = x + dx * i, y + dy * i
-                if self.board.is_valid_coordinate(nx, ny) and board_grid[ny][nx] == player:
+                if self.board.get_stone(x + dx * i, y + dy * i) == player:
                     count += 1
                 else:
                     break
             # Check opposite direction
             for i in range(1, 5):
-                nx, ny = x - dx * i, y - dy * i
-                if self.board.is_valid_coordinate(nx, ny) and board_grid[ny][nx] == player:
+                if self.board.get_stone(x - dx * i, y - dy * i) == player:
                     count += 1
                 else:
                     break
@@ -75,7 +192,7 @@ class GomokuGame(AbstractGame):
                 return
 
         # Check for draw (board full)
-        if all(self.board._grid[r][c] is not None for r in range(self.board.size) for c in range(self.board.size)):
+        if self.board.is_full():
             self.is_game_over = True
             self.message = "Draw: Board is full."
 
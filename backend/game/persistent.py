@@ -0,0 +1,75 @@
+from typing import Iterable, List, Optional, Tuple
+
+from board_battle_project.backend.game.types import Player
+
+Row = Tuple[Optional[Player], ...]
+
+class PersistentGrid:
+    """
+    Immutable board grid with structural sharing.
+    The grid is a tuple of row tuples. Updating a cell copies only the touched row and the
+    outer tuple of row references; every other row is shared with the previous version.
+    A branch that changes k cells therefore costs O(k * size) instead of O(size * size).
+    """
+    __slots__ = ("_rows",)
+
+    def __init__(self, rows: Tuple[Row, ...]):
+        self._rows = rows
+
+    @classmethod
+    def empty(cls, size: int) -> "PersistentGrid":
+        row: Row = (None,) * size
+        return cls((row,) * size) # Every row shares the same empty tuple
+
+    @classmethod
+    def from_grid(cls, grid: List[List[Optional[Player]]]) -> "PersistentGrid":
+        return cls(tuple(tuple(row) for row in grid))
+
+    @property
+    def size(self) -> int:
+        return len(self._rows)
+
+    def get(self, x: int, y: int) -> Optional[Player]:
+        """Get the player at (x, y), or None if empty or out of bounds."""
+        if 0 <= y < len(self._rows) and 0 <= x < len(self._rows[y]):
+            return self._rows[y][x]
+        return None
+
+    def set(self, x: int, y: int, player: Optional[Player]) -> "PersistentGrid":
+        """Return a new grid with (x, y) set to `player`."""
+        return self.update([(x, y, player)])
+
+    def update(self, changes: Iterable[Tuple[int, int, Optional[Player]]]) -> "PersistentGrid":
+        """Return a new grid with all `changes` applied. Each touched row is copied once."""
+        touched = {}
+        for x, y, player in changes:
+            if y not in touched:
+                touched[y] = list(self._rows[y])
+            touched[y][x] = player
+        if not touched:
+            return self
+        rows = list(self._rows)
+        for y, row in touched.items():
+            rows[y] = tuple(row)
+        return PersistentGrid(tuple(rows))
+
+    def diff(self, grid: List[List[Optional[Player]]]) -> List[Tuple[int, int, Optional[Player]]]:
+        """List the cells (x, y, player) where `grid` differs from this snapshot."""
+        changes = []
+        for y, (old_row, new_row) in enumerate(zip(self._rows, grid)):
+            if old_row == tuple(new_row):
+                continue
+            for x, (old, new) in enumerate(zip(old_row, new_row)):
+                if old != new:
+                    changes.append((x, y, new))
+        return changes
+
+    def to_grid(self) -> List[List[Optional[Player]]]:
+        """Return a mutable copy as a list of lists."""
+        return [list(row) for row in self._rows]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PersistentGrid) and self._rows == other._rows
+
+    def __hash__(self) -> int:
+        return hash(self._rows)
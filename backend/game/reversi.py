@@ -1,6 +1,6 @@
 from typing import Optional, List, Tuple
 from board_battle_project.backend.game.base import AbstractBoard, AbstractGame
-from board_battle_project.backend.models import Player, GameType, Move, BoardGrid
+from board_battle_project.backend.game.types import Player, GameType, MoveRecord
 
 class ReversiBoard(AbstractBoard):
     def __init__(self, size: int = 8):
@@ -95,7 +95,7 @@ class ReversiGame(AbstractGame):
             raise ValueError("Reversi board size must be 8x8.")
         super().__init__(board_size, GameType.REVERSI)
         self.board: ReversiBoard = self._create_board(board_size)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()]))
+        self._record_history()
         self.pass_count: int = 0 # To track consecutive passes
 
     def _create_board(self, size: int) -> ReversiBoard:
@@ -106,15 +106,16 @@ class ReversiGame(AbstractGame):
             return False, f"Game is already over. {self.winner.value} won."
         
         # Check if the move is valid according to Reversi rules (must flip pieces)
-        if not self.board.is_empty(x,y) or not self.board._get_flippable_pieces(x, y, self.current_player):
+        flipped = self.board._get_flippable_pieces(x, y, self.current_player) if self.board.is_empty(x, y) else []
+        if not flipped:
              return False, "Invalid move: position is out of bounds, already occupied, or does not flip any opponent pieces."
 
         # Make the move (places stone and flips)
         if not self.board.place_stone(x, y, self.current_player):
             return False, "Failed to place stone or flip pieces." # Should not happen if _get_flippable_pieces passed
 
-        self.last_move = Move(x=x, y=y, player=self.current_player)
-        self.history.append(BoardGrid(grid=[row[:] for row in self.board.get_grid()])) # Save state after valid move
+        self.last_move = MoveRecord(x=x, y=y, player=self.current_player)
+        self._record_history([(cx, cy, self.current_player) for cx, cy in [(x, y)] + flipped]) # Save state after valid move
         self.pass_count = 0 # Reset pass count on a successful move
 
         self.check_game_over()
@@ -156,6 +157,7 @@ class ReversiGame(AbstractGame):
         
         self.pass_count += 1
         self._switch_player()
+        self.version += 1
         if self.pass_count >= 2:
             self.is_game_over = True
             self.message = "Both players passed consecutively. Game over!"
@@ -211,6 +213,11 @@ class ReversiGame(AbstractGame):
         else:
             self.message += "It's a draw!"
 
+    def _capture_position(self) -> dict:
+        position = super()._capture_position()
+        position["pass_count"] = self.pass_count
+        return position
+
     def get_valid_moves_for_current_player(self) -> List[Tuple[int, int]]:
         """Expose valid moves for external use (e.g., AI or frontend hints)."""
         return self.board.get_valid_moves(self.current_player)
@@ -0,0 +1,26 @@
+"""
+Plain data types shared by the game engine (boards, rules, AI).
+This module and the rest of the engine depend only on the standard library, so worker
+processes can import them without the web stack. Pydantic API models in
+board_battle_project.backend.models are built from these at the API edge.
+"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+class Player(str, Enum):
+    BLACK = "BLACK"
+    WHITE = "WHITE"
+
+class GameType(str, Enum):
+    GOMOKU = "GOMOKU"
+    GO = "GO"
+    REVERSI = "REVERSI"
+
+Grid = List[List[Optional[Player]]]
+
+@dataclass(frozen=True, slots=True)
+class MoveRecord:
+    x: int
+    y: int
+    player: Player
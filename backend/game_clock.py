@@ -0,0 +1,69 @@
+from typing import Any, Dict, Optional
+
+from board_battle_project.backend.models import Player, TimeControl
+
+class GameClock:
+    """
+    Both players' clocks for one game (see TimeControl). Only the player to move has a running
+    clock; their time is charged when the turn passes (switch). The GameController keeps one
+    TimerWheel timer per clock, due when the running player would run out of time.
+    Times are time.monotonic() seconds.
+    """
+    def __init__(self, control: TimeControl, first: Optional[Player], now: float):
+        self.control = control
+        self.main_time = {Player.BLACK: control.main_time, Player.WHITE: control.main_time}
+        self.periods = {Player.BLACK: control.byoyomi_periods, Player.WHITE: control.byoyomi_periods}
+        self.running: Optional[Player] = first
+        self.turn_started = now
+
+    def _budget(self, player: Player) -> float:
+        """Time the player has for a whole turn (byo-yomi periods start fresh each turn)."""
+        return self.main_time[player] + self.periods[player] * self.control.byoyomi_time
+
+    def time_to_flag(self, now: float) -> Optional[float]:
+        """Seconds until the running player is out of time, None if no clock is running."""
+        if self.running is None:
+            return None
+        return max(0.0, self._budget(self.running) - (now - self.turn_started))
+
+    def switch(self, player: Optional[Player], now: float, increment: bool = True) -> None:
+        """
+        End the running player's turn (charging its time, plus the increment if it was played in
+        main time and `increment` is set) and start `player`'s. None stops the clocks.
+        """
+        mover = self.running
+        if mover is not None:
+            elapsed = now - self.turn_started
+            if elapsed <= self.main_time[mover]:
+                self.main_time[mover] -= elapsed
+                if increment:
+                    self.main_time[mover] += self.control.increment
+            else:
+                overtime = elapsed - self.main_time[mover]
+                self.main_time[mover] = 0.0
+                spent = int(overtime // self.control.byoyomi_time) if self.control.byoyomi_time else self.periods[mover]
+                self.periods[mover] = max(0, self.periods[mover] - spent)
+        self.running = player
+        self.turn_started = now
+
+    def state(self, now: float) -> Dict[str, Any]:
+        """
+        Clock message payload: each player's main time, byo-yomi periods and time left in the
+        current period, as of `now`. Clients count the running player's clock down from here.
+        """
+        players = {}
+        for player in (Player.BLACK, Player.WHITE):
+            main_time, periods, period_time = self.main_time[player], self.periods[player], self.control.byoyomi_time
+            if player == self.running:
+                elapsed = now - self.turn_started
+                if elapsed <= main_time:
+                    main_time -= elapsed
+                else:
+                    overtime = elapsed - main_time
+                    main_time = 0.0
+                    if period_time:
+                        periods = max(0, periods - int(overtime // period_time))
+                        period_time -= overtime % period_time
+            players[player.value.lower()] = {"mainTime": round(main_time, 2), "periods": periods,
+                                             "periodTime": round(period_time, 2)}
+        return {**players, "running": self.running.value if self.running else None}
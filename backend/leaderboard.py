@@ -0,0 +1,171 @@
+"""
+Per-game-type Elo ratings and the leaderboard served from memory.
+
+Ratings live in the ratings table and change only when a rated match is saved: the
+persistence worker calls apply_ratings in the same transaction as the match insert, and the
+resulting changes are pushed into the Leaderboard, so serving the leaderboard or a player's
+rank never runs an aggregate query.
+
+A match is rated when two different users played it and it has a result. Each rating moves by
+K * (score - expected score), with a larger K for a player's first PROVISIONAL_GAMES games.
+"""
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from board_battle_project.backend.db_models import Rating, User
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32
+PROVISIONAL_K = 48
+PROVISIONAL_GAMES = 20
+TOP_N = 100 # Entries kept ready-made for /api/leaderboard
+
+# Score of the black player for each result
+_BLACK_SCORES = {"BLACK_WON": 1.0, "WHITE_WON": 0.0, "DRAW": 0.5}
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+def k_factor(games: int) -> int:
+    return PROVISIONAL_K if games < PROVISIONAL_GAMES else K_FACTOR
+
+def rate_game(black: Rating, white: Rating, black_score: float) -> None:
+    """Update both ratings (and their game counts) in place for one game."""
+    black_expected = expected_score(black.rating, white.rating)
+    black_delta = k_factor(black.games) * (black_score - black_expected)
+    white_delta = k_factor(white.games) * (black_expected - black_score)
+    for rating, delta, score in ((black, black_delta, black_score), (white, white_delta, 1.0 - black_score)):
+        rating.rating += delta
+        rating.games += 1
+        if score == 1.0:
+            rating.wins += 1
+        elif score == 0.0:
+            rating.losses += 1
+        else:
+            rating.draws += 1
+
+def rating_entry(rating: Rating, username: str) -> Dict[str, Any]:
+    """Leaderboard entry of a rating, shaped like a dumped LeaderboardEntry (without rank)."""
+    return {
+        "userId": rating.user_id,
+        "username": username,
+        "gameType": rating.game_type,
+        "rating": round(rating.rating, 1),
+        "games": rating.games,
+        "wins": rating.wins,
+        "losses": rating.losses,
+        "draws": rating.draws,
+    }
+
+def apply_ratings(games: List[Tuple[str, Optional[int], Optional[int], Optional[str]]], db: Session) -> List[Dict[str, Any]]:
+    """
+    Rate a batch of saved games, given as (game type, black user id, white user id, result), in
+    order. Runs inside the caller's transaction (nothing is committed here). Returns the new
+    entries of the ratings that changed, for Leaderboard.apply.
+    """
+    rated = [(game_type, black_id, white_id, _BLACK_SCORES[result]) for game_type, black_id, white_id, result in games
+             if black_id and white_id and black_id != white_id and result in _BLACK_SCORES]
+    if not rated:
+        return []
+    user_ids = {user_id for _, black_id, white_id, _ in rated for user_id in (black_id, white_id)}
+    game_types = {game_type for game_type, _, _, _ in rated}
+    ratings = {
+        (rating.user_id, rating.game_type): rating
+        for rating in db.query(Rating)
+        .filter(Rating.user_id.in_(user_ids), Rating.game_type.in_(game_types))
+        .with_for_update()
+    }
+    usernames = dict(db.query(User.id, User.username).filter(User.id.in_(user_ids)).all())
+
+    changed = {}
+    for game_type, black_id, white_id, black_score in rated:
+        players = []
+        for user_id in (black_id, white_id):
+            key = (user_id, game_type)
+            if key not in ratings:
+                ratings[key] = Rating(user_id=user_id, game_type=game_type, rating=INITIAL_RATING,
+                                      games=0, wins=0, losses=0, draws=0)
+                db.add(ratings[key])
+            players.append(ratings[key])
+            changed[key] = ratings[key]
+        rate_game(players[0], players[1], black_score)
+    return [rating_entry(rating, usernames.get(user_id, "Unknown")) for (user_id, _), rating in changed.items()]
+
+class Leaderboard:
+    """
+    Every rated player of every game type, kept sorted in memory.
+    Loaded from the DB once (query_ratings), then kept current by apply with the changes the
+    persistence worker reports. Ranks are competition ranks (equal ratings share a rank) and
+    are found by binary search; the top TOP_N of each game type is cached until it changes.
+    Note: per process, like the room registry.
+    """
+    def __init__(self, top_n: int = TOP_N):
+        self.top_n = top_n
+        self.entries: Dict[str, Dict[int, Dict[str, Any]]] = {} # game type -> user id -> entry
+        self._order: Dict[str, List[Tuple[float, int]]] = {} # game type -> sorted (-rating, user id)
+        self._top: Dict[str, List[Dict[str, Any]]] = {} # game type -> ranked top entries
+        self.loaded = False
+        self.loading = False # Set while the first load runs; changes arriving meanwhile are kept
+        self._held: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def query_ratings(db: Session) -> List[Dict[str, Any]]:
+        """Entries of all ratings in the DB (one query, usernames joined in)."""
+        rows = db.query(Rating, User.username).join(User, User.id == Rating.user_id).all()
+        return [rating_entry(rating, username) for rating, username in rows]
+
+    def load(self, entries: List[Dict[str, Any]]) -> None:
+        """Fill the leaderboard with the result of query_ratings. Only the first load counts."""
+        self.loading = False
+        if self.loaded:
+            return
+        self.loaded = True
+        # Changes written while the query ran may be missing from it; they are newer, so apply them last
+        held, self._held = self._held, []
+        self.apply(entries)
+        self.apply(held)
+
+    def apply(self, entries: List[Dict[str, Any]]) -> None:
+        """Insert or replace entries (see apply_ratings)."""
+        if not self.loaded:
+            if self.loading:
+                self._held.extend(entries)
+            return # Not loaded yet: the first load reads the DB, which already has these
+        for entry in entries:
+            game_type, user_id = entry["gameType"], entry["userId"]
+            players = self.entries.setdefault(game_type, {})
+            order = self._order.setdefault(game_type, [])
+            old = players.get(user_id)
+            if old is not None:
+                del order[bisect_left(order, (-old["rating"], user_id))]
+            players[user_id] = entry
+            insort(order, (-entry["rating"], user_id))
+            self._top.pop(game_type, None)
+
+    def rank_of(self, game_type: str, rating: float) -> int:
+        return bisect_left(self._order.get(game_type, []), (-rating,)) + 1
+
+    def top(self, game_type: str, limit: int) -> List[Dict[str, Any]]:
+        """The best `limit` (at most top_n) players of a game type with their ranks. Shared, do not modify."""
+        if game_type not in self._top:
+            players = self.entries.get(game_type, {})
+            top = []
+            for position, (negative_rating, user_id) in enumerate(self._order.get(game_type, [])[:self.top_n]):
+                rank = position + 1
+                if top and top[-1]["rating"] == -negative_rating:
+                    rank = top[-1]["rank"] # Tied with the previous player
+                top.append({**players[user_id], "rank": rank})
+            self._top[game_type] = top
+        return self._top[game_type][:limit]
+
+    def lookup(self, game_type: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """A player's entry with their rank, or None if they have no rated games of this type."""
+        entry = self.entries.get(game_type, {}).get(user_id)
+        if entry is None:
+            return None
+        return {**entry, "rank": self.rank_of(game_type, entry["rating"])}
+
+    def size(self, game_type: str) -> int:
+        return len(self._order.get(game_type, []))
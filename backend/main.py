@@ -1,12 +1,18 @@
-from datetime import timedelta
+import asyncio
+from datetime import datetime, timedelta
 import os
-from sqlalchemy.orm import Session
-from fastapi import Depends, FastAPI, HTTPException, status, WebSocket, WebSocketDisconnect, Query
+import uuid
+from typing import Optional, Union
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, aliased
+from fastapi import Depends, FastAPI, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Request, Response
+from pydantic import BaseModel
 from board_battle_project.backend.auth import (
-    create_access_token, get_password_hash, verify_password,
+    create_access_token, get_password_hash, verify_password, get_user_by_username,
     get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM # Import SECRET_KEY, ALGORITHM
 )
-from board_battle_project.backend.connection_manager import ConnectionManager
+from board_battle_project.backend.connection_manager import ConnectionManager, PROTOCOL_FULL, PROTOCOL_DELTA
+from board_battle_project.backend.compact import ENCODING_JSON, encode, encoding_from_accept, json_bytes, media_type
 from jose import JWTError, jwt
 import json # Added json import
 
@@ -16,24 +22,41 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.exceptions import RequestValidationError # Added import
-from fastapi.responses import JSONResponse # Added import
+from fastapi.responses import JSONResponse, StreamingResponse # Added import
 
 from board_battle_project.backend.models import (
     GameConfig, GameState, StartGameResponse, MakeMoveRequest,
-    MoveResult, SimpleGameResponse, LoadGameRequest, PlayerRequest, Player, # Added Player
-    UserCreate, UserResponse, Token, TokenData, MatchInfo, MatchListResponse # Added TokenData
+    MoveResult, SimpleGameResponse, LoadGameRequest, PlayerRequest, Player, GameType, # Added Player
+    UserCreate, UserResponse, Token, TokenData, MatchInfo, MatchListResponse, # Added TokenData
+    AnalysisNodeInfo, Move, HistorySlice, ReplayPosition, MatchStatus, LeaderboardEntry, LeaderboardResponse
 )
 from board_battle_project.backend.game.controller import GameController
-from board_battle_project.backend.database import Base, engine, get_db
-from board_battle_project.backend.db_models import User as DBUser, Match
+from board_battle_project.backend.state_watch import StateWatch, state_key
+from board_battle_project.backend.room_registry import LOBBY_ROOM, RoomRegistry, room_info
+from board_battle_project.backend.leaderboard import INITIAL_RATING, TOP_N, Leaderboard
+from board_battle_project.backend.persistence import DRAIN_TIMEOUT
+from board_battle_project.backend.matchmaking import MatchmakingQueue, Ticket, matchmaking_channel
+from board_battle_project.backend.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_size
+from board_battle_project.backend.state_adapter import build_game_state, build_history_slice, game_state_json
+from board_battle_project.backend.game.base import AbstractBoard
+from board_battle_project.backend.game.gomoku import SparseGomokuBoard
+from board_battle_project.backend.database import Base, engine, run_db
+from board_battle_project.backend.db_models import User as DBUser, Match, MatchMoves
+from board_battle_project.backend.move_log import MoveLog, StoredHistory
 from board_battle_project.backend.auth import (
     create_access_token, get_password_hash, verify_password,
     get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by compact.json_bytes (orjson when installed)."""
+    def render(self, content) -> bytes:
+        return json_bytes(content)
+
 app = FastAPI(
     title="Board Battle API",
-    description="Backend API for Gomoku and Go games."
+    description="Backend API for Gomoku and Go games.",
+    default_response_class=FastJSONResponse
 )
 
 @app.exception_handler(RequestValidationError)
@@ -55,11 +78,27 @@ app.add_middleware(
 
 game_controller = GameController()
 connection_manager = ConnectionManager()
+state_watch = StateWatch() # Wakes /state long-polls and /events streams when a game changes
+room_registry = RoomRegistry() # Open rooms for the lobby, see /api/rooms and /ws/lobby
+leaderboard = Leaderboard() # Ratings per game type, see /api/leaderboard
+leaderboard_load_lock = asyncio.Lock() # Concurrent first requests share one load
+game_controller.persistence.on_ratings = leaderboard.apply # Saved rated games update it directly
+matchmaking = MatchmakingQueue() # Players waiting on /ws/matchmaking
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
-
-async def get_user_from_token(token: str, db: Session):
+# create_all skips tables that already exist, so add the list indexes to older databases here
+for index in Match.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+@app.on_event("shutdown")
+async def flush_pending_results():
+    """Write the finished games still queued for persistence before the process exits."""
+    if game_controller.persistence.pending:
+        print(f"Shutdown: Saving {len(game_controller.persistence.pending)} queued game result(s)")
+    await game_controller.persistence.drain(DRAIN_TIMEOUT)
+
+async def get_user_from_token(token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -72,94 +111,185 @@ async def get_user_from_token(token: str, db: Session):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(DBUser).filter(DBUser.username == token_data.username).first()
+    user = await run_db(get_user_by_username, token_data.username)
     if user is None:
         raise credentials_exception
     return user
 
+def game_state_message(message_type: str, seq: int, game) -> dict:
+    message = {"type": message_type, "seq": seq, "state": game_state_json(game)}
+    clock = game_controller.clock_state(game.game_id)
+    if clock:
+        message["clock"] = clock # Timed games: clocks as of this message
+    return message
+
+async def broadcast_game_event(room_id: str, game, event: str):
+    """
+    Broadcast a sequenced game event: GAME_DELTA (changed cells only) to delta-protocol clients,
+    the full GAME_STATE to everyone else. Both carry the room's next sequence number.
+    """
+    seq, delta = game_controller.get_room_stream(room_id).record(game, event)
+    state_watch.notify(game.game_id)
+
+    def build_message(protocol: str) -> dict:
+        if protocol == PROTOCOL_DELTA:
+            message = delta_message(seq, delta)
+            clock = game_controller.clock_state(game.game_id)
+            if clock:
+                message["clock"] = clock
+            return message
+        return game_state_message("GAME_STATE", seq, game)
+
+    await connection_manager.broadcast_per_protocol(room_id, build_message)
+
+def delta_message(seq: int, delta) -> dict:
+    return {"type": "GAME_DELTA", "seq": seq, "delta": delta.model_dump(mode="json", by_alias=True)}
+
+async def load_room_registry():
+    """Fill the lobby registry from the DB on first use (the query runs in the DB thread pool)."""
+    if not room_registry.loaded:
+        room_registry.load(await run_db(RoomRegistry.query_open_rooms))
+
+async def load_leaderboard():
+    """Fill the leaderboard from the ratings table on first use (the query runs in the DB thread pool)."""
+    if leaderboard.loaded:
+        return
+    async with leaderboard_load_lock:
+        if leaderboard.loaded: # Loaded by the request we waited for
+            return
+        leaderboard.loading = True
+        try:
+            entries = await run_db(Leaderboard.query_ratings)
+        except Exception:
+            leaderboard.loading = False # The next request tries again
+            raise
+        leaderboard.load(entries)
+
+async def publish_lobby(diff: Optional[dict]):
+    """Push a room registry change to lobby subscribers."""
+    if diff:
+        await connection_manager.broadcast(LOBBY_ROOM, diff)
+
+def build_resync_message(room_id: str) -> Optional[dict]:
+    """Full GAME_STATE of the room's game at the current sequence number (None if no game is running)."""
+    if room_id == LOBBY_ROOM:
+        return room_registry.snapshot_message()
+    game = game_controller.get_game(room_id)
+    if not game:
+        return None
+    return game_state_message("GAME_STATE", game_controller.get_room_stream(room_id).seq, game)
+
+# Outbound queues build a fresh snapshot with this after dropping updates for a slow client
+connection_manager.resync_builder = build_resync_message
+
+async def send_catch_up(websocket: WebSocket, room_id: str, last_seq: Optional[int]):
+    """
+    Bring a (re)connecting client up to date. With the last sequence number it saw, it gets only
+    the events it missed from the room's replay buffer: the missed GAME_DELTAs for delta clients,
+    the current GAME_STATE for full clients (nothing at all if it missed nothing). A full snapshot
+    is sent only without last_seq or when the gap is no longer in the buffer.
+    """
+    game = game_controller.get_game(room_id)
+    if not game:
+        return
+    stream = game_controller.get_room_stream(room_id)
+    missed = stream.missed_since(last_seq) if last_seq is not None else None
+    if missed is None:
+        messages = [game_state_message("GAME_STATE", stream.seq, game)]
+    elif connection_manager.protocols.get(websocket) == PROTOCOL_DELTA:
+        messages = [delta_message(seq, delta) for seq, delta in missed]
+    else:
+        messages = [game_state_message("GAME_STATE", stream.seq, game)] if missed else []
+    for message in messages:
+        await connection_manager.send(websocket, room_id, message)
+
 @app.websocket("/ws/game/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Query(...), db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Query(...), protocol: str = Query(PROTOCOL_FULL),
+                             encoding: str = Query(ENCODING_JSON), last_seq: Optional[int] = Query(None)):
     print(f"WS: Attempting connection to room {room_id}")
     try:
-        user = await get_user_from_token(token, db)
+        user = await get_user_from_token(token)
         print(f"WS: User {user.username} (ID: {user.id}) authenticated for room {room_id}")
     except Exception as e:
         print(f"WS: Auth failed: {e}")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    await connection_manager.connect(websocket, room_id)
+    await connection_manager.connect(websocket, room_id, protocol, encoding, user.id)
     
     # Room Lobby Logic
-    match = db.query(Match).filter(Match.id == room_id).first()
-    config = None
-    if match and match.moves_json and "meta" in match.moves_json:
-        config_dict = match.moves_json["meta"].get("config")
-        if config_dict:
-            config = GameConfig(**config_dict)
+    session = game_controller.get_session(room_id)
+    if session is None:
+        # First connection to the room: load its config from the DB (reconnects to a live room skip this)
+        config, black_id, white_id, restored_room = await run_db(open_room_match, room_id)
+
+        # Initialize/Get Session
+        session = game_controller.get_or_create_session(
+            match_id=room_id, 
+            config=config,
+            black_id=black_id,
+            white_id=white_id
+        )
 
-    # Initialize/Get Session
-    session = game_controller.get_or_create_session(
-        match_id=room_id, 
-        config=config,
-        black_id=match.player_black_id if match else None,
-        white_id=match.player_white_id if match else None
-    )
-    game_controller.update_session_players(room_id, user.id)
-    
-    # Restore match status if it was abandoned (e.g. due to temporary disconnect)
-    if match and match.status == MatchStatus.ABANDONED:
-        print(f"WS: Restoring room {room_id} status from ABANDONED to WAITING")
-        match.status = MatchStatus.WAITING
-        db.commit()
-    
-    # Broadcast initial room state
-    await connection_manager.broadcast(room_id, {
-        "type": "ROOM_UPDATE",
-        "session": json.loads(session.model_dump_json())
-    })
+        if restored_room:
+            await publish_lobby(room_registry.upsert(restored_room))
+
+    seated = game_controller.update_session_players(room_id, user.id)
+    if game_controller.end_reconnect_grace(room_id, user.id):
+        print(f"WS: User {user.username} reconnected to room {room_id} within the grace period")
+        seated = True # Back in their seat: everyone needs to know
+    room_update = {"type": "ROOM_UPDATE", "session": session.model_dump(mode="json")}
+    if seated:
+        await connection_manager.broadcast(room_id, room_update) # Seat changed: everyone needs it
+    else:
+        await connection_manager.send(websocket, room_id, room_update)
 
     try:
-        # Send initial state if game exists (reconnect)
-        game = game_controller.get_game(room_id)
-        if game:
-             await websocket.send_json({
-                 "type": "GAME_STATE",
-                 "state": json.loads(game.get_state().model_dump_json(by_alias=True))
-             })
+        # Send the game if one is running (reconnect): missed events only when last_seq is known
+        await send_catch_up(websocket, room_id, last_seq)
 
         while True:
             data = await websocket.receive_json()
-            print(f"WS: Received data from {user.username}: {data}")
-            
+            connection_manager.touch(websocket)
             action = data.get("action")
+            if action == "PONG":
+                continue # Heartbeat reply, touch() was all it needed
+            print(f"WS: Received data from {user.username}: {data}")
             
-            if action == "REQUEST_SWITCH":
+            if action == "RESYNC":
+                # Delta clients ask for what they missed after a sequence gap ("lastSeq"), or the full state
+                if game_controller.get_game(room_id):
+                    last_seen = data.get("lastSeq")
+                    await send_catch_up(websocket, room_id, last_seen if isinstance(last_seen, int) else None)
+                else:
+                    await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": "Game not found."})
+
+            elif action == "REQUEST_SWITCH":
                 session = game_controller.request_switch_sides(room_id, user.id)
                 await connection_manager.broadcast(room_id, {
                     "type": "ROOM_UPDATE",
-                    "session": json.loads(session.model_dump_json())
+                    "session": session.model_dump(mode="json")
                 })
             
             elif action == "APPROVE_SWITCH":
                 session = game_controller.approve_switch_sides(room_id, user.id)
                 await connection_manager.broadcast(room_id, {
                     "type": "ROOM_UPDATE",
-                    "session": json.loads(session.model_dump_json())
+                    "session": session.model_dump(mode="json")
                 })
 
             elif action == "REJECT_SWITCH":
                 session = game_controller.reject_switch_sides(room_id, user.id)
                 await connection_manager.broadcast(room_id, {
                     "type": "ROOM_UPDATE",
-                    "session": json.loads(session.model_dump_json())
+                    "session": session.model_dump(mode="json")
                 })
             
             elif action == "TOGGLE_READY":
                 session = game_controller.toggle_ready(room_id, user.id)
                 await connection_manager.broadcast(room_id, {
                     "type": "ROOM_UPDATE",
-                    "session": json.loads(session.model_dump_json())
+                    "session": session.model_dump(mode="json")
                 })
                 
                 # Check if both ready -> Start Game
@@ -175,20 +305,13 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                     game = game_controller.get_game(room_id)
                     
                     # Broadcast Start
-                    await connection_manager.broadcast(room_id, {
-                        "type": "GAME_START",
-                        "state": json.loads(game.get_state().model_dump_json(by_alias=True))
-                    })
+                    seq = game_controller.get_room_stream(room_id).reset(game)
+                    await connection_manager.broadcast(room_id, game_state_message("GAME_START", seq, game))
                     
                     # Update Match status in DB (optional, but good for consistency)
-                    # Note: we are in async loop, DB session usage might be tricky if not scoped correctly
-                    # db is from Depends, should be usable.
-                    match = db.query(Match).filter(Match.id == room_id).first()
-                    if match:
-                        match.status = MatchStatus.PLAYING
-                        match.player_black_id = session.black_player_id
-                        match.player_white_id = session.white_player_id
-                        db.commit()
+                    if await run_db(set_match_status, room_id, MatchStatus.PLAYING,
+                                    black_id=session.black_player_id, white_id=session.white_player_id):
+                        await publish_lobby(room_registry.remove(int(room_id)))
 
             elif action == "REMATCH":
                 # Reset ready status
@@ -199,7 +322,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                 
                 await connection_manager.broadcast(room_id, {
                     "type": "ROOM_UPDATE",
-                    "session": json.loads(session.model_dump_json())
+                    "session": session.model_dump(mode="json")
                 })
 
             elif action == "LEAVE":
@@ -209,26 +332,24 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                 if session:
                     await connection_manager.broadcast(room_id, {
                         "type": "ROOM_UPDATE",
-                        "session": json.loads(session.model_dump_json())
+                        "session": session.model_dump(mode="json")
                     })
                 
                 if cleaned_up:
                     print(f"WS: Room {room_id} is empty after LEAVE, setting match status to ABANDONED.")
                     try:
-                        match = db.query(Match).filter(Match.id == int(room_id)).first()
-                        if match:
-                            match.status = MatchStatus.ABANDONED
-                            db.commit()
+                        if await run_db(set_match_status, room_id, MatchStatus.ABANDONED):
+                            await publish_lobby(room_registry.remove(int(room_id)))
                     except Exception as e:
                         print(f"WS: DB Error during LEAVE cleanup: {e}")
-                        db.rollback()
                 
+                connection_manager.disconnect(websocket, room_id)
                 break # Close connection
 
             elif action == "RESIGN":
                 game = game_controller.get_game(room_id)
                 if not game:
-                    await websocket.send_json({"type": "ERROR", "message": "Game not found."})
+                    await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": "Game not found."})
                     continue
                 
                 # Determine which player is resigning
@@ -240,24 +361,18 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                     resigning_player = Player.WHITE
                 
                 if resigning_player:
-                    game_controller.resign_game(room_id, resigning_player)
-                    await connection_manager.broadcast(room_id, {
-                        "type": "GAME_STATE",
-                        "state": json.loads(game.get_state().model_dump_json(by_alias=True))
-                    })
-                    game_controller.save_game_result(room_id, db)
+                    result = game_controller.resign_game(room_id, resigning_player)
+                    await broadcast_game_event(room_id, game, "RESIGN")
+                    await game_controller.save_game_result(room_id)
                 else:
-                    await websocket.send_json({"type": "ERROR", "message": "You are not a player in this game."})
+                    await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": "You are not a player in this game."})
 
             elif action == "UNDO":
                 result = game_controller.request_undo(room_id, user.id)
                 if result.success:
-                    await connection_manager.broadcast(room_id, {
-                        "type": "GAME_STATE",
-                        "state": json.loads(result.state.model_dump_json(by_alias=True))
-                    })
+                    await broadcast_game_event(room_id, game_controller.get_game(room_id), "UNDO")
                 else:
-                    await websocket.send_json({"type": "ERROR", "message": result.error})
+                    await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": result.error})
 
             elif action == "PASS":
                 game = game_controller.get_game(room_id)
@@ -268,19 +383,16 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                     
                     if (game.current_player == Player.BLACK and not is_black) or \
                        (game.current_player == Player.WHITE and not is_white):
-                           await websocket.send_json({"type": "ERROR", "message": "Not your turn to pass."})
+                           await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": "Not your turn to pass."})
                            continue
 
                     result = game_controller.pass_turn(room_id, game.current_player)
                     if result.success:
-                        await connection_manager.broadcast(room_id, {
-                            "type": "GAME_STATE",
-                            "state": json.loads(result.state.model_dump_json(by_alias=True))
-                        })
+                        await broadcast_game_event(room_id, game, "PASS")
                         if result.state.is_game_over:
-                             game_controller.save_game_result(room_id, db)
+                             await game_controller.save_game_result(room_id)
                     else:
-                        await websocket.send_json({"type": "ERROR", "message": result.error})
+                        await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": result.error})
 
             elif action == "MOVE":
                 x = data.get("x")
@@ -298,68 +410,194 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Qu
                     if (game.current_player == Player.BLACK and not is_black) or \
                        (game.current_player == Player.WHITE and not is_white):
                            print("WS: Not user's turn")
-                           await websocket.send_json({"type": "ERROR", "message": "Not your turn"})
+                           await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": "Not your turn"})
                            continue
 
                     result = game_controller.make_move(room_id, x, y)
                     if result.success:
                         print(f"WS: Move success. Broadcasting to room {room_id}")
                         # Broadcast new state
-                        await connection_manager.broadcast(room_id, {
-                            "type": "GAME_STATE",
-                            "state": json.loads(result.state.model_dump_json(by_alias=True))
-                        })
+                        await broadcast_game_event(room_id, game, "MOVE")
                         # Check game over and save
                         if result.state.is_game_over:
-                             game_controller.save_game_result(room_id, db)
+                             await game_controller.save_game_result(room_id)
                     else:
                         print(f"WS: Move failed: {result.error}")
-                        await websocket.send_json({"type": "ERROR", "message": result.error})
+                        await connection_manager.send(websocket, room_id, {"type": "ERROR", "message": result.error})
 
     except WebSocketDisconnect:
         print(f"WS: User {user.username} disconnected from room {room_id}")
-        connection_manager.disconnect(websocket, room_id)
-        
-        # Handle disconnect logic (clear slot, auto-resign)
-        session, game, cleaned_up = game_controller.handle_player_disconnect(room_id, user.id)
-        
-        if session: # Only broadcast if session still exists (room not empty)
-            await connection_manager.broadcast(room_id, {
-                "type": "ROOM_UPDATE",
-                "session": json.loads(session.model_dump_json())
-            })
-        
-        if game and game.is_game_over:
-             await connection_manager.broadcast(room_id, {
-                "type": "GAME_STATE",
-                "state": json.loads(game.get_state().model_dump_json(by_alias=True))
-             })
-             game_controller.save_game_result(room_id, db)
-
-        if cleaned_up:
-            print(f"WS: Room {room_id} cleanup triggered. Updating DB...")
-            # Create a new transaction scope if needed, or use existing db
-            try:
-                match = db.query(Match).filter(Match.id == int(room_id)).first()
-                if match:
-                    print(f"WS: Room {room_id} found in DB. Current status: {match.status}. Setting to ABANDONED.")
-                    match.status = MatchStatus.ABANDONED
-                    db.add(match) # Ensure it's in session
-                    db.commit()
-                    print(f"WS: Room {room_id} status updated to ABANDONED.")
-                else:
-                    print(f"WS: Room {room_id} not found in DB during cleanup.")
-            except Exception as e:
-                print(f"WS: DB Error during cleanup: {e}")
-                db.rollback()
+        # Evicted/reaped connections were already cleaned up by connection_manager.evict
+        if connection_manager.disconnect(websocket, room_id):
+            await handle_player_left(room_id, user.id)
+
+def open_room_match(room_id: str, db: Session):
+    """
+    Config and seats of a room from its Match row, for the first connection to it: returns
+    (config, black_id, white_id, restored_room). A room that was ABANDONED (e.g. due to a
+    temporary disconnect) is put back to WAITING and its lobby entry returned as restored_room.
+    """
+    match = db.query(Match).filter(Match.id == room_id).first()
+    if not match:
+        return None, None, None, None
+    config = None
+    if match.moves_json and "meta" in match.moves_json:
+        config_dict = match.moves_json["meta"].get("config")
+        if config_dict:
+            config = GameConfig(**config_dict)
+    black_id, white_id = match.player_black_id, match.player_white_id
+
+    restored_room = None
+    if match.status == MatchStatus.ABANDONED:
+        print(f"WS: Restoring room {room_id} status from ABANDONED to WAITING")
+        match.status = MatchStatus.WAITING
+        db.commit()
+        restored_room = room_info(match)
+    return config, black_id, white_id, restored_room
+
+def set_match_status(room_id: str, match_status: MatchStatus, db: Session,
+                     black_id: Optional[int] = None, white_id: Optional[int] = None) -> bool:
+    """Set a room's Match status (and seats, when given). Returns False if there is no such match."""
+    try:
+        match = db.query(Match).filter(Match.id == int(room_id)).first()
+        if not match:
+            return False
+        match.status = match_status
+        if black_id is not None:
+            match.player_black_id = black_id
+        if white_id is not None:
+            match.player_white_id = white_id
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+
+async def handle_player_left(room_id: str, user_id: Optional[int]):
+    """
+    A player connection dropped (also run by connection_manager.evict for dead or reaped
+    sockets). In a running game the player keeps their seat for the reconnect grace period;
+    otherwise, or once it runs out, they leave the room (see remove_player).
+    """
+    if user_id is None:
+        return
+    if game_controller.begin_reconnect_grace(room_id, user_id):
+        session = game_controller.get_session(room_id)
+        await connection_manager.broadcast(room_id, {
+            "type": "ROOM_UPDATE",
+            "session": session.model_dump(mode="json")
+        })
+        return
+    await remove_player(room_id, user_id)
+
+async def remove_player(room_id: str, user_id: int):
+    """Leave logic for a player who is gone (clear slot, auto-resign, abandon empty room)."""
+    # Handle disconnect logic (clear slot, auto-resign)
+    session, game, cleaned_up = game_controller.handle_player_disconnect(room_id, user_id)
+    
+    if session: # Only broadcast if session still exists (room not empty)
+        await connection_manager.broadcast(room_id, {
+            "type": "ROOM_UPDATE",
+            "session": session.model_dump(mode="json")
+        })
+    
+    if game and game.is_game_over:
+         await broadcast_game_event(room_id, game, "RESIGN")
+         await game_controller.save_game_result(room_id)
+
+    if cleaned_up:
+        print(f"WS: Room {room_id} cleanup triggered. Setting match status to ABANDONED...")
+        try:
+            if await run_db(set_match_status, room_id, MatchStatus.ABANDONED):
+                await publish_lobby(room_registry.remove(int(room_id)))
+                print(f"WS: Room {room_id} status updated to ABANDONED.")
+            else:
+                print(f"WS: Room {room_id} not found in DB during cleanup.")
+        except Exception as e:
+            print(f"WS: DB Error during cleanup: {e}")
+
+async def handle_clock_timeout(room_id: str, player: Player):
+    """A player's clock ran out: they lose as if they had resigned."""
+    game = game_controller.get_game(room_id)
+    if not game or game.is_game_over:
+        return
+    game_controller.resign_game(room_id, player)
+    await broadcast_game_event(room_id, game, "TIMEOUT")
+    await game_controller.save_game_result(room_id)
+
+# Dead, slow and idle sockets dropped by the connection manager go through the same leave logic
+connection_manager.on_disconnect = handle_player_left
+# Timers of the controller's wheel: players out of time, and dropped players who did not return
+game_controller.on_clock_timeout = handle_clock_timeout
+game_controller.on_grace_expired = remove_player
+
+@app.websocket("/ws/watch/{room_id}")
+async def spectator_endpoint(websocket: WebSocket, room_id: str, token: str = Query(...), protocol: str = Query(PROTOCOL_FULL),
+                             encoding: str = Query(ENCODING_JSON)):
+    """
+    Read-only room feed for spectators. Spectators log in like players but take no seat: they
+    never touch the room session, and are served from the room's shared SpectatorChannel.
+    The only action they can send is RESYNC.
+    """
+    try:
+        user = await get_user_from_token(token)
+    except Exception as e:
+        print(f"WS: Spectator auth failed: {e}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    print(f"WS: User {user.username} (ID: {user.id}) watching room {room_id}")
+
+    spectator = await connection_manager.watch(websocket, room_id, protocol, encoding)
+    if not spectator:
+        print(f"WS: Spectator limit reached for room {room_id}")
+        return
+
+    session = game_controller.get_session(room_id)
+    if session:
+        spectator.send({"type": "ROOM_UPDATE", "session": session.model_dump(mode="json")})
+
+    try:
+        while True:
+            data = await websocket.receive_json()
+            connection_manager.touch(websocket)
+            if data.get("action") == "PONG":
+                continue
+            if data.get("action") == "RESYNC":
+                spectator.request_resync()
+            else:
+                spectator.send({"type": "ERROR", "message": "Spectators cannot take actions."})
+    except WebSocketDisconnect:
+        print(f"WS: Spectator left room {room_id}")
+    finally:
+        connection_manager.unwatch(websocket, room_id)
+
+def negotiated(request: Request, content: Union[BaseModel, dict]):
+    """
+    Return `content` (a model, or an already dumped dict such as game_state_json output) as
+    normal JSON, or packed (compact JSON / MessagePack, see compact.py) when the client's
+    Accept header asks for it. The response is built here, so FastAPI does not validate it
+    against the route's response_model again.
+    """
+    if isinstance(content, BaseModel):
+        content = content.model_dump(mode="json", by_alias=True)
+    encoding = encoding_from_accept(request.headers.get("accept"))
+    if encoding == ENCODING_JSON:
+        return FastJSONResponse(content=content, headers={"Vary": "Accept"})
+    return Response(content=encode(content, encoding), media_type=media_type(encoding), headers={"Vary": "Accept"})
+
+def state_response(request: Request, game, **fields):
+    """Negotiated response of `fields` plus the game's cached state under "state"."""
+    return negotiated(request, {**fields, "state": game_state_json(game)})
 
 @app.post("/api/game/start", response_model=StartGameResponse)
 async def start_game(
     config: GameConfig, 
+    request: Request,
     current_user: DBUser = Depends(get_current_active_user)
 ):
-    if not (8 <= config.board_size <= 19):
-        raise HTTPException(status_code=400, detail="Board size must be between 8 and 19.")
+    max_size = SparseGomokuBoard.MAX_SIZE if config.game_type == GameType.GOMOKU else AbstractBoard.MAX_SIZE
+    if not (AbstractBoard.MIN_SIZE <= config.board_size <= max_size):
+        raise HTTPException(status_code=400, detail=f"Board size must be between {AbstractBoard.MIN_SIZE} and {max_size}.")
     
     black_user_id = current_user.id if not config.player_black_is_ai else None
     white_user_id = current_user.id if not config.player_white_is_ai else None
@@ -384,25 +622,28 @@ async def start_game(
     
     try:
         game = game_controller.create_game(config, black_user_id, white_user_id)
-        return StartGameResponse(gameId=game.game_id, state=game.get_state())
+        await game_controller.play_ai_turn(game.game_id) # AI moves first
+        return state_response(request, game, gameId=game.game_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/game/{game_id}/move", response_model=MoveResult)
-async def make_move(game_id: str, move_request: MakeMoveRequest, db: Session = Depends(get_db)):
+async def make_move(game_id: str, move_request: MakeMoveRequest, request: Request):
     result = game_controller.make_move(game_id, move_request.x, move_request.y)
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
+    await game_controller.play_ai_turn(game_id) # AI reply, if the opponent is AI
     
     game = game_controller.get_game(game_id)
     if game and game.is_game_over:
-        game_controller.save_game_result(game_id, db)
+        await game_controller.save_game_result(game_id)
 
-    return result
+    state_watch.notify(game_id)
+    return state_response(request, game, success=True, error=None)
 
 @app.post("/api/game/{game_id}/trigger_ai", response_model=MoveResult)
-async def trigger_ai_move(game_id: str, db: Session = Depends(get_db)):
-    result = game_controller.trigger_ai_move(game_id)
+async def trigger_ai_move(game_id: str, request: Request):
+    result = await game_controller.trigger_ai_move(game_id)
     if not result.success:
         # It might be expected if frontend polls but it's not AI turn, so maybe not 400?
         # But for now, let's return 400 if it fails (e.g. wrong turn)
@@ -410,12 +651,13 @@ async def trigger_ai_move(game_id: str, db: Session = Depends(get_db)):
     
     game = game_controller.get_game(game_id)
     if game and game.is_game_over:
-        game_controller.save_game_result(game_id, db)
+        await game_controller.save_game_result(game_id)
         
-    return result
+    state_watch.notify(game_id)
+    return state_response(request, game, success=True, error=None)
 
 @app.post("/api/game/{game_id}/undo", response_model=SimpleGameResponse)
-async def undo_move(game_id: str):
+async def undo_move(game_id: str, request: Request):
     game = game_controller.get_game(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found.")
@@ -423,10 +665,11 @@ async def undo_move(game_id: str):
     success, message = game.undo_last_move()
     if not success:
         raise HTTPException(status_code=400, detail=message)
-    return SimpleGameResponse(state=game.get_state())
+    state_watch.notify(game_id)
+    return state_response(request, game)
 
 @app.post("/api/game/{game_id}/pass", response_model=SimpleGameResponse)
-async def pass_turn(game_id: str, request: PlayerRequest, db: Session = Depends(get_db)):
+async def pass_turn(game_id: str, request: PlayerRequest, http_request: Request):
     game = game_controller.get_game(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found.")
@@ -436,13 +679,14 @@ async def pass_turn(game_id: str, request: PlayerRequest, db: Session = Depends(
         raise HTTPException(status_code=400, detail=message)
     
     if game.is_game_over:
-        game_controller.save_game_result(game_id, db)
+        await game_controller.save_game_result(game_id)
     
-    return SimpleGameResponse(state=game.get_state())
+    state_watch.notify(game_id)
+    return state_response(http_request, game)
 
 
 @app.post("/api/game/{game_id}/resign", response_model=SimpleGameResponse)
-async def resign_game(game_id: str, request: PlayerRequest, db: Session = Depends(get_db)):
+async def resign_game(game_id: str, request: PlayerRequest, http_request: Request):
     game = game_controller.get_game(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found.")
@@ -450,51 +694,192 @@ async def resign_game(game_id: str, request: PlayerRequest, db: Session = Depend
     game.resign(request.player)
     
     if game.is_game_over:
-        game_controller.save_game_result(game_id, db)
+        await game_controller.save_game_result(game_id)
 
-    return SimpleGameResponse(state=game.get_state())
+    state_watch.notify(game_id)
+    return state_response(http_request, game)
+
+MAX_LONG_POLL = 30.0 # Longest a /state request may be held with ?wait=
+SSE_KEEPALIVE = 15.0 # Seconds between comment lines on an idle /events stream
+_ETAG_SALT = uuid.uuid4().hex[:8] # Versions restart with each server process and game instance
+
+def state_etag(game, encoding: str, include_history: bool) -> str:
+    """ETag of a /state representation: the game's state_key plus what makes the body differ."""
+    return f'"{_ETAG_SALT}.{state_key(game)}.{encoding}{".h" if include_history else ""}"'
 
 @app.get("/api/game/{game_id}/state", response_model=GameState)
-async def get_game_state(game_id: str):
+async def get_game_state(game_id: str, request: Request, include_history: bool = False, wait: float = 0):
+    """
+    Current state with conditional GET: the ETag follows the game's version and a matching
+    If-None-Match gets 304 Not Modified. With `wait` (seconds, long-poll) a matching request
+    is held until the version advances or the wait runs out.
+    """
+    game = game_controller.get_game(game_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found.")
+
+    encoding = encoding_from_accept(request.headers.get("accept"))
+    if_none_match = request.headers.get("if-none-match")
+    if wait > 0 and if_none_match == state_etag(game, encoding, include_history):
+        game = await state_watch.wait_for_change(lambda: game_controller.get_game(game_id), state_key(game),
+                                                 min(wait, MAX_LONG_POLL))
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found.")
+
+    etag = state_etag(game, encoding, include_history)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if include_history:
+        response = negotiated(request, build_game_state(game, include_history=True))
+    else:
+        response = negotiated(request, game_state_json(game))
+    response.headers.update(headers)
+    return response
+
+@app.get("/api/game/{game_id}/events")
+async def game_state_events(game_id: str, request: Request):
+    """
+    Server-Sent Events stream of the game state: one "state" event (id = the game's state_key)
+    each time the game changes, a rematch included. A reconnecting EventSource sends
+    Last-Event-ID and only gets a new event if the game changed since.
+    """
+    if not game_controller.get_game(game_id):
+        raise HTTPException(status_code=404, detail="Game not found.")
+    sent_key = request.headers.get("last-event-id")
+
+    async def stream():
+        nonlocal sent_key
+        while not await request.is_disconnected():
+            game = game_controller.get_game(game_id)
+            if game is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            if state_key(game) != sent_key:
+                sent_key = state_key(game)
+                data = json_bytes(game_state_json(game)).decode("utf-8")
+                yield f"id: {sent_key}\nevent: state\ndata: {data}\n\n"
+                continue
+            game = await state_watch.wait_for_change(lambda: game_controller.get_game(game_id), sent_key, SSE_KEEPALIVE)
+            if game is not None and state_key(game) == sent_key:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/game/{game_id}/history", response_model=HistorySlice)
+async def get_game_history(game_id: str, request: Request, start: int = 0, end: Optional[int] = None):
+    """Board snapshots for plies [start, end) (end defaults to the latest ply)."""
+    game = game_controller.get_game(game_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found.")
+    return negotiated(request, build_history_slice(game, start, end))
+
+# --- Analysis (variation tree) Routes ---
+def _analysis_node_info(node) -> AnalysisNodeInfo:
+    position = node.position
+    return AnalysisNodeInfo(
+        nodeId=node.node_id,
+        parentId=node.parent.node_id if node.parent else None,
+        move=Move(x=node.move[0], y=node.move[1], player=node.player) if node.move else None,
+        isPass=node.is_pass,
+        grid=node.grid.to_grid(),
+        currentPlayer=position["current_player"],
+        isGameOver=position["is_game_over"],
+        winner=position["winner"],
+        message=position["message"],
+        children=[child.node_id for child in node.children]
+    )
+
+def _get_analysis(game_id: str):
+    game = game_controller.get_game(game_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found.")
+    if game.analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis has not been started for this game.")
+    return game.analysis
+
+@app.post("/api/game/{game_id}/analysis", response_model=AnalysisNodeInfo)
+async def start_analysis(game_id: str):
     game = game_controller.get_game(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found.")
-    return game.get_state()
+    return _analysis_node_info(game.start_analysis().root)
+
+@app.get("/api/game/{game_id}/analysis/{node_id}", response_model=AnalysisNodeInfo)
+async def get_analysis_node(game_id: str, node_id: int):
+    node = _get_analysis(game_id).get_node(node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Variation not found.")
+    return _analysis_node_info(node)
+
+@app.post("/api/game/{game_id}/analysis/{node_id}/move", response_model=AnalysisNodeInfo)
+async def analysis_move(game_id: str, node_id: int, move_request: MakeMoveRequest):
+    try:
+        success, message, node = _get_analysis(game_id).play(node_id, move_request.x, move_request.y)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
+    return _analysis_node_info(node)
+
+@app.post("/api/game/{game_id}/analysis/{node_id}/pass", response_model=AnalysisNodeInfo)
+async def analysis_pass(game_id: str, node_id: int):
+    try:
+        success, message, node = _get_analysis(game_id).pass_turn(node_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
+    return _analysis_node_info(node)
+
+@app.delete("/api/game/{game_id}/analysis/{node_id}")
+async def delete_analysis_branch(game_id: str, node_id: int):
+    if not _get_analysis(game_id).remove_branch(node_id):
+        raise HTTPException(status_code=400, detail="Variation not found or is the root position.")
+    return {"message": "Variation deleted successfully"}
 
 from fastapi.responses import FileResponse # Added import
 
 # ...
 
 @app.post("/api/game/load", response_model=StartGameResponse)
-async def load_game(request: LoadGameRequest):
+async def load_game(request: LoadGameRequest, http_request: Request):
     try:
         game = game_controller.load_game(
             request.config, # Pass config directly
             request.state
         )
-        return StartGameResponse(gameId=game.game_id, state=game.get_state())
+        await game_controller.play_ai_turn(game.game_id) # The loaded position may have the AI to move
+        return state_response(http_request, game, gameId=game.game_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 # --- Auth Routes ---
 @app.post("/api/auth/register", response_model=UserCreate)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(DBUser).filter(DBUser.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_password = get_password_hash(user.password)
-    db_user = DBUser(username=user.username, hashed_password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+async def register_user(user: UserCreate):
+    # The lookup, the password hash (bcrypt is slow on purpose) and the insert all run off the event loop
+    def create_user(db: Session):
+        db_user = db.query(DBUser).filter(DBUser.username == user.username).first()
+        if db_user:
+            raise HTTPException(status_code=400, detail="Username already registered")
+        
+        hashed_password = get_password_hash(user.password)
+        db_user = DBUser(username=user.username, hashed_password=hashed_password)
+        db.add(db_user)
+        db.commit()
+
+    await run_db(create_user)
     return user
 
 @app.post("/api/auth/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    def check_password(db: Session):
+        user = get_user_by_username(form_data.username, db)
+        return user if user and verify_password(form_data.password, user.hashed_password) else None
+
+    user = await run_db(check_password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -510,6 +895,23 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 async def read_users_me(current_user: DBUser = Depends(get_current_active_user)):
     return current_user # Return DB object directly
 
+@app.get("/api/leaderboard/{game_type}", response_model=LeaderboardResponse)
+async def get_leaderboard(game_type: GameType, limit: int = Query(50, ge=1, le=TOP_N)):
+    """Best rated players of a game type, served from the in-memory leaderboard."""
+    await load_leaderboard()
+    body = {"gameType": game_type.value, "entries": leaderboard.top(game_type.value, limit),
+            "totalPlayers": leaderboard.size(game_type.value)}
+    return Response(content=json_bytes(body), media_type="application/json")
+
+@app.get("/api/leaderboard/{game_type}/users/{user_id}", response_model=LeaderboardEntry)
+async def get_leaderboard_entry(game_type: GameType, user_id: int):
+    """A player's rating and rank in a game type (404 if they have no rated games of it)."""
+    await load_leaderboard()
+    entry = leaderboard.lookup(game_type.value, user_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No rated games of this type.")
+    return Response(content=json_bytes(entry), media_type="application/json")
+
 
 from board_battle_project.backend.models import MatchStatus # Import MatchStatus
 
@@ -517,31 +919,175 @@ from board_battle_project.backend.models import MatchStatus # Import MatchStatus
 
 # --- Room Management Routes ---
 
+LOBBY_MAX_SUBSCRIBERS = 5000 # Lobby WebSocket clients per process
+
 @app.get("/api/rooms", response_model=MatchListResponse)
-async def get_rooms(db: Session = Depends(get_db)):
-    matches = db.query(Match).filter(Match.status == MatchStatus.WAITING).order_by(Match.start_time.desc()).all()
-    
-    room_list = []
-    for match in matches:
-        player_black_name = "Unknown"
-        if match.player_black_id:
-            user = db.query(DBUser).filter(DBUser.id == match.player_black_id).first()
-            if user: player_black_name = user.username
-            
-        room_list.append(MatchInfo(
-            id=match.id,
-            gameType=match.game_type,
-            playerBlackName=player_black_name,
-            playerWhiteName="Waiting...",
-            result=None,
-            startTime=match.start_time.isoformat() if match.start_time else "",
-            endTime=None,
-            movesJson=[]
-        ))
-    return MatchListResponse(matches=room_list)
+async def get_rooms(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    game_type: Optional[GameType] = Query(None, alias="gameType")
+):
+    """
+    Open rooms, served from the in-memory registry (the DB is only read on the first call).
+    Without parameters the whole list is returned from the cached body; with limit, cursor or
+    gameType a page is cut from the registry and nextCursor points at the next one.
+    """
+    await load_room_registry()
+    if limit is None and cursor is None and game_type is None:
+        return Response(content=room_registry.snapshot_json(), media_type="application/json")
+    after = decode_cursor(cursor) if cursor else None
+    rooms, last = room_registry.page(game_type.value if game_type else None, page_size(limit), after)
+    next_cursor = encode_cursor(*last) if last else None
+    return Response(content=json_bytes({"matches": rooms, "nextCursor": next_cursor}), media_type="application/json")
+
+def notify_matchmaking(user_id: int, message: dict):
+    """
+    Send a message to a player's matchmaking connection. Goes to the subscriber's own outbox
+    rather than the channel log, which a subscriber only reads from its first snapshot on.
+    """
+    channel = connection_manager.channels.get(matchmaking_channel(user_id))
+    if channel:
+        for subscriber in channel.spectators.values():
+            subscriber.send(message)
+
+def in_matchmaking(user_id: int) -> bool:
+    """Whether a player's matchmaking connection is still open."""
+    channel = connection_manager.channels.get(matchmaking_channel(user_id))
+    return bool(channel and channel.spectators)
+
+async def start_matched_game(first: Ticket, second: Ticket):
+    """
+    Open the room of a matchmaking pair and send both players MATCH_FOUND. The Match row is
+    written first; the RoomSession is then created and the players told with no await in
+    between, so nobody can reach the room before it is complete. The player who waited longer
+    plays black. The room is not listed in the lobby (it is already full).
+    If a player leaves while the row is written, the row is abandoned and the other player
+    goes back into the queue.
+    """
+    black, white = first, second
+    config = GameConfig(gameType=black.game_type, boardSize=black.board_size)
+    meta_data = {
+        "config": config.model_dump(by_alias=True),
+        "black_player_name": black.username,
+        "white_player_name": white.username,
+        "matchmaking": True
+    }
+
+    def insert(db: Session) -> int:
+        match = Match(
+            player_black_id=black.user_id,
+            player_white_id=white.user_id,
+            game_type=config.game_type.value,
+            status=MatchStatus.WAITING, # PLAYING once both are ready, as in any room
+            moves_json={"meta": meta_data, "history": []},
+        )
+        db.add(match)
+        db.commit()
+        return match.id
+
+    try:
+        room_id = str(await run_db(insert))
+    except Exception as e:
+        print(f"Matchmaking: Could not create a room for {black.username} and {white.username}: {e}")
+        for ticket in (black, white):
+            notify_matchmaking(ticket.user_id, {"type": "ERROR", "message": "Could not create the game room, please queue again."})
+        return
+
+    gone = [ticket for ticket in (black, white) if not in_matchmaking(ticket.user_id)]
+    if gone:
+        print(f"Matchmaking: {', '.join(t.username for t in gone)} left before room {room_id} was ready, abandoning it")
+        for ticket in (black, white):
+            if ticket not in gone:
+                await matchmaking.join(ticket) # Keeps its waiting time (and widened window)
+        try:
+            await run_db(set_match_status, room_id, MatchStatus.ABANDONED)
+        except Exception as e:
+            print(f"Matchmaking: Could not abandon room {room_id}: {e}")
+        return
+
+    game_controller.get_or_create_session(room_id, config=config, black_id=black.user_id, white_id=white.user_id)
+    for ticket, color, opponent in ((black, Player.BLACK, white), (white, Player.WHITE, black)):
+        notify_matchmaking(ticket.user_id, {
+            "type": "MATCH_FOUND",
+            "roomId": room_id,
+            "color": color.value,
+            "opponent": {"userId": opponent.user_id, "username": opponent.username, "rating": round(opponent.rating, 1)}
+        })
+
+matchmaking.on_match = start_matched_game
+
+@app.websocket("/ws/matchmaking")
+async def matchmaking_endpoint(websocket: WebSocket, token: str = Query(...), game_type: GameType = Query(..., alias="gameType"),
+                               board_size: int = Query(..., alias="boardSize"), encoding: str = Query(ENCODING_JSON)):
+    """
+    Matchmaking queue: the player waits here for an opponent with a similar rating in the same
+    game type and board size. Sends MATCHMAKING_QUEUED on joining, then MATCH_FOUND with the
+    room id and colour once paired (the client then opens /ws/game/{roomId} as usual). Closing
+    the socket or sending {"action": "CANCEL"} leaves the queue.
+    """
+    try:
+        user = await get_user_from_token(token)
+    except Exception as e:
+        print(f"WS: Matchmaking auth failed: {e}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    max_size = SparseGomokuBoard.MAX_SIZE if game_type == GameType.GOMOKU else AbstractBoard.MAX_SIZE
+    if not (AbstractBoard.MIN_SIZE <= board_size <= max_size):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await load_leaderboard()
+    entry = leaderboard.lookup(game_type.value, user.id)
+    rating = entry["rating"] if entry else INITIAL_RATING
+
+    # One queue connection per player: the channel is theirs alone
+    channel = matchmaking_channel(user.id)
+    subscriber = await connection_manager.watch(websocket, channel, encoding=encoding, limit=1)
+    if not subscriber:
+        return
+    try:
+        subscriber.send({
+            "type": "MATCHMAKING_QUEUED", "gameType": game_type.value, "boardSize": board_size,
+            "rating": round(rating, 1), "waiting": matchmaking.size(game_type.value, board_size)
+        })
+        await matchmaking.join(Ticket(user.id, user.username, rating, game_type.value, board_size))
+        while True:
+            data = await websocket.receive_json()
+            connection_manager.touch(websocket)
+            if data.get("action") == "CANCEL":
+                matchmaking.leave(user.id)
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        matchmaking.leave(user.id)
+        connection_manager.unwatch(websocket, channel)
+
+@app.websocket("/ws/lobby")
+async def lobby_endpoint(websocket: WebSocket, encoding: str = Query(ENCODING_JSON)):
+    """
+    Lobby feed: a LOBBY_SNAPSHOT of the open rooms, then a LOBBY_UPDATE diff (op added, updated
+    or removed) for every change. Served from a spectator channel, so a client that falls behind
+    simply gets a new snapshot; it can also ask for one with RESYNC.
+    """
+    await load_room_registry()
+    subscriber = await connection_manager.watch(websocket, LOBBY_ROOM, encoding=encoding, limit=LOBBY_MAX_SUBSCRIBERS)
+    if not subscriber:
+        return
+    try:
+        while True:
+            data = await websocket.receive_json()
+            connection_manager.touch(websocket)
+            if data.get("action") == "RESYNC":
+                subscriber.request_resync()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection_manager.unwatch(websocket, LOBBY_ROOM)
 
 @app.post("/api/rooms/create", response_model=MatchInfo)
-async def create_room(config: GameConfig, current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def create_room(config: GameConfig, current_user: DBUser = Depends(get_current_active_user)):
     # Create a match record in WAITING state
     # Store config in meta for later retrieval
     meta_data = {
@@ -556,9 +1102,14 @@ async def create_room(config: GameConfig, current_user: DBUser = Depends(get_cur
         status=MatchStatus.WAITING,
         moves_json={"meta": meta_data, "history": []}, 
     )
-    db.add(new_match)
-    db.commit()
-    db.refresh(new_match)
+
+    def insert(db: Session):
+        db.add(new_match)
+        db.commit()
+        db.refresh(new_match)
+
+    await run_db(insert)
+    await publish_lobby(room_registry.upsert(room_info(new_match, current_user.username)))
     
     return MatchInfo(
         id=new_match.id,
@@ -572,32 +1123,36 @@ async def create_room(config: GameConfig, current_user: DBUser = Depends(get_cur
     )
 
 @app.post("/api/rooms/{match_id}/join", response_model=MatchInfo)
-async def join_room(match_id: int, current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    match = db.query(Match).filter(Match.id == match_id, Match.status == MatchStatus.WAITING).first()
-    if not match:
-        raise HTTPException(status_code=404, detail="Room not found or already full.")
-    
-    if match.player_black_id == current_user.id:
-        raise HTTPException(status_code=400, detail="You cannot join your own room.")
+async def join_room(match_id: int, current_user: DBUser = Depends(get_current_active_user)):
+    def take_white_seat(db: Session):
+        match = db.query(Match).filter(Match.id == match_id, Match.status == MatchStatus.WAITING).first()
+        if not match:
+            raise HTTPException(status_code=404, detail="Room not found or already full.")
+        
+        if match.player_black_id == current_user.id:
+            raise HTTPException(status_code=400, detail="You cannot join your own room.")
 
-    # Update match to have a white player, but KEEP status as WAITING until both ready
-    match.player_white_id = current_user.id
-    # match.status = MatchStatus.PLAYING # Don't start yet
-    
-    # Update white player name in meta if possible
-    if isinstance(match.moves_json, dict) and "meta" in match.moves_json:
-        new_json = dict(match.moves_json)
-        new_json["meta"]["white_player_name"] = current_user.username
-        match.moves_json = new_json
-
-    db.commit()
-    db.refresh(match)
+        # Update match to have a white player, but KEEP status as WAITING until both ready
+        match.player_white_id = current_user.id
+        # match.status = MatchStatus.PLAYING # Don't start yet
+        
+        # Update white player name in meta if possible
+        if isinstance(match.moves_json, dict) and "meta" in match.moves_json:
+            new_json = dict(match.moves_json)
+            new_json["meta"]["white_player_name"] = current_user.username
+            match.moves_json = new_json
+
+        db.commit()
+        db.refresh(match)
+
+        # Get player names
+        player_black = db.query(DBUser).filter(DBUser.id == match.player_black_id).first()
+        return match, player_black.username if player_black else "Unknown"
+
+    match, player_black_name = await run_db(take_white_seat)
+    await publish_lobby(room_registry.upsert(room_info(match, white_name=current_user.username)))
     
     # Do NOT Initialize Game in Memory here. Wait for WS Ready.
-
-    # Get player names
-    player_black = db.query(DBUser).filter(DBUser.id == match.player_black_id).first()
-    player_black_name = player_black.username if player_black else "Unknown"
     
     return MatchInfo(
         id=match.id,
@@ -611,87 +1166,138 @@ async def join_room(match_id: int, current_user: DBUser = Depends(get_current_ac
     )
 
 # --- Replay Routes ---
+def replay_player_names(meta, black_id, white_id, black_username, white_username):
+    """Display names of a match's players: the joined usernames, or AI labels from the saved meta."""
+    meta = meta if isinstance(meta, dict) else {}
+    names = []
+    for color, user_id, username in (("black", black_id, black_username), ("white", white_id, white_username)):
+        is_ai = meta.get(f"{color}_is_ai", False)
+        ai_level = meta.get(f"{color}_ai_level", "")
+        name = f"AI ({ai_level})" if is_ai and ai_level else "AI"
+        if not is_ai and user_id and username:
+            name = username
+        names.append(name)
+    return names
+
+def load_replay(match_id: int, current_user: DBUser, db: Session):
+    """A match the user played in, with its players' display names. Raises 404 / 403."""
+    black, white = aliased(DBUser), aliased(DBUser)
+    row = (
+        db.query(Match, black.username, white.username)
+        .outerjoin(black, black.id == Match.player_black_id)
+        .outerjoin(white, white.id == Match.player_white_id)
+        .filter(Match.id == match_id)
+        .first()
+    )
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Replay not found.")
+    match, black_username, white_username = row
+    
+    # Ensure user is authorized to view this replay (either participated or admin/public game)
+    # For now, allowing only participants to view their own replays
+    if not (match.player_black_id == current_user.id or match.player_white_id == current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized to view this replay.")
+    
+    player_black_name, player_white_name = replay_player_names(
+        replay_meta(match), match.player_black_id, match.player_white_id, black_username, white_username
+    )
+    return match, player_black_name, player_white_name
+
+def replay_meta(match: Match) -> dict:
+    return (match.moves_json.get("meta") or {}) if isinstance(match.moves_json, dict) else {}
+
+def replay_history(match: Match) -> Union[MoveLog, StoredHistory]:
+    """The match's boards: its move log, or the boards stored in moves_json by older saves."""
+    if match.move_log is not None:
+        return MoveLog.from_bytes(GameType(match.game_type), match.move_log.data)
+    moves_json = match.moves_json
+    history = moves_json.get("history") if isinstance(moves_json, dict) else moves_json
+    return StoredHistory(GameType(match.game_type), history or [])
+
+def replay_moves_json(match: Match):
+    """
+    The match's moves_json with "history" filled in: rebuilt from the move log, or as stored
+    for matches saved before move logs existed.
+    """
+    if match.move_log is None:
+        return match.moves_json
+    moves_json = dict(match.moves_json) if isinstance(match.moves_json, dict) else {}
+    moves_json["history"] = replay_history(match).history_json()
+    return moves_json
+
 @app.get("/api/replays/me", response_model=MatchListResponse)
-async def get_my_replays(current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    matches = db.query(Match).filter(
-        (Match.player_black_id == current_user.id) | (Match.player_white_id == current_user.id)
-    ).order_by(Match.start_time.desc()).all()
+async def get_my_replays(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    game_type: Optional[GameType] = Query(None, alias="gameType"),
+    result: Optional[str] = None,
+    current_user: DBUser = Depends(get_current_active_user)
+):
+    """
+    The user's matches, newest first, one page at a time. Pass the returned nextCursor as
+    ?cursor= for the next page. One query: only the listed columns plus the meta part of
+    moves_json are read, and both usernames are joined in.
+    """
+    after_time, after_id = decode_cursor(cursor) if cursor else (None, None)
+
+    def page_rows(db: Session):
+        black, white = aliased(DBUser), aliased(DBUser)
+        query = (
+            db.query(
+                Match.id, Match.game_type, Match.result, Match.start_time, Match.end_time,
+                Match.player_black_id, Match.player_white_id, Match.moves_json["meta"],
+                black.username, white.username,
+            )
+            .outerjoin(black, black.id == Match.player_black_id)
+            .outerjoin(white, white.id == Match.player_white_id)
+            .filter(or_(Match.player_black_id == current_user.id, Match.player_white_id == current_user.id))
+        )
+        if game_type:
+            query = query.filter(Match.game_type == game_type.value)
+        if result:
+            query = query.filter(Match.result == result)
+        if cursor:
+            # Compare against the anchor row's stored start_time (exact match whatever the DB's
+            # datetime format); the time in the cursor is only used if that replay was deleted
+            anchor = aliased(Match)
+            anchor_time = func.coalesce(
+                db.query(anchor.start_time).filter(anchor.id == after_id).scalar_subquery(),
+                datetime.fromisoformat(after_time) if after_time else None,
+            )
+            query = query.filter(or_(
+                Match.start_time < anchor_time,
+                and_(Match.start_time == anchor_time, Match.id < after_id),
+            ))
+        return query.order_by(Match.start_time.desc(), Match.id.desc()).limit(limit + 1).all()
+
+    rows = await run_db(page_rows)
 
     replay_list = []
-    for match in matches:
-        # Check metadata for AI status
-        black_is_ai = False
-        white_is_ai = False
-        black_ai_level = ""
-        white_ai_level = ""
-        
-        if isinstance(match.moves_json, dict) and "meta" in match.moves_json:
-            meta = match.moves_json["meta"]
-            black_is_ai = meta.get("black_is_ai", False)
-            white_is_ai = meta.get("white_is_ai", False)
-            black_ai_level = meta.get("black_ai_level", "")
-            white_ai_level = meta.get("white_ai_level", "")
-
-        player_black_name = f"AI ({black_ai_level})" if black_is_ai and black_ai_level else "AI"
-        if not black_is_ai and match.player_black_id:
-            player_black_user = db.query(DBUser).filter(DBUser.id == match.player_black_id).first()
-            if player_black_user:
-                player_black_name = player_black_user.username
-        
-        player_white_name = f"AI ({white_ai_level})" if white_is_ai and white_ai_level else "AI"
-        if not white_is_ai and match.player_white_id:
-            player_white_user = db.query(DBUser).filter(DBUser.id == match.player_white_id).first()
-            if player_white_user:
-                player_white_name = player_white_user.username
-
+    for match_id, match_game_type, match_result, start_time, end_time, black_id, white_id, meta, black_username, white_username in rows[:limit]:
+        player_black_name, player_white_name = replay_player_names(meta, black_id, white_id, black_username, white_username)
         replay_list.append(MatchInfo(
-            id=match.id,
-            gameType=match.game_type,
+            id=match_id,
+            gameType=match_game_type,
             playerBlackName=player_black_name,
             playerWhiteName=player_white_name,
-            result=match.result,
-            startTime=match.start_time.isoformat() if match.start_time else None,
-            endTime=match.end_time.isoformat() if match.end_time else None,
+            result=match_result,
+            startTime=start_time.isoformat() if start_time else None,
+            endTime=end_time.isoformat() if end_time else None,
             movesJson=[] # Don't send all moves in list view to save bandwidth
         ))
-    return MatchListResponse(matches=replay_list)
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(replay_list[-1].start_time, replay_list[-1].id)
+    return MatchListResponse(matches=replay_list, nextCursor=next_cursor)
 
 @app.get("/api/replays/{match_id}", response_model=MatchInfo)
-async def get_replay_by_id(match_id: int, current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    match = db.query(Match).filter(Match.id == match_id).first()
+async def get_replay_by_id(match_id: int, current_user: DBUser = Depends(get_current_active_user)):
+    def read(db: Session):
+        match, player_black_name, player_white_name = load_replay(match_id, current_user, db)
+        return match, player_black_name, player_white_name, replay_moves_json(match) # Decoded in the worker too
 
-    if not match:
-        raise HTTPException(status_code=404, detail="Replay not found.")
-    
-    # Ensure user is authorized to view this replay (either participated or admin/public game)
-    # For now, allowing only participants to view their own replays
-    if not (match.player_black_id == current_user.id or match.player_white_id == current_user.id):
-        raise HTTPException(status_code=403, detail="Not authorized to view this replay.")
-    
-    # Check metadata for AI status
-    black_is_ai = False
-    white_is_ai = False
-    black_ai_level = ""
-    white_ai_level = ""
-    
-    if isinstance(match.moves_json, dict) and "meta" in match.moves_json:
-        meta = match.moves_json["meta"]
-        black_is_ai = meta.get("black_is_ai", False)
-        white_is_ai = meta.get("white_is_ai", False)
-        black_ai_level = meta.get("black_ai_level", "")
-        white_ai_level = meta.get("white_ai_level", "")
-
-    player_black_name = f"AI ({black_ai_level})" if black_is_ai and black_ai_level else "AI"
-    if not black_is_ai and match.player_black_id:
-        player_black_user = db.query(DBUser).filter(DBUser.id == match.player_black_id).first()
-        if player_black_user:
-            player_black_name = player_black_user.username
-    
-    player_white_name = f"AI ({white_ai_level})" if white_is_ai and white_ai_level else "AI"
-    if not white_is_ai and match.player_white_id:
-        player_white_user = db.query(DBUser).filter(DBUser.id == match.player_white_id).first()
-        if player_white_user:
-            player_white_name = player_white_user.username
+    match, player_black_name, player_white_name, moves_json = await run_db(read)
 
     return MatchInfo(
         id=match.id,
@@ -701,26 +1307,86 @@ async def get_replay_by_id(match_id: int, current_user: DBUser = Depends(get_cur
         result=match.result,
         startTime=match.start_time.isoformat() if match.start_time else None,
         endTime=match.end_time.isoformat() if match.end_time else None,
-        movesJson=match.moves_json # Send all moves for specific replay view
+        movesJson=moves_json # Send all moves for specific replay view
     )
 
+@app.get("/api/replays/{match_id}/stream")
+async def stream_replay(match_id: int, start: int = Query(0, ge=0), current_user: DBUser = Depends(get_current_active_user)):
+    """
+    The replay as NDJSON: a REPLAY_HEADER line (the MatchInfo without history, plus plyCount and
+    boardSize), then a REPLAY_FRAME line {"ply", "grid"} for every ply from `start` on. Frames
+    are rebuilt from the move log while the response is sent, so a client can start rendering
+    after the first lines instead of waiting for the whole history.
+    """
+    def read(db: Session):
+        match, player_black_name, player_white_name = load_replay(match_id, current_user, db)
+        return match, player_black_name, player_white_name, replay_history(match)
+
+    match, player_black_name, player_white_name, history = await run_db(read)
+    header = {
+        "type": "REPLAY_HEADER",
+        **MatchInfo(
+            id=match.id,
+            gameType=match.game_type,
+            playerBlackName=player_black_name,
+            playerWhiteName=player_white_name,
+            result=match.result,
+            startTime=match.start_time.isoformat() if match.start_time else None,
+            endTime=match.end_time.isoformat() if match.end_time else None,
+            movesJson={"meta": replay_meta(match), "history": []}
+        ).model_dump(by_alias=True, mode="json"),
+        "plyCount": history.ply_count,
+        "boardSize": history.board_size,
+    }
+
+    def lines(): # Sync generator: Starlette iterates it in a worker thread
+        yield json_bytes(header) + b"\n"
+        for ply, grid in enumerate(history.grids(start), start):
+            yield json_bytes({"type": "REPLAY_FRAME", "ply": ply, "grid": grid}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/api/replays/{match_id}/position", response_model=ReplayPosition)
+async def get_replay_position(match_id: int, ply: Optional[int] = Query(None, ge=0),
+                              current_user: DBUser = Depends(get_current_active_user)):
+    """
+    The board at `ply` (default: the final position) without loading the rest of the replay.
+    Move logs are replayed from the nearest keyframe, so a seek costs at most KEYFRAME_INTERVAL moves.
+    """
+    def read(db: Session):
+        match, _, _ = load_replay(match_id, current_user, db)
+        return replay_history(match)
+
+    history = await run_db(read)
+    if ply is None:
+        grid = history.final_grid()
+        ply = history.ply_count - 1
+    elif ply < history.ply_count:
+        grid = next(history.grids(ply, ply + 1))
+    else:
+        raise HTTPException(status_code=404, detail=f"Ply {ply} is out of range (replay has {history.ply_count}).")
+    return {"id": match_id, "ply": ply, "plyCount": history.ply_count, "boardSize": history.board_size, "grid": grid}
+
 @app.delete("/api/replays/{match_id}")
-async def delete_replay(match_id: int, current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    match = db.query(Match).filter(Match.id == match_id).first()
-    if not match:
-        raise HTTPException(status_code=404, detail="Replay not found.")
-    
-    if not (match.player_black_id == current_user.id or match.player_white_id == current_user.id):
-        raise HTTPException(status_code=403, detail="Not authorized to delete this replay.")
-    
-    db.delete(match)
-    db.commit()
+async def delete_replay(match_id: int, current_user: DBUser = Depends(get_current_active_user)):
+    def delete(db: Session):
+        match = db.query(Match).filter(Match.id == match_id).first()
+        if not match:
+            raise HTTPException(status_code=404, detail="Replay not found.")
+        
+        if not (match.player_black_id == current_user.id or match.player_white_id == current_user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to delete this replay.")
+        
+        db.delete(match)
+        db.commit()
+
+    await run_db(delete)
     return {"message": "Replay deleted successfully"}
 
 from board_battle_project.backend.models import SaveGameRequest
 
 @app.post("/api/replays/save", response_model=MatchInfo)
-async def save_replay(request: SaveGameRequest, current_user: DBUser = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def save_replay(request: SaveGameRequest, current_user: DBUser = Depends(get_current_active_user)):
     # Determine result
     result_str = None
     if request.state.is_game_over:
@@ -731,7 +1397,7 @@ async def save_replay(request: SaveGameRequest, current_user: DBUser = Depends(g
         else:
             result_str = "DRAW"
             
-    # Prepare moves_json
+    # History echoed back in the response (the stored copy is the move log below)
     moves_history = []
     for board_grid in request.state.history:
         # Pydantic model to dict
@@ -740,25 +1406,30 @@ async def save_replay(request: SaveGameRequest, current_user: DBUser = Depends(g
         else:
             moves_history.append(board_grid) # already dict?
 
-    moves_data = {
-        "meta": {
-            "config": request.config.model_dump(by_alias=True),
-            **request.meta
-        },
-        "history": moves_history
+    meta = {
+        "config": request.config.model_dump(by_alias=True),
+        **request.meta
     }
+    def insert(db: Session) -> Match:
+        # Boards are stored as a compact move log (match_moves); moves_json only keeps the meta
+        move_log = MoveLog.from_history(request.config.game_type, request.config.board_size,
+                                        (board_grid.grid for board_grid in request.state.history), request.state.grid)
+
+        new_match = Match(
+            player_black_id=current_user.id, # Associate with saver
+            player_white_id=None, # Practice save usually
+            game_type=request.config.game_type.value,
+            status=MatchStatus.SAVED,
+            result=result_str,
+            moves_json={"meta": meta, "history": []},
+            move_log=MatchMoves(ply_count=move_log.ply_count, data=move_log.to_bytes())
+        )
+        db.add(new_match)
+        db.commit()
+        db.refresh(new_match)
+        return new_match
 
-    new_match = Match(
-        player_black_id=current_user.id, # Associate with saver
-        player_white_id=None, # Practice save usually
-        game_type=request.config.game_type.value,
-        status=MatchStatus.SAVED,
-        result=result_str,
-        moves_json=moves_data
-    )
-    db.add(new_match)
-    db.commit()
-    db.refresh(new_match)
+    new_match = await run_db(insert)
     
     return MatchInfo(
         id=new_match.id,
@@ -768,7 +1439,7 @@ async def save_replay(request: SaveGameRequest, current_user: DBUser = Depends(g
         result=result_str,
         startTime=new_match.start_time.isoformat() if new_match.start_time else "",
         endTime=None,
-        movesJson=moves_data
+        movesJson={"meta": meta, "history": moves_history}
     )
 
 # SPA Serving Logic
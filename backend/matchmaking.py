@@ -0,0 +1,205 @@
+"""
+Matchmaking: pairs players waiting for a game of the same type and board size by rating.
+
+Each (game type, board size) has its own pool. Waiting players (tickets) are kept in rating
+buckets of BUCKET_WIDTH points, each sorted by rating, and the numbers of a pool's non-empty
+buckets are kept sorted. Finding an opponent is a binary search for the player's rating, then
+a walk outwards (nearest rating first) to the first ticket inside both windows. Two waiting
+players within BASE_WINDOW of each other would already have been paired, so only a handful of
+tickets can sit inside any window and the walk is short: pairing is O(log n).
+
+  window    BASE_WINDOW rating points at first, widened by WIDEN_PER_SECOND for every second
+            waited, up to MAX_WINDOW. Two players are paired only if each is inside the other's
+            window, so a newcomer is not matched far off just because the other waited long.
+  sweep     one task re-runs the search each SWEEP_INTERVAL seconds for the waiting players whose
+            window widened since their last search (a pair only becomes possible when the
+            narrower of the two windows widens), so widening windows turn into pairs. The
+            pairs found are started concurrently. The task stops when the queue is empty.
+
+Players wait on /ws/matchmaking; main.py creates the room of a pair (see on_match).
+Note: the queue is per process, like the room registry.
+"""
+import asyncio
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+BUCKET_WIDTH = 50 # Rating points per bucket; not above BASE_WINDOW, so a bucket's players always accept each other
+BASE_WINDOW = 100.0
+WIDEN_PER_SECOND = 10.0
+MAX_WINDOW = 400.0
+SWEEP_INTERVAL = 1.0 # Seconds
+
+def matchmaking_channel(user_id: int) -> str:
+    """Name of a waiting player's channel in ConnectionManager."""
+    return f"__matchmaking__:{user_id}"
+
+@dataclass
+class Ticket:
+    user_id: int
+    username: str
+    rating: float
+    game_type: str
+    board_size: int
+    joined_at: float = field(default_factory=time.monotonic)
+    searched_window: float = 0.0 # Window of the last opponent search, see MatchmakingQueue.sweep
+
+    def window(self, now: float) -> float:
+        return min(BASE_WINDOW + WIDEN_PER_SECOND * (now - self.joined_at), MAX_WINDOW)
+
+    @property
+    def bucket(self) -> int:
+        return int(self.rating // BUCKET_WIDTH)
+
+class MatchmakingPool:
+    """Waiting players of one game type and board size, indexed by rating bucket."""
+    def __init__(self):
+        self.buckets: Dict[int, List[Tuple[float, int]]] = {} # bucket -> sorted (rating, user id)
+        self.keys: List[int] = [] # Sorted numbers of the non-empty buckets
+        self.tickets: Dict[int, Ticket] = {} # user id -> ticket
+
+    def __len__(self) -> int:
+        return len(self.tickets)
+
+    def add(self, ticket: Ticket) -> None:
+        bucket = self.buckets.get(ticket.bucket)
+        if bucket is None:
+            bucket = self.buckets[ticket.bucket] = []
+            insort(self.keys, ticket.bucket)
+        insort(bucket, (ticket.rating, ticket.user_id))
+        self.tickets[ticket.user_id] = ticket
+
+    def remove(self, ticket: Ticket) -> None:
+        if self.tickets.pop(ticket.user_id, None) is None:
+            return
+        bucket = self.buckets[ticket.bucket]
+        del bucket[bisect_left(bucket, (ticket.rating, ticket.user_id))]
+        if not bucket:
+            del self.buckets[ticket.bucket]
+            del self.keys[bisect_left(self.keys, ticket.bucket)]
+
+    def _above(self, rating: float) -> Iterator[Tuple[float, int]]:
+        """(rating, user id) of the tickets rated `rating` or more, nearest first."""
+        k = bisect_left(self.keys, int(rating // BUCKET_WIDTH))
+        if k < len(self.keys):
+            bucket = self.buckets[self.keys[k]]
+            yield from bucket[bisect_left(bucket, (rating,)):]
+            k += 1
+        for key in self.keys[k:]:
+            yield from self.buckets[key]
+
+    def _below(self, rating: float) -> Iterator[Tuple[float, int]]:
+        """(rating, user id) of the tickets rated below `rating`, nearest first."""
+        k = bisect_left(self.keys, int(rating // BUCKET_WIDTH))
+        if k < len(self.keys) and self.keys[k] == int(rating // BUCKET_WIDTH):
+            bucket = self.buckets[self.keys[k]]
+            yield from reversed(bucket[:bisect_left(bucket, (rating,))])
+        for key in reversed(self.keys[:k]):
+            yield from reversed(self.buckets[key])
+
+    def find_opponent(self, ticket: Ticket, now: float) -> Optional[Ticket]:
+        """The nearest-rated waiting opponent for `ticket` (which may itself be in the pool), or None."""
+        window = ticket.window(now)
+        above, below = self._above(ticket.rating), self._below(ticket.rating)
+        up, down = next(above, None), next(below, None)
+        while up or down:
+            # Take the nearer side; each side only gets further away
+            if down is None or (up is not None and up[0] - ticket.rating <= ticket.rating - down[0]):
+                (rating, user_id), up = up, next(above, None)
+            else:
+                (rating, user_id), down = down, next(below, None)
+            distance = abs(rating - ticket.rating)
+            if distance > window:
+                break # Everything left is further away still
+            candidate = self.tickets[user_id]
+            if user_id != ticket.user_id and distance <= candidate.window(now):
+                return candidate
+        return None
+
+class MatchmakingQueue:
+    """
+    All matchmaking pools, and the sweep task (see module docstring). Each pair found is handed
+    to `on_match(first, second)`, the ticket that waited longer first; both are off the queue by then.
+    """
+    def __init__(self, sweep_interval: float = SWEEP_INTERVAL):
+        self.pools: Dict[Tuple[str, int], MatchmakingPool] = {}
+        self.tickets: Dict[int, Ticket] = {} # user id -> ticket, in joining order
+        self.sweep_interval = sweep_interval
+        self.on_match: Optional[Callable[[Ticket, Ticket], Awaitable[None]]] = None
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def size(self, game_type: str, board_size: int) -> int:
+        pool = self.pools.get((game_type, board_size))
+        return len(pool) if pool else 0
+
+    async def join(self, ticket: Ticket) -> bool:
+        """Queue a player, pairing them right away if possible. Returns False if they are already queued."""
+        if ticket.user_id in self.tickets:
+            return False
+        pool = self.pools.setdefault((ticket.game_type, ticket.board_size), MatchmakingPool())
+        now = time.monotonic()
+        ticket.searched_window = ticket.window(now)
+        opponent = pool.find_opponent(ticket, now)
+        if opponent:
+            self._remove(opponent)
+            await self._matched(opponent, ticket)
+            return True
+        pool.add(ticket)
+        self.tickets[ticket.user_id] = ticket
+        self._ensure_sweep()
+        return True
+
+    def leave(self, user_id: int) -> bool:
+        """Take a player off the queue. Returns False if they were not queued (e.g. already matched)."""
+        ticket = self.tickets.get(user_id)
+        if ticket is None:
+            return False
+        self._remove(ticket)
+        return True
+
+    def _remove(self, ticket: Ticket) -> None:
+        self.tickets.pop(ticket.user_id, None)
+        pool = self.pools.get((ticket.game_type, ticket.board_size))
+        if pool:
+            pool.remove(ticket)
+            if not pool.tickets:
+                del self.pools[(ticket.game_type, ticket.board_size)]
+
+    async def sweep(self) -> int:
+        """Pair whoever can be paired now, longest waiting first. Returns the number of pairs."""
+        now = time.monotonic()
+        pairs = []
+        for ticket in list(self.tickets.values()):
+            if ticket.user_id not in self.tickets:
+                continue # Paired earlier in this sweep
+            window = ticket.window(now)
+            if window <= ticket.searched_window:
+                continue # At MAX_WINDOW and already searched: only newcomers can pair it now (on join)
+            ticket.searched_window = window
+            opponent = self.pools[(ticket.game_type, ticket.board_size)].find_opponent(ticket, now)
+            if opponent:
+                self._remove(ticket)
+                self._remove(opponent)
+                pairs.append((ticket, opponent))
+        # Each pair's room is created through the DB; one slow insert must not hold up the others
+        await asyncio.gather(*(self._matched(first, second) for first, second in pairs), return_exceptions=True)
+        return len(pairs)
+
+    async def _matched(self, first: Ticket, second: Ticket):
+        print(f"Matchmaking: Paired {first.username} ({first.rating:.0f}) with {second.username} ({second.rating:.0f})")
+        if self.on_match:
+            try:
+                await self.on_match(first, second)
+            except Exception as e:
+                print(f"Matchmaking: Error starting the game of {first.username} and {second.username}: {e}")
+
+    def _ensure_sweep(self):
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweeper())
+
+    async def _sweeper(self):
+        while self.tickets:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+        self._sweep_task = None # Restarted by the next join
@@ -2,16 +2,10 @@ from enum import Enum
 from typing import List, Optional, Dict, Tuple, Union, Any 
 from pydantic import BaseModel, Field, ConfigDict, model_validator
 
-# --- Enums ---
-
-class Player(str, Enum):
-    BLACK = "BLACK"
-    WHITE = "WHITE"
+# Engine enums live in the dependency-free core, re-exported here for the API layer
+from board_battle_project.backend.game.types import Player, GameType
 
-class GameType(str, Enum):
-    GOMOKU = "GOMOKU"
-    GO = "GO"
-    REVERSI = "REVERSI"
+# --- Enums ---
 
 class AILevel(str, Enum):
     HUMAN = "HUMAN" # Not an AI, but a placeholder for player type
@@ -35,6 +29,17 @@ class GameStatus(str, Enum):
 
 # --- Pydantic Models ---
 
+class TimeControl(BaseModel):
+    """
+    Per-player clock of a room game: main time with a Fischer increment, then byo-yomi periods.
+    A period is only lost if a move takes all of it; with no time left in any, the player loses.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    main_time: float = Field(600, alias="mainTime", ge=0) # Seconds
+    increment: float = Field(0, ge=0) # Seconds added after each move made in main time
+    byoyomi_periods: int = Field(0, alias="byoyomiPeriods", ge=0)
+    byoyomi_time: float = Field(0, alias="byoyomiTime", ge=0) # Seconds per period
+
 class GameConfig(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
     board_size: int = Field(..., alias="boardSize")
@@ -44,6 +49,7 @@ class GameConfig(BaseModel):
     ai_level: AILevel = Field(AILevel.HUMAN, alias="aiLevel")
     black_ai_level: Optional[AILevel] = Field(None, alias="blackAILevel")
     white_ai_level: Optional[AILevel] = Field(None, alias="whiteAILevel")
+    time_control: Optional[TimeControl] = Field(None, alias="timeControl") # Rooms only, ignored when an AI plays
 
 class Move(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
@@ -67,7 +73,8 @@ class GameState(BaseModel):
     game_id: str = Field(..., alias="gameId")
     grid: List[List[Optional[Player]]]
     current_player: Player = Field(..., alias="currentPlayer")
-    history: List[BoardGrid]
+    history: List[BoardGrid] = [] # Only filled on request, see history_length and HistorySlice
+    history_length: int = Field(0, alias="historyLength")
     prisoners: Dict[Player, int]
     is_game_over: bool = Field(..., alias="isGameOver")
     winner: Optional[Union[Player, str]] = None
@@ -77,6 +84,42 @@ class GameState(BaseModel):
     board_size: int = Field(..., alias="boardSize")
     valid_moves: List[Tuple[int, int]] = Field([], alias="validMoves")
 
+class HistorySlice(BaseModel):
+    """Board snapshots for plies [start, start + len(history)) of a game."""
+    model_config = ConfigDict(populate_by_name=True)
+    game_id: str = Field(..., alias="gameId")
+    start: int
+    history_length: int = Field(..., alias="historyLength")
+    history: List[BoardGrid]
+
+class GameDelta(BaseModel):
+    """Incremental WS update: what changed since the previous sequenced event of the room."""
+    model_config = ConfigDict(populate_by_name=True)
+    event: str # MOVE, PASS, UNDO, RESIGN or TIMEOUT
+    board_size: int = Field(..., alias="boardSize")
+    last_move: Optional[Move] = Field(None, alias="lastMove")
+    changes: List[Tuple[int, int, Optional[Player]]] = [] # (x, y, new value) for every changed cell
+    current_player: Player = Field(..., alias="currentPlayer")
+    prisoners: Dict[Player, int]
+    is_game_over: bool = Field(..., alias="isGameOver")
+    winner: Optional[Union[Player, str]] = None
+    message: Optional[str] = ""
+    valid_moves: List[Tuple[int, int]] = Field([], alias="validMoves")
+    history_length: int = Field(0, alias="historyLength")
+
+class AnalysisNodeInfo(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    node_id: int = Field(..., alias="nodeId")
+    parent_id: Optional[int] = Field(None, alias="parentId")
+    move: Optional[Move] = None
+    is_pass: bool = Field(False, alias="isPass")
+    grid: List[List[Optional[Player]]]
+    current_player: Player = Field(..., alias="currentPlayer")
+    is_game_over: bool = Field(..., alias="isGameOver")
+    winner: Optional[Player] = None
+    message: Optional[str] = ""
+    children: List[int] = []
+
 class StartGameResponse(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
     game_id: str = Field(..., alias="gameId")
@@ -142,5 +185,35 @@ class MatchInfo(BaseModel):
     end_time: Optional[str] = Field(None, alias="endTime")
     moves_json: Union[List[Dict], Dict[str, Any]] = Field(..., alias="movesJson") 
 
+class ReplayPosition(BaseModel):
+    """Board of a saved match at one ply, see /api/replays/{id}/position."""
+    model_config = ConfigDict(populate_by_name=True)
+    id: int
+    ply: int
+    ply_count: int = Field(..., alias="plyCount")
+    board_size: int = Field(..., alias="boardSize")
+    grid: List[List[Optional[Player]]]
+
 class MatchListResponse(BaseModel):
-    matches: List[MatchInfo]
\ No newline at end of file
+    model_config = ConfigDict(populate_by_name=True)
+    matches: List[MatchInfo]
+    next_cursor: Optional[str] = Field(None, alias="nextCursor") # Pass as ?cursor= for the next page, None on the last
+
+class LeaderboardEntry(BaseModel):
+    """A player's Elo rating in one game type, see /api/leaderboard."""
+    model_config = ConfigDict(populate_by_name=True)
+    rank: int
+    user_id: int = Field(..., alias="userId")
+    username: str
+    game_type: GameType = Field(..., alias="gameType")
+    rating: float
+    games: int
+    wins: int
+    losses: int
+    draws: int
+
+class LeaderboardResponse(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    game_type: GameType = Field(..., alias="gameType")
+    entries: List[LeaderboardEntry]
+    total_players: int = Field(..., alias="totalPlayers")
@@ -0,0 +1,201 @@
+"""
+Compact storage for match histories.
+
+Matches used to store every ply's full board in Match.moves_json. A move log keeps one small
+record per ply instead and rebuilds the boards by replaying the moves through the game engine:
+
+  header   format version, board size, ply count, packed final position
+  records  one per history entry:
+             move      stone colour + cell index (y * size + x), replayed by the engine
+             pass      board unchanged
+             keyframe  the packed board; used for the first entry, every KEYFRAME_INTERVAL
+                       entries (so a reader can start near any ply) and for any entry the
+                       engine does not reproduce (hand-edited or rule-breaking histories)
+
+The log is zlib-compressed and stored in the match_moves table. Boards are packed as in
+compact.py (2 bits per cell).
+"""
+import struct
+import zlib
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from board_battle_project.backend.compact import pack_grid, unpack_grid
+from board_battle_project.backend.game.base import AbstractGame
+from board_battle_project.backend.game.go import GoGame
+from board_battle_project.backend.game.gomoku import GomokuGame
+from board_battle_project.backend.game.reversi import ReversiGame
+from board_battle_project.backend.game.types import GameType, Player
+
+FORMAT_VERSION = 1
+KEYFRAME_INTERVAL = 64 # History entries between keyframes
+
+_MOVE_BLACK, _MOVE_WHITE, _PASS, _KEYFRAME = 0, 1, 2, 3
+_HEADER = struct.Struct("<BBI") # version, board size, ply count
+_CELL = struct.Struct("<H")
+_PLAYERS = {"BLACK": Player.BLACK, "WHITE": Player.WHITE}
+
+Record = Tuple[int, Any] # (kind, cell index or packed board or None)
+
+def _new_engine(game_type: GameType, board_size: int) -> AbstractGame:
+    if game_type == GameType.GO:
+        return GoGame(board_size)
+    if game_type == GameType.REVERSI:
+        return ReversiGame(board_size)
+    return GomokuGame(board_size)
+
+def _load_board(engine: AbstractGame, packed: bytes) -> None:
+    grid = unpack_grid(packed, engine.board_size)
+    engine.board.load_grid([[_PLAYERS.get(cell) for cell in row] for row in grid])
+
+def _play(engine: AbstractGame, player: Player, x: int, y: int) -> bool:
+    """Replay one stone on the engine's board, whoever's turn the engine thinks it is."""
+    if not isinstance(engine, GoGame):
+        # Reversi flips and Gomoku placement are board operations; skipping the game's
+        # make_move also skips its game-over and forced-pass checks
+        return engine.board.place_stone(x, y, player)
+    # Go captures and the suicide rule live in the game
+    engine.is_game_over = False
+    engine.current_player = player
+    success, _ = engine.make_move(x, y)
+    del engine.history[:-1] # Only the board matters here
+    return success
+
+class MoveLog:
+    """A decoded move log. Build one with from_history (to save) or from_bytes (to read)."""
+    def __init__(self, game_type: GameType, board_size: int, records: List[Record], final: bytes):
+        self.game_type = game_type
+        self.board_size = board_size
+        self.records = records
+        self.final = final # Packed board of the final position
+
+    @property
+    def ply_count(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_history(cls, game_type: GameType, board_size: int, history: Iterable[Iterable[Iterable[Any]]],
+                     final_grid: Optional[Iterable[Iterable[Any]]] = None) -> "MoveLog":
+        """
+        Encode a history of boards (grids of Player / "BLACK" / "WHITE" / None). A ply becomes a
+        move record only if the engine reproduces the next board exactly, otherwise a keyframe.
+        """
+        engine = _new_engine(game_type, board_size)
+        records: List[Record] = []
+        previous: Optional[List[List[Any]]] = None
+        previous_packed = b""
+        for grid in history:
+            grid = [list(row) for row in grid]
+            packed = pack_grid(grid)
+            record: Optional[Record] = None
+            if previous is not None and len(records) % KEYFRAME_INTERVAL:
+                if packed == previous_packed:
+                    record = (_PASS, None)
+                else:
+                    placed = [(x, y, cell) for y, row in enumerate(grid) for x, cell in enumerate(row)
+                              if cell is not None and previous[y][x] is None]
+                    if len(placed) == 1:
+                        x, y, cell = placed[0]
+                        player = _PLAYERS[cell]
+                        if _play(engine, player, x, y) and pack_grid(engine.board.get_grid()) == packed:
+                            record = (_MOVE_BLACK if player == Player.BLACK else _MOVE_WHITE, y * board_size + x)
+            if record is None:
+                record = (_KEYFRAME, packed)
+                _load_board(engine, packed)
+            records.append(record)
+            previous, previous_packed = grid, packed
+        if final_grid is not None:
+            final = pack_grid(final_grid)
+        else:
+            final = previous_packed
+        return cls(game_type, board_size, records, final)
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(FORMAT_VERSION, self.board_size, len(self.records)), self.final]
+        for kind, value in self.records:
+            parts.append(bytes((kind,)))
+            if kind in (_MOVE_BLACK, _MOVE_WHITE):
+                parts.append(_CELL.pack(value))
+            elif kind == _KEYFRAME:
+                parts.append(value)
+        return zlib.compress(b"".join(parts))
+
+    @classmethod
+    def from_bytes(cls, game_type: GameType, data: bytes) -> "MoveLog":
+        raw = zlib.decompress(data)
+        version, board_size, ply_count = _HEADER.unpack_from(raw)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported move log format {version}")
+        grid_bytes = (board_size * board_size + 3) // 4
+        offset = _HEADER.size
+        final = raw[offset:offset + grid_bytes]
+        offset += grid_bytes
+        records: List[Record] = []
+        for _ in range(ply_count):
+            kind = raw[offset]
+            offset += 1
+            if kind in (_MOVE_BLACK, _MOVE_WHITE):
+                records.append((kind, _CELL.unpack_from(raw, offset)[0]))
+                offset += _CELL.size
+            elif kind == _KEYFRAME:
+                records.append((kind, raw[offset:offset + grid_bytes]))
+                offset += grid_bytes
+            else:
+                records.append((kind, None))
+        return cls(game_type, board_size, records, final)
+
+    def grids(self, start: int = 0, end: Optional[int] = None) -> Iterator[List[List[Optional[str]]]]:
+        """
+        JSON boards of history entries [start, end), replayed from the nearest keyframe at or
+        before `start`.
+        """
+        end = self.ply_count if end is None else min(end, self.ply_count)
+        start = max(0, start)
+        if start >= end:
+            return
+        first = start
+        while first > 0 and self.records[first][0] != _KEYFRAME:
+            first -= 1
+        engine = _new_engine(self.game_type, self.board_size)
+        grid: List[List[Optional[str]]] = []
+        for index in range(first, end):
+            kind, value = self.records[index]
+            if kind == _KEYFRAME:
+                _load_board(engine, value)
+                grid = unpack_grid(value, self.board_size)
+            elif kind != _PASS:
+                player = Player.BLACK if kind == _MOVE_BLACK else Player.WHITE
+                _play(engine, player, value % self.board_size, value // self.board_size)
+                grid = [[cell.value if cell is not None else None for cell in row] for row in engine.board.get_grid()]
+            if index >= start:
+                yield grid
+
+    def history_json(self, start: int = 0, end: Optional[int] = None) -> List[dict]:
+        """History entries in the shape of a dumped BoardGrid ({"grid": [[...]]})."""
+        return [{"grid": grid} for grid in self.grids(start, end)]
+
+    def final_grid(self) -> List[List[Optional[str]]]:
+        return unpack_grid(self.final, self.board_size)
+
+class StoredHistory:
+    """
+    Boards stored in full (moves_json of matches saved before move logs existed), read
+    through the same interface as MoveLog.
+    """
+    def __init__(self, game_type: GameType, history: List[Any]):
+        self.game_type = game_type
+        # Entries are {"grid": [[...]]}; the oldest saves stored the bare grids
+        self.boards = [entry.get("grid") if isinstance(entry, dict) else entry for entry in history]
+        self.board_size = len(self.boards[0]) if self.boards else 0
+
+    @property
+    def ply_count(self) -> int:
+        return len(self.boards)
+
+    def grids(self, start: int = 0, end: Optional[int] = None) -> Iterator[List[List[Optional[str]]]]:
+        return iter(self.boards[max(0, start):end])
+
+    def history_json(self, start: int = 0, end: Optional[int] = None) -> List[dict]:
+        return [{"grid": grid} for grid in self.grids(start, end)]
+
+    def final_grid(self) -> List[List[Optional[str]]]:
+        return self.boards[-1] if self.boards else []
@@ -0,0 +1,29 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(start_time: Optional[str], match_id: int) -> str:
+    """
+    Opaque keyset cursor for lists ordered by (start_time, id), newest first.
+    Points at the last item of a page; the next page starts strictly after it.
+    """
+    return base64.urlsafe_b64encode(f"{start_time or ''}|{match_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(start_time ISO string, id) of a cursor from encode_cursor. Raises 400 for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        start_time, match_id = raw.rsplit("|", 1)
+        if start_time:
+            datetime.fromisoformat(start_time)
+        return start_time, int(match_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def page_size(limit: Optional[int]) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
@@ -0,0 +1,233 @@
+"""
+Write-behind persistence of finished games.
+
+GameController.save_game_result only snapshots a finished game and queues it here, so the
+game-over broadcast never waits for the DB. One worker task writes the queue in batches:
+
+  batch     up to BATCH_SIZE results, collected for BATCH_WINDOW seconds after the first one,
+            become one transaction: the matches with their move logs, one
+            UPDATE users SET total_games = total_games + n, wins = wins + w per player and
+            the Elo updates of the rated games (see leaderboard.py)
+  retries   transient DB errors (lost connection, pool timeout, ...) are retried with exponential
+            backoff, capped at MAX_RETRY_DELAY, for up to MAX_RETRY_TIME per batch; the results
+            stay queued meanwhile, so a DB blip loses nothing. A batch failing for any other
+            reason is written one result at a time, and only the results that fail on their own
+            (e.g. IntegrityError) are dropped
+  bounded   at most MAX_PENDING results wait; when full, submit() drops the oldest one (logged)
+            rather than holding the game-over handler that called it
+  drain     drain(timeout) writes everything still queued; main.py calls it on shutdown and
+            gives up on what is left when the timeout runs out
+
+Note: a finished game shows up in the replay lists only once its batch is written.
+"""
+import asyncio
+import os
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from board_battle_project.backend.database import run_db
+from board_battle_project.backend.db_models import Match, MatchMoves, User
+from board_battle_project.backend.game.persistent import PersistentGrid
+from board_battle_project.backend.game.types import Grid
+from board_battle_project.backend.leaderboard import apply_ratings
+from board_battle_project.backend.models import GameType, MatchStatus
+from board_battle_project.backend.move_log import MoveLog
+
+MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", "1000")) # Results waiting to be written
+BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50")) # Results per transaction
+BATCH_WINDOW = float(os.getenv("PERSIST_BATCH_WINDOW", "0.05")) # Seconds to gather a batch
+RETRY_DELAY = 0.5 # Seconds before the first retry, doubled for each further one
+MAX_RETRY_DELAY = float(os.getenv("PERSIST_MAX_RETRY_DELAY", "30"))
+MAX_RETRY_TIME = float(os.getenv("PERSIST_MAX_RETRY_TIME", "300")) # Seconds a batch is retried before it is dropped
+DRAIN_TIMEOUT = float(os.getenv("PERSIST_DRAIN_TIMEOUT", "30")) # Seconds shutdown waits for the queue
+
+# Errors that say nothing about the results themselves: the DB is down or out of connections
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)
+
+@dataclass(frozen=True)
+class FinishedGame:
+    """Everything store_game_results needs from a finished game, taken on the event loop."""
+    game_id: str
+    game_type: GameType
+    board_size: int
+    history: List[PersistentGrid] # Immutable snapshots, safe to read from the DB thread
+    final_grid: Grid
+    black_user_id: Optional[int]
+    white_user_id: Optional[int]
+    moves_data: dict
+    result: Optional[str] # "BLACK_WON", "WHITE_WON", "DRAW" or None
+    start_time: datetime # Both UTC, set explicitly: the server default would be the write time
+    end_time: datetime
+
+def stat_increments(results: List[FinishedGame]) -> Dict[int, Tuple[int, int]]:
+    """user id -> (games played, games won) over a batch of results."""
+    increments: Dict[int, Tuple[int, int]] = {}
+    for result in results:
+        for user_id, winning_result in ((result.black_user_id, "BLACK_WON"), (result.white_user_id, "WHITE_WON")):
+            if user_id:
+                games, wins = increments.get(user_id, (0, 0))
+                increments[user_id] = (games + 1, wins + (result.result == winning_result))
+    return increments
+
+def store_game_results(results: List[FinishedGame], db: Session) -> List[Dict[str, Any]]:
+    """
+    Archive finished games as Matches and update their players' stats and ratings in one
+    transaction. Runs in the DB thread pool. Returns the rating changes (see apply_ratings).
+    """
+    matches = []
+    for result in results:
+        # The boards go into a compact move log (match_moves); moves_json only keeps the meta
+        move_log = MoveLog.from_history(result.game_type, result.board_size,
+                                        (snapshot.to_grid() for snapshot in result.history), result.final_grid)
+        matches.append(Match(
+            player_black_id=result.black_user_id,
+            player_white_id=result.white_user_id,
+            game_type=result.game_type.value, # Store enum value as string
+            result=result.result,
+            status=MatchStatus.COMPLETED,
+            start_time=result.start_time,
+            end_time=result.end_time,
+            moves_json=result.moves_data,
+            move_log=MatchMoves(ply_count=move_log.ply_count, data=move_log.to_bytes()),
+        ))
+    db.add_all(matches)
+    # Stats are incremented in SQL, so concurrent writers never overwrite each other's counts
+    for user_id, (games, wins) in sorted(stat_increments(results).items()): # Fixed order avoids deadlocks
+        db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(total_games=func.coalesce(User.total_games, 0) + games,
+                    wins=func.coalesce(User.wins, 0) + wins)
+        )
+    rating_changes = apply_ratings([(result.game_type.value, result.black_user_id, result.white_user_id, result.result)
+                                    for result in results], db)
+    db.commit()
+    for result, match in zip(results, matches):
+        print(f"Game {result.game_id} saved as match {match.id}")
+    return rating_changes
+
+class PersistenceQueue:
+    """
+    Bounded queue of finished games and the worker task that writes them (see module docstring).
+    The worker is started by submit and stops once the queue is empty, like the heartbeat in
+    ConnectionManager.
+    """
+    def __init__(self, max_pending: int = MAX_PENDING, batch_size: int = BATCH_SIZE, batch_window: float = BATCH_WINDOW,
+                 retry_delay: float = RETRY_DELAY, max_retry_delay: float = MAX_RETRY_DELAY,
+                 max_retry_time: float = MAX_RETRY_TIME):
+        self.pending: Deque[FinishedGame] = deque()
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retry_time = max_retry_time
+        self.stats = {"saved": 0, "failed": 0, "batches": 0, "retries": 0}
+        self.on_ratings: Optional[Callable[[List[Dict[str, Any]]], None]] = None # Gets the rating changes of each write
+        self._worker_task: Optional[asyncio.Task] = None
+        self._writing: List[FinishedGame] = [] # The batch the worker is on
+
+    async def submit(self, result: FinishedGame) -> None:
+        """Queue a result. Never waits: when the queue is full, its oldest result is dropped."""
+        if len(self.pending) >= self.max_pending:
+            print(f"Persistence: Queue full ({len(self.pending)} results), dropping the oldest")
+            self._give_up([self.pending.popleft()], "the queue is full")
+        self.pending.append(result)
+        self._ensure_worker()
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything queued so far is written, at most `timeout` seconds. On timeout the
+        worker is stopped and the results still queued are given up. Returns False if it timed out.
+        """
+        async def wait_for_worker():
+            while self._worker_running():
+                await asyncio.shield(self._worker_task)
+        try:
+            await asyncio.wait_for(wait_for_worker(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"Persistence: Drain timed out after {timeout}s with {len(self.pending)} result(s) queued, giving up on them "
+                  f"(and on the {len(self._writing)} being written)")
+            if self._worker_running():
+                self._worker_task.cancel()
+            self._worker_task = None
+            self._give_up(self._writing + list(self.pending), "shutting down")
+            self._writing = []
+            self.pending.clear()
+            return False
+
+    def _worker_running(self) -> bool:
+        return self._worker_task is not None and not self._worker_task.done()
+
+    def _ensure_worker(self):
+        if not self._worker_running():
+            self._written = asyncio.Event()
+            self._worker_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.pending:
+            if len(self.pending) < self.batch_size:
+                await asyncio.sleep(self.batch_window) # Let games ending together share a transaction
+            batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+            self._writing = batch
+            await self._write(batch)
+            self._writing = []
+            self.stats["batches"] += 1
+        self._worker_task = None # Restarted by the next submit
+
+    async def _write(self, batch: List[FinishedGame]):
+        error = await self._store(batch)
+        if error is None:
+            return
+        if len(batch) == 1 or isinstance(error, TRANSIENT_ERRORS): # Out of retry time: the DB is down, not the data
+            self._give_up(batch)
+            return
+        print(f"Persistence: Batch of {len(batch)} failed, saving its games one by one")
+        for index, result in enumerate(batch):
+            error = await self._store([result])
+            if isinstance(error, TRANSIENT_ERRORS):
+                self._give_up(batch[index:])
+                return
+            if error is not None:
+                self._give_up([result])
+
+    async def _store(self, batch: List[FinishedGame]) -> Optional[Exception]:
+        """
+        Write a batch, retrying transient errors for up to max_retry_time. Returns None once
+        written, or the error that keeps this batch from being written.
+        """
+        attempt = 0
+        give_up_at = asyncio.get_running_loop().time() + self.max_retry_time
+        while True:
+            try:
+                rating_changes = await run_db(store_game_results, batch)
+            except TRANSIENT_ERRORS as e:
+                delay = min(self.retry_delay * 2 ** attempt, self.max_retry_delay)
+                if asyncio.get_running_loop().time() + delay > give_up_at:
+                    print(f"Persistence: Saving {len(batch)} game(s) still failing after {self.max_retry_time:.0f}s: {e}")
+                    return e
+                print(f"Persistence: Saving {len(batch)} game(s) failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                print(f"Persistence: Saving {len(batch)} game(s) failed: {e}")
+                return e
+            self.stats["saved"] += len(batch)
+            if rating_changes and self.on_ratings:
+                self.on_ratings(rating_changes)
+            return None
+
+    def _give_up(self, batch: List[FinishedGame], reason: str = "it cannot be written"):
+        self.stats["failed"] += len(batch)
+        for result in batch:
+            print(f"Persistence: Dropping result of game {result.game_id} ({result.result}), {reason}")
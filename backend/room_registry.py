@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, aliased, defer
+
+from board_battle_project.backend.compact import json_bytes
+from board_battle_project.backend.db_models import Match, User as DBUser
+from board_battle_project.backend.models import MatchStatus
+
+LOBBY_ROOM = "__lobby__" # Channel name of the lobby WebSocket in ConnectionManager
+WAITING_NAME = "Waiting..." # Shown while a room has no white player
+
+def room_info(match: Match, black_name: Optional[str] = None, white_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Lobby entry of a room, shaped like a dumped MatchInfo (by_alias, mode="json").
+    Names not given are taken from the room's meta (only then is moves_json loaded).
+    """
+    if not match.player_white_id:
+        white_name = WAITING_NAME
+    meta = {}
+    if not black_name or not white_name:
+        meta = match.moves_json.get("meta", {}) if isinstance(match.moves_json, dict) else {}
+    return {
+        "id": match.id,
+        "gameType": match.game_type,
+        "playerBlackName": black_name or meta.get("black_player_name") or "Unknown",
+        "playerWhiteName": white_name or meta.get("white_player_name") or WAITING_NAME,
+        "result": None,
+        "startTime": match.start_time.isoformat() if match.start_time else "",
+        "endTime": None,
+        "movesJson": [],
+    }
+
+class RoomRegistry:
+    """
+    In-memory list of the open (WAITING) rooms shown in the lobby.
+    Loaded from the DB once, then kept up to date by the routes that open, join, start or
+    abandon rooms. Each change returns a diff for the lobby channel; the full list is served
+    from a snapshot that is only rebuilt after a change.
+    Note: the registry is per process, like the room sessions in GameController.
+    """
+    def __init__(self):
+        self.rooms: Dict[int, Dict[str, Any]] = {}
+        self.version = 0 # Bumped on every change, sent with diffs and snapshots
+        self.loaded = False
+        self._snapshot: Optional[List[Dict[str, Any]]] = None
+        self._snapshot_json: Optional[bytes] = None # /api/rooms body for the current snapshot
+
+    @staticmethod
+    def query_open_rooms(db: Session) -> List[Dict[str, Any]]:
+        """Lobby entries of the WAITING rooms in the DB (one query, player names joined in)."""
+        black, white = aliased(DBUser), aliased(DBUser)
+        rows = (
+            db.query(Match, black.username, white.username)
+            .outerjoin(black, black.id == Match.player_black_id)
+            .outerjoin(white, white.id == Match.player_white_id)
+            .options(defer(Match.moves_json))
+            .filter(Match.status == MatchStatus.WAITING)
+            .all()
+        )
+        return [room_info(match, black_name, white_name) for match, black_name, white_name in rows]
+
+    def load(self, rooms: List[Dict[str, Any]]) -> None:
+        """Fill the registry with the result of query_open_rooms. Only the first load counts."""
+        if self.loaded:
+            return
+        for room in rooms:
+            self.rooms[room["id"]] = room
+        self.loaded = True
+        self.version += 1
+        self._snapshot = self._snapshot_json = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Open rooms, newest first. Shared between callers, do not modify."""
+        if self._snapshot is None:
+            self._snapshot = sorted(self.rooms.values(), key=lambda room: (room["startTime"], room["id"]), reverse=True)
+        return self._snapshot
+
+    def page(self, game_type: Optional[str], limit: int, after: Optional[Tuple[str, int]]) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+        """
+        Slice of the snapshot for /api/rooms: rooms of `game_type` (all if None) that come after
+        the (startTime, id) key `after`. Returns the rooms and the key of the last one when more follow.
+        """
+        rooms = []
+        for room in self.snapshot():
+            if game_type and room["gameType"] != game_type:
+                continue
+            if after and (room["startTime"], room["id"]) >= after:
+                continue
+            if len(rooms) == limit:
+                last = rooms[-1]
+                return rooms, (last["startTime"], last["id"])
+            rooms.append(room)
+        return rooms, None
+
+    def snapshot_json(self) -> bytes:
+        """The /api/rooms response body ({"matches": [...]}), encoded once per change."""
+        if self._snapshot_json is None:
+            self._snapshot_json = json_bytes({"matches": self.snapshot()})
+        return self._snapshot_json
+
+    def upsert(self, room: Dict[str, Any]) -> Dict[str, Any]:
+        """Add or replace a room. Returns the lobby diff."""
+        op = "updated" if room["id"] in self.rooms else "added"
+        self.rooms[room["id"]] = room
+        self.version += 1
+        self._snapshot = self._snapshot_json = None
+        return {"type": "LOBBY_UPDATE", "op": op, "version": self.version, "room": room}
+
+    def remove(self, room_id: int) -> Optional[Dict[str, Any]]:
+        """Drop a room that started or was abandoned. Returns the lobby diff, or None if it was not listed."""
+        if self.rooms.pop(room_id, None) is None:
+            return None
+        self.version += 1
+        self._snapshot = self._snapshot_json = None
+        return {"type": "LOBBY_UPDATE", "op": "removed", "version": self.version, "room": {"id": room_id}}
+
+    def snapshot_message(self) -> Dict[str, Any]:
+        return {"type": "LOBBY_SNAPSHOT", "version": self.version, "rooms": self.snapshot()}
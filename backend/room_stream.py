@@ -0,0 +1,66 @@
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from board_battle_project.backend.game.base import AbstractGame
+from board_battle_project.backend.game.persistent import PersistentGrid
+from board_battle_project.backend.models import GameDelta, Move
+
+REPLAY_BUFFER = 64 # Recent events kept per room for reconnecting clients
+
+class RoomStream:
+    """
+    Sequenced game events of one room.
+    Every broadcast game event gets the next sequence number. Delta clients apply the
+    changed cells to their copy of the board and ask for a full resync when they see a gap.
+    The last `buffer_size` events of the current game are kept so a client that reconnects
+    (or notices a gap) can be sent just the events after its last seen sequence number.
+    """
+    def __init__(self, buffer_size: int = REPLAY_BUFFER):
+        self.seq = 0
+        self.last_grid: Optional[PersistentGrid] = None # Board as of the last event sent
+        self.recent: Deque[Tuple[int, GameDelta]] = deque(maxlen=buffer_size)
+
+    def reset(self, game: AbstractGame) -> int:
+        """Start a new game in the room (clients receive the full state). Returns its sequence number."""
+        self.last_grid = PersistentGrid.from_grid(game.board.get_grid())
+        self.seq += 1
+        self.recent.clear() # Events of the previous game cannot be replayed onto this one
+        return self.seq
+
+    def record(self, game: AbstractGame, event: str) -> Tuple[int, GameDelta]:
+        """Advance the sequence and describe the change since the previous event."""
+        grid = game.board.get_grid()
+        previous = self.last_grid or PersistentGrid.empty(game.board_size)
+        changes = previous.diff(grid)
+        self.last_grid = previous.update(changes)
+        self.seq += 1
+
+        last_move = game.last_move
+        delta = GameDelta(
+            event=event,
+            boardSize=game.board_size,
+            lastMove=Move(x=last_move.x, y=last_move.y, player=last_move.player) if last_move else None,
+            changes=changes,
+            currentPlayer=game.current_player,
+            prisoners=game.prisoners,
+            isGameOver=game.is_game_over,
+            winner=game.winner,
+            message=game.message,
+            validMoves=game.get_valid_moves_for_current_player(),
+            historyLength=len(game.history)
+        )
+        self.recent.append((self.seq, delta))
+        return self.seq, delta
+
+    def missed_since(self, last_seq: int) -> Optional[List[Tuple[int, GameDelta]]]:
+        """
+        Events after `last_seq`, oldest first ([] when the client is up to date), or None when
+        they can no longer be replayed (gap larger than the buffer, or a sequence number
+        from before the current game) and the client needs a full snapshot.
+        """
+        if last_seq == self.seq:
+            return []
+        oldest = self.recent[0][0] if self.recent else self.seq + 1
+        if last_seq > self.seq or last_seq < oldest - 1:
+            return None
+        return [(seq, delta) for seq, delta in self.recent if seq > last_seq]
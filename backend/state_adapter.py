@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from board_battle_project.backend.game.base import AbstractGame
+from board_battle_project.backend.game.persistent import PersistentGrid
+from board_battle_project.backend.game.types import Grid, MoveRecord, Player
+from board_battle_project.backend.models import BoardGrid, GameState, HistorySlice, Move
+
+# Adapter between the dependency-free game engine and the Pydantic API models.
+# Only the API layer (main.py, GameController) should import this module.
+
+# The engine's values are already valid, so the models below are built with model_construct
+# (no per-cell validation) and the JSON path skips Pydantic entirely.
+
+_CELL_JSON = {None: None, Player.BLACK: Player.BLACK.value, Player.WHITE: Player.WHITE.value}
+
+# game -> (game.version, dumped state); entries go away with the game
+_state_cache: "WeakKeyDictionary[AbstractGame, Tuple[int, Dict[str, Any]]]" = WeakKeyDictionary()
+
+def grid_to_json(grid: Grid) -> List[List[Optional[str]]]:
+    return [[_CELL_JSON[cell] for cell in row] for row in grid]
+
+def build_board_grids(history: Iterable[PersistentGrid]) -> List[BoardGrid]:
+    return [BoardGrid.model_construct(grid=snapshot.to_grid()) for snapshot in history]
+
+def history_to_json(history: Iterable[PersistentGrid]) -> List[dict]:
+    """JSON-compatible history in the same shape as a dumped BoardGrid ({"grid": [[...]]})."""
+    return [{"grid": grid_to_json(snapshot.to_grid())} for snapshot in history]
+
+def build_game_state(game: AbstractGame, include_history: bool = False) -> GameState:
+    """
+    Return the current game state as a Pydantic model.
+    History is left out unless asked for; clients fetch it lazily with build_history_slice.
+    """
+    last_move = game.last_move
+    return GameState.model_construct(
+        game_id=game.game_id,
+        grid=game.board.get_grid(),
+        current_player=game.current_player,
+        history=build_board_grids(game.history) if include_history else [],
+        history_length=len(game.history),
+        prisoners=dict(game.prisoners),
+        is_game_over=game.is_game_over,
+        winner=game.winner,
+        message=game.message,
+        last_move=Move.model_construct(x=last_move.x, y=last_move.y, player=last_move.player) if last_move else None,
+        game_type=game.game_type,
+        board_size=game.board_size,
+        valid_moves=game.get_valid_moves_for_current_player() # Include valid moves
+    )
+
+def game_state_json(game: AbstractGame) -> Dict[str, Any]:
+    """
+    The history-free state as a JSON-compatible dict, identical to
+    build_game_state(game).model_dump(mode="json", by_alias=True).
+    Cached per game.version, so repeated reads of an unchanged position cost nothing.
+    The dict is shared between callers and must not be modified.
+    """
+    cached = _state_cache.get(game)
+    if cached is not None and cached[0] == game.version:
+        return cached[1]
+
+    last_move = game.last_move
+    winner = game.winner
+    state = {
+        "gameId": game.game_id,
+        "grid": grid_to_json(game.board.get_grid()),
+        "currentPlayer": game.current_player.value,
+        "history": [],
+        "historyLength": len(game.history),
+        "prisoners": {player.value: count for player, count in game.prisoners.items()},
+        "isGameOver": game.is_game_over,
+        "winner": winner.value if isinstance(winner, Player) else winner,
+        "message": game.message,
+        "lastMove": {"x": last_move.x, "y": last_move.y, "player": last_move.player.value} if last_move else None,
+        "gameType": game.game_type.value,
+        "boardSize": game.board_size,
+        "validMoves": [[x, y] for x, y in game.get_valid_moves_for_current_player()],
+    }
+    _state_cache[game] = (game.version, state)
+    return state
+
+def build_history_slice(game: AbstractGame, start: int, end: Optional[int] = None) -> HistorySlice:
+    """History snapshots for plies [start, end), clamped to the recorded history."""
+    length = len(game.history)
+    start = max(0, min(start, length))
+    end = length if end is None else max(start, min(end, length))
+    return HistorySlice(
+        gameId=game.game_id,
+        start=start,
+        historyLength=length,
+        history=build_board_grids(game.history[start:end])
+    )
+
+def load_game_state(game: AbstractGame, state: GameState) -> None:
+    """Load game state from a GameState object."""
+    last_move = state.last_move
+    history: List[Grid] = [board_grid.grid for board_grid in state.history]
+    game.load_position(
+        grid=state.grid,
+        history=history,
+        current_player=state.current_player,
+        is_game_over=state.is_game_over,
+        winner=state.winner,
+        message=state.message,
+        last_move=MoveRecord(x=last_move.x, y=last_move.y, player=last_move.player) if last_move else None,
+        prisoners=state.prisoners,
+    )
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Callable, Dict, Optional
+
+from board_battle_project.backend.game.base import AbstractGame
+
+RECHECK_INTERVAL = 1.0 # Seconds between version checks while waiting (catches changes nobody notified)
+
+def state_key(game: AbstractGame) -> str:
+    """
+    Identifies a game state: the game instance (a rematch replaces it under the same id, and
+    its version starts over) plus its version. Uses instance_id rather than id(game), which
+    CPython hands out again once the old game is freed.
+    """
+    return f"{game.instance_id:x}.{game.version}"
+
+class StateWatch:
+    """
+    Lets long-poll and SSE readers sleep until a game's state (state_key) changes.
+    Code that changes a game calls notify(game_id); waiters also re-check the version every
+    RECHECK_INTERVAL, so a missed notify only delays them instead of hanging them.
+    """
+    def __init__(self):
+        self._events: Dict[str, asyncio.Event] = {}
+        self._waiters: Dict[asyncio.Event, int] = {} # Readers waiting on each event; the last one out removes it
+
+    def notify(self, game_id: str) -> None:
+        """Wake everyone waiting on the game."""
+        event = self._events.pop(game_id, None)
+        if event:
+            event.set()
+
+    async def wait_for_change(self, get_game: Callable[[], Optional[AbstractGame]], since: str,
+                              timeout: float) -> Optional[AbstractGame]:
+        """
+        Wait until the game's state_key differs from `since` or `timeout` seconds pass.
+        Returns the game (changed or not), or None once it no longer exists.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            game = get_game()
+            if game is None or state_key(game) != since:
+                return game
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return game
+            event = self._events.setdefault(game.game_id, asyncio.Event())
+            self._waiters[event] = self._waiters.get(event, 0) + 1
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, RECHECK_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._leave(game.game_id, event)
+
+    def _leave(self, game_id: str, event: asyncio.Event) -> None:
+        waiters = self._waiters[event] - 1
+        if waiters:
+            self._waiters[event] = waiters
+            return
+        del self._waiters[event]
+        if self._events.get(game_id) is event: # Not notified yet: nobody needs it any more
+            del self._events[game_id]
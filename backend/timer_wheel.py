@@ -0,0 +1,155 @@
+"""
+Hierarchical timer wheel: every timeout of the server (game clocks, reconnect grace periods)
+runs off one asyncio task instead of one task or sleep per room.
+
+Time is counted in ticks of TICK seconds. Level 0 has SLOTS slots of one tick each; every
+further level has SLOTS slots that each span a whole revolution of the level below:
+
+  level 0   SLOTS ticks                        (64 x 0.1 s  =  6.4 s)
+  level 1   SLOTS ** 2 ticks                   (             ~ 6.8 min)
+  level 2   SLOTS ** 3 ticks                   (             ~ 7.3 h)
+  level 3   SLOTS ** 4 ticks, and anything longer
+
+A timer goes into the lowest level that covers its delay. When level 0 completes a
+revolution, the next slot of level 1 is emptied and its timers are placed again (now in
+level 0), and so on upwards. Scheduling and cancelling are O(1); each tick only touches the
+timers that are due. Timers fire at most one tick late.
+
+The task starts with the first timer and stops when none are left, like the WS heartbeat.
+"""
+import asyncio
+import inspect
+import math
+import time
+from typing import Any, Callable, List, Optional, Set
+
+TICK = 0.1 # Seconds
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+LEVELS = 4
+
+class Timer:
+    """Handle of a scheduled callback. Cancel it with cancel()."""
+    __slots__ = ("wheel", "expires", "callback", "args", "slot")
+
+    def __init__(self, wheel: "TimerWheel", expires: int, callback: Callable[..., Any], args: tuple):
+        self.wheel = wheel
+        self.expires = expires # Tick it is due at
+        self.callback = callback
+        self.args = args
+        self.slot: Optional[Set["Timer"]] = None # Slot it waits in; None once fired or cancelled
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self) -> bool:
+        """Returns False if the timer already fired or was cancelled."""
+        if self.slot is None:
+            return False
+        self.slot.discard(self)
+        self.slot = None
+        self.wheel.count -= 1
+        return True
+
+    def remaining(self) -> float:
+        """Seconds until the timer is due (0 if it fired or was cancelled)."""
+        if self.slot is None:
+            return 0.0
+        return max(0.0, self.wheel.origin + self.expires * self.wheel.tick - time.monotonic())
+
+class TimerWheel:
+    def __init__(self, tick: float = TICK):
+        self.tick = tick
+        self.wheels: List[List[Set[Timer]]] = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.ticks = 0 # Ticks processed so far
+        self.origin = time.monotonic() # Time of tick 0
+        self.count = 0 # Timers waiting
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: Set[asyncio.Task] = set() # Running awaitable callbacks (referenced so they are not collected)
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """
+        Call callback(*args) after `delay` seconds. It is called from the wheel's task; if it
+        returns an awaitable, that runs as a task of its own, so a slow callback never delays
+        other timers.
+        """
+        if not self.count and (self._task is None or self._task.done()):
+            self._catch_up() # Idle wheel: skip the ticks that passed while nothing was scheduled
+        due = math.ceil((time.monotonic() + max(0.0, delay) - self.origin) / self.tick)
+        timer = Timer(self, max(due, self.ticks + 1), callback, args)
+        self._place(timer)
+        self.count += 1
+        self._ensure_task()
+        return timer
+
+    def _catch_up(self):
+        self.ticks = max(self.ticks, int((time.monotonic() - self.origin) / self.tick))
+
+    def _place(self, timer: Timer):
+        delay = timer.expires - self.ticks
+        level = 0
+        while level < LEVELS - 1 and delay >= SLOTS ** (level + 1):
+            level += 1
+        # Timers beyond the top level wait in its furthest slot and are placed again from there
+        expires = min(timer.expires, self.ticks + SLOTS ** LEVELS - 1)
+        timer.slot = self.wheels[level][(expires >> (SLOT_BITS * level)) & (SLOTS - 1)]
+        timer.slot.add(timer)
+
+    def _advance(self) -> List[Timer]:
+        """Process one tick. Returns the timers that are due."""
+        self.ticks += 1
+        # On a revolution of level 0 empty the next slot of level 1, and so on upwards (highest first)
+        level = 1
+        while level < LEVELS and self.ticks % (SLOTS ** level) == 0:
+            level += 1
+        for cascade in range(level - 1, 0, -1):
+            slot = self.wheels[cascade][(self.ticks >> (SLOT_BITS * cascade)) & (SLOTS - 1)]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._place(timer)
+
+        slot = self.wheels[0][self.ticks & (SLOTS - 1)]
+        due = []
+        for timer in list(slot):
+            if timer.expires <= self.ticks:
+                slot.discard(timer)
+                timer.slot = None
+                self.count -= 1
+                due.append(timer)
+        return due
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """The single task behind every timer."""
+        while self.count:
+            next_tick = self.origin + (self.ticks + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            # Process every tick that has passed (the loop may have been busy)
+            while self.count and self.origin + (self.ticks + 1) * self.tick <= time.monotonic():
+                for timer in self._advance():
+                    self._fire(timer)
+        self._task = None # Restarted by the next schedule
+
+    def _fire(self, timer: Timer):
+        try:
+            result = timer.callback(*timer.args)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._callbacks.add(task)
+                task.add_done_callback(lambda task, timer=timer: self._callback_done(task, timer))
+        except Exception as e:
+            self._report(timer, e)
+
+    def _callback_done(self, task: asyncio.Task, timer: Timer):
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._report(timer, task.exception())
+
+    @staticmethod
+    def _report(timer: Timer, e: BaseException):
+        print(f"Timers: Error in timer callback {getattr(timer.callback, '__name__', timer.callback)}: {e}")
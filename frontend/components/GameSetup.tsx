@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { GameType, GameConfig, AILevel, Player } from '../types';
-import { MIN_BOARD_SIZE, MAX_BOARD_SIZE, DEFAULT_BOARD_SIZE, GAME_DESCRIPTIONS } from '../constants';
+import { MIN_BOARD_SIZE, MAX_BOARD_SIZE, MAX_GOMOKU_BOARD_SIZE, DEFAULT_BOARD_SIZE, GAME_DESCRIPTIONS } from '../constants';
 import { Settings, Play } from 'lucide-react';
 
 interface GameSetupProps {
@@ -126,7 +126,7 @@ export const GameSetup: React.FC<GameSetupProps> = ({ onStartGame, isFirstLoad,
             <input
               type="range"
               min={MIN_BOARD_SIZE}
-              max={MAX_BOARD_SIZE}
+              max={gameType === GameType.GOMOKU ? MAX_GOMOKU_BOARD_SIZE : MAX_BOARD_SIZE}
               value={boardSize}
               onChange={(e) => setBoardSize(Number(e.target.value))}
               className={`w-full h-2 rounded-lg appearance-none cursor-pointer accent-teal-500 ${
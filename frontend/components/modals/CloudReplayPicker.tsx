@@ -14,17 +14,29 @@ export const CloudReplayPicker: React.FC<CloudReplayPickerProps> = ({ isOpen, on
     const [loading, setLoading] = useState(false);
 
     useEffect(() => {
-        if (isOpen) {
-            setLoading(true);
-            ReplayService.fetchMyReplays().then(res => {
+        if (!isOpen) return;
+        let cancelled = false;
+        setLoading(true);
+        // Walk every page (nextCursor) so older saves stay reachable
+        const loadAll = async () => {
+            const liveReplays: MatchInfo[] = [];
+            let cursor: string | undefined;
+            do {
+                const res = await ReplayService.fetchMyReplays(cursor, 200);
                 // Filter for saves that are likely continuable (no result or SAVED status if we exposed status)
                 // Since backend returns MatchInfo which has 'result', we can check if result is null or "SAVED" (if mapped)
                 // The backend `save_replay` sets result=None if live.
-                const liveReplays = res.matches.filter(r => !r.result || r.result === 'null'); 
-                setReplays(liveReplays);
-                setLoading(false);
-            }).catch(() => setLoading(false));
-        }
+                liveReplays.push(...res.matches.filter(r => !r.result || r.result === 'null'));
+                cursor = res.nextCursor || undefined;
+            } while (cursor && !cancelled);
+            return liveReplays;
+        };
+        loadAll().then(liveReplays => {
+            if (cancelled) return;
+            setReplays(liveReplays);
+            setLoading(false);
+        }).catch(() => { if (!cancelled) setLoading(false); });
+        return () => { cancelled = true; };
     }, [isOpen]);
 
     if (!isOpen) return null;
@@ -119,6 +119,8 @@ const GamePage: React.FC = () => {
                   setStatusMessage("Game Started!");
               } else if (data.type === 'GAME_STATE') {
                   setGameState(data.state);
+              } else if (data.type === 'PING') {
+                  socket.send(JSON.stringify({ action: 'PONG' })); // Heartbeat, or the server drops us as idle
               } else if (data.type === 'ERROR') {
                   setGameState(prev => ({...prev, message: `Error: ${data.message}`}));
               }
@@ -206,10 +208,20 @@ const GamePage: React.FC = () => {
   };
 
   // Save/Load Handlers
-  const performLocalSave = () => {
+  // Server states leave out history, so fetch the full state before saving
+  const fetchFullState = async (): Promise<GameState> => {
+      try {
+          return await gameService.getFullState(isOnline ? routeGameId : undefined);
+      } catch (e) {
+          console.warn("[GamePage] Could not fetch full history, saving current state only", e);
+          return gameState;
+      }
+  };
+
+  const performLocalSave = async () => {
       const savedData = {
           config,
-          state: gameState,
+          state: await fetchFullState(),
           timestamp: Date.now(),
       };
       const blob = new Blob([JSON.stringify(savedData, null, 2)], { type: 'application/json' });
@@ -226,7 +238,7 @@ const GamePage: React.FC = () => {
 
   const performCloudSave = async () => {
       try {
-          await ReplayService.saveReplay(config, gameState, { 
+          await ReplayService.saveReplay(config, await fetchFullState(), { 
               black_is_ai: config.playerBlackIsAI,
               white_is_ai: config.playerWhiteIsAI,
               // ... levels
@@ -416,8 +428,9 @@ const GamePage: React.FC = () => {
       return null;
   }, [roomSession, currentUserId]);
 
-  const canUndo = (!isOnline && gameState.history.length > 0) || 
-                  (isOnline && !!myColor && gameState.currentPlayer !== myColor && gameState.history.length > 0);
+  const historyLength = gameState.historyLength ?? gameState.history.length;
+  const canUndo = (!isOnline && historyLength > 0) || 
+                  (isOnline && !!myColor && gameState.currentPlayer !== myColor && historyLength > 0);
 
   return (
     <div className="min-h-screen bg-slate-900 flex flex-col items-center justify-center p-4 md:p-8 font-sans relative">
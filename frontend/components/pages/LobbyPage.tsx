@@ -1,19 +1,36 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { AuthService, ReplayService, RoomService, getGameService } from '../../services/api';
-import { UserCreate, MatchInfo, GameConfig } from '../../types';
+import { AuthService, LeaderboardService, ReplayService, RoomService, getGameService } from '../../services/api';
+import { UserCreate, MatchInfo, GameConfig, GameType, LeaderboardEntry } from '../../types';
 import { LogOut, Play, History, Trophy, Users, Plus, Trash2 } from 'lucide-react'; // Added Trash2
 import { GameSetup } from '../GameSetup';
+import { DEFAULT_BOARD_SIZE } from '../../constants';
+
+// WebSocket URL of a backend path on the current host
+const wsUrl = (path: string) => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const host = window.location.hostname || 'localhost';
+    const port = window.location.port ? `:${window.location.port}` : '';
+    return `${protocol}//${host}${port}${path}`;
+};
 
 const LobbyPage: React.FC = () => {
   const navigate = useNavigate();
   const [currentUser, setCurrentUser] = useState<UserCreate | null>(null);
   const [replays, setReplays] = useState<MatchInfo[]>([]);
+  const [replayCursor, setReplayCursor] = useState<string | null>(null);
+  const [loadingReplays, setLoadingReplays] = useState(false);
   const [rooms, setRooms] = useState<MatchInfo[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [showSetup, setShowSetup] = useState(false);
   const [setupMode, setSetupMode] = useState<'online' | 'practice'>('practice');
+  const [leaderboardType, setLeaderboardType] = useState<GameType>(GameType.GOMOKU);
+  const [leaders, setLeaders] = useState<LeaderboardEntry[]>([]);
+  const [myRank, setMyRank] = useState<LeaderboardEntry | null>(null);
+  const [quickMatchType, setQuickMatchType] = useState<GameType>(GameType.GOMOKU);
+  const [searching, setSearching] = useState(false);
+  const matchSocket = useRef<WebSocket | null>(null);
 
   useEffect(() => {
     const fetchUserData = async () => {
@@ -31,6 +48,7 @@ const LobbyPage: React.FC = () => {
         ]);
         
         setReplays(fetchedReplays.matches);
+        setReplayCursor(fetchedReplays.nextCursor || null);
         setRooms(fetchedRooms.matches);
       } catch (err: any) {
         setError(err.message || "Failed to fetch data.");
@@ -44,20 +62,87 @@ const LobbyPage: React.FC = () => {
     // Initial fetch
     fetchUserData();
 
-    // Set up interval for refreshing rooms
-    const roomRefreshInterval = setInterval(async () => {
-        try {
-            const fetchedRooms = await RoomService.fetchRooms();
-            setRooms(fetchedRooms.matches);
-        } catch (err) {
-            console.error("Failed to refresh rooms:", err);
+    // Room list updates are pushed over the lobby WebSocket; polling is only the fallback
+    let roomRefreshInterval: ReturnType<typeof setInterval> | null = null;
+    const startPolling = () => {
+        if (roomRefreshInterval) return;
+        roomRefreshInterval = setInterval(async () => {
+            try {
+                const fetchedRooms = await RoomService.fetchRooms();
+                setRooms(fetchedRooms.matches);
+            } catch (err) {
+                console.error("Failed to refresh rooms:", err);
+            }
+        }, 5000); // Refresh every 5 seconds
+    };
+
+    const lobbySocket = new WebSocket(wsUrl('/ws/lobby'));
+    lobbySocket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'LOBBY_SNAPSHOT') {
+            setRooms(data.rooms);
+        } else if (data.type === 'LOBBY_UPDATE') {
+            setRooms(prev => {
+                const others = prev.filter(room => room.id !== data.room.id);
+                return data.op === 'removed' ? others : [data.room, ...others];
+            });
+        } else if (data.type === 'PING') {
+            lobbySocket.send(JSON.stringify({ action: 'PONG' }));
         }
-    }, 5000); // Refresh every 5 seconds
+    };
+    lobbySocket.onclose = () => startPolling();
 
-    // Cleanup interval on component unmount
-    return () => clearInterval(roomRefreshInterval);
+    // Cleanup socket and interval on component unmount
+    return () => {
+        lobbySocket.onclose = null;
+        lobbySocket.close();
+        if (roomRefreshInterval) clearInterval(roomRefreshInterval);
+    };
   }, [navigate]);
 
+  useEffect(() => {
+    if (!currentUser) return;
+    LeaderboardService.fetchLeaderboard(leaderboardType)
+        .then(board => setLeaders(board.entries))
+        .catch(err => console.error("Failed to load leaderboard:", err));
+    if (currentUser.id !== undefined) {
+        LeaderboardService.fetchEntry(leaderboardType, currentUser.id)
+            .then(setMyRank)
+            .catch(() => setMyRank(null)); // No rated games of this type yet
+    }
+  }, [currentUser, leaderboardType]);
+
+  // Leave the matchmaking queue when leaving the page
+  useEffect(() => () => matchSocket.current?.close(), []);
+
+  const handleQuickMatch = () => {
+      const token = AuthService.getToken();
+      if (!token || matchSocket.current) return;
+      const boardSize = quickMatchType === GameType.REVERSI ? 8 : DEFAULT_BOARD_SIZE;
+      const socket = new WebSocket(wsUrl(`/ws/matchmaking?token=${token}&gameType=${quickMatchType}&boardSize=${boardSize}`));
+      socket.onmessage = (event) => {
+          const data = JSON.parse(event.data);
+          if (data.type === 'MATCH_FOUND') {
+              socket.close();
+              navigate(`/game/${data.roomId}`);
+          } else if (data.type === 'ERROR') {
+              setError(data.message);
+          } else if (data.type === 'PING') {
+              socket.send(JSON.stringify({ action: 'PONG' }));
+          }
+      };
+      socket.onclose = () => {
+          matchSocket.current = null;
+          setSearching(false);
+      };
+      matchSocket.current = socket;
+      setSearching(true);
+  };
+
+  const handleCancelQuickMatch = () => {
+      matchSocket.current?.send(JSON.stringify({ action: 'CANCEL' })); // The server closes the socket
+  };
+
   const handleLogout = () => {
     AuthService.removeToken();
     navigate('/login');
@@ -90,6 +175,20 @@ const LobbyPage: React.FC = () => {
       }
   };
 
+  const handleLoadMoreReplays = async () => {
+      if (!replayCursor || loadingReplays) return;
+      setLoadingReplays(true);
+      try {
+          const page = await ReplayService.fetchMyReplays(replayCursor);
+          setReplays(prev => [...prev, ...page.matches]);
+          setReplayCursor(page.nextCursor || null);
+      } catch (err: any) {
+          setError("Failed to load replays: " + err.message);
+      } finally {
+          setLoadingReplays(false);
+      }
+  };
+
   const handleDeleteReplay = async (e: React.MouseEvent, matchId: number) => {
       e.stopPropagation(); // Prevent navigation
       if (!window.confirm("Are you sure you want to delete this replay?")) return;
@@ -167,6 +266,38 @@ const LobbyPage: React.FC = () => {
                 </button>
             </div>
 
+            {/* Quick Match */}
+            <div className="flex items-center gap-4 bg-slate-800 rounded-xl px-6 py-4 shadow-lg border border-slate-700">
+                <Trophy className="w-6 h-6 text-amber-400" />
+                <span className="font-bold">Quick Match</span>
+                <select
+                    value={quickMatchType}
+                    onChange={(e) => setQuickMatchType(e.target.value as GameType)}
+                    disabled={searching}
+                    className="bg-slate-700 text-slate-200 text-sm rounded-lg px-2 py-1 border border-slate-600"
+                >
+                    {Object.values(GameType).map((type) => <option key={type} value={type}>{type}</option>)}
+                </select>
+                {searching ? (
+                    <>
+                        <span className="text-sm text-slate-400 animate-pulse">Searching for an opponent...</span>
+                        <button
+                            onClick={handleCancelQuickMatch}
+                            className="ml-auto px-4 py-2 bg-slate-700 hover:bg-slate-600 text-slate-200 text-sm rounded-lg transition-colors"
+                        >
+                            Cancel
+                        </button>
+                    </>
+                ) : (
+                    <button
+                        onClick={handleQuickMatch}
+                        className="ml-auto px-4 py-2 bg-teal-600 hover:bg-teal-500 text-white text-sm font-bold rounded-lg shadow-md transition-all"
+                    >
+                        Find Opponent
+                    </button>
+                )}
+            </div>
+
             {/* Room List */}
             <div className="bg-slate-800 rounded-xl p-6 shadow-lg border border-slate-700 min-h-[400px]">
                 <h2 className="text-xl font-serif font-bold mb-6 flex items-center gap-2 pb-4 border-b border-slate-700">
@@ -220,6 +351,38 @@ const LobbyPage: React.FC = () => {
                 </div>
             </div>
 
+            {/* Leaderboard */}
+            <div className="bg-slate-800 rounded-xl p-6 shadow-lg border border-slate-700">
+                <h2 className="text-lg font-serif font-bold mb-4 flex items-center gap-2 text-slate-200">
+                    <Trophy className="w-5 h-5 text-amber-400" /> Leaderboard
+                </h2>
+                <div className="flex gap-2 mb-4">
+                    {Object.values(GameType).map((type) => (
+                        <button
+                            key={type}
+                            onClick={() => setLeaderboardType(type)}
+                            className={`text-xs px-2 py-1 rounded transition-colors ${type === leaderboardType ? 'bg-teal-700 text-white' : 'bg-slate-700/50 text-slate-400 hover:text-slate-200'}`}
+                        >
+                            {type}
+                        </button>
+                    ))}
+                </div>
+                <ol className="space-y-1 text-sm">
+                    {leaders.map((entry) => (
+                        <li key={entry.userId} className={`flex justify-between px-2 py-1 rounded ${entry.userId === currentUser?.id ? 'bg-teal-900/40' : ''}`}>
+                            <span className="text-slate-300"><span className="text-slate-500 mr-2">{entry.rank}.</span>{entry.username}</span>
+                            <span className="font-mono text-slate-200">{Math.round(entry.rating)}</span>
+                        </li>
+                    ))}
+                    {leaders.length === 0 && <p className="text-sm text-slate-500 italic">No rated games yet.</p>}
+                </ol>
+                {myRank && (
+                    <div className="mt-3 pt-3 border-t border-slate-700 text-xs text-slate-400">
+                        Your rank: <span className="text-teal-400 font-bold">#{myRank.rank}</span> ({Math.round(myRank.rating)}, {myRank.wins}W {myRank.losses}L {myRank.draws}D)
+                    </div>
+                )}
+            </div>
+
             {/* Replays */}
             <div className="bg-slate-800 rounded-xl p-6 shadow-lg border border-slate-700 flex-1">
                 <h2 className="text-lg font-serif font-bold mb-4 flex items-center gap-2 text-slate-200">
@@ -253,6 +416,17 @@ const LobbyPage: React.FC = () => {
                     </li>
                 ))}
                 {replays.length === 0 && <p className="text-sm text-slate-500 italic">No replays yet.</p>}
+                {replayCursor && (
+                    <li>
+                        <button
+                            onClick={handleLoadMoreReplays}
+                            disabled={loadingReplays}
+                            className="w-full text-sm text-slate-400 hover:text-slate-200 py-2 rounded-lg hover:bg-slate-700/50 transition-colors disabled:opacity-50"
+                        >
+                            {loadingReplays ? 'Loading...' : 'Load more'}
+                        </button>
+                    </li>
+                )}
                 </ul>
             </div>
         </div>
@@ -41,27 +41,29 @@ const ReplayPage: React.FC = () => {
                 return;
             }
             try {
-                const data = await ReplayService.fetchReplayById(Number(replayId));
-                setMatchInfo(data);
-                
-                // Handle new movesJson structure (dict with history) vs old (array)
-                let moves: any[] = [];
-                if (Array.isArray(data.movesJson)) {
-                    moves = data.movesJson;
-                } else if (data.movesJson && Array.isArray(data.movesJson.history)) {
-                    moves = data.movesJson.history;
-                }
-
-                // Initialize playback game state with first board state
-                if (moves.length > 0) {
-                    const initialBoardState = moves[0];
-                    setPlaybackGameState({
-                        ...INITIAL_REPLAY_GAME_STATE,
-                        grid: initialBoardState.grid,
-                        gameType: data.gameType,
-                        boardSize: initialBoardState.grid.length,
-                    });
-                }
+                // Frames are streamed, so playback can start before the whole history has arrived
+                const history: { grid: BoardGrid }[] = [];
+                await ReplayService.streamReplay(
+                    Number(replayId),
+                    (header) => {
+                        setMatchInfo({ ...header, movesJson: { ...header.movesJson, history: [] } });
+                        setLoading(false);
+                    },
+                    (frames) => {
+                        // Initialize playback game state with first board state
+                        if (history.length === 0) {
+                            setPlaybackGameState(prev => ({
+                                ...INITIAL_REPLAY_GAME_STATE,
+                                grid: frames[0].grid,
+                                gameType: prev.gameType,
+                                boardSize: frames[0].grid.length,
+                            }));
+                        }
+                        for (const frame of frames) history.push({ grid: frame.grid });
+                        const received = history.slice();
+                        setMatchInfo(prev => prev ? { ...prev, movesJson: { ...prev.movesJson, history: received } } : prev);
+                    }
+                );
             } catch (err: any) {
                 setError(err.message || "Failed to load replay.");
             } finally {
@@ -2,6 +2,7 @@ import { GameType } from './types';
 
 export const MIN_BOARD_SIZE = 8;
 export const MAX_BOARD_SIZE = 19;
+export const MAX_GOMOKU_BOARD_SIZE = 50; // Large Gomoku boards use the sparse backend board
 export const DEFAULT_BOARD_SIZE = 15; // Good middle ground for both
 
 export const DIRECTIONS = [
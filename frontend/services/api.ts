@@ -1,6 +1,7 @@
 import { 
   IGameService, GameConfig, GameState, MoveResult, Player, SavedGame,
-  UserCreate, UserLogin, Token, MatchInfo, MatchListResponse
+  UserCreate, UserLogin, Token, MatchInfo, MatchListResponse,
+  ReplayStreamHeader, ReplayFrame, ReplayPosition, GameType, LeaderboardEntry, LeaderboardResponse
 } from '../types';
 import { LocalGameService } from './localGame';
 
@@ -11,6 +12,7 @@ const GAME_API_URL = `${API_BASE_URL}/game`;
 const AUTH_API_URL = `${API_BASE_URL}/auth`;
 const REPLAY_API_URL = `${API_BASE_URL}/replays`;
 const ROOMS_API_URL = `${API_BASE_URL}/rooms`;
+const LEADERBOARD_API_URL = `${API_BASE_URL}/leaderboard`;
 
 let authToken: string | null = null; // Store token in memory
 
@@ -125,15 +127,75 @@ export class RoomService {
     }
 }
 
+export class LeaderboardService {
+    static async fetchLeaderboard(gameType: GameType, limit: number = 10): Promise<LeaderboardResponse> {
+        return apiFetch<LeaderboardResponse>(`${LEADERBOARD_API_URL}/${gameType}?limit=${limit}`, 'GET');
+    }
+
+    // A player's rating and rank; rejects (404) if they have no rated games of this type
+    static async fetchEntry(gameType: GameType, userId: number): Promise<LeaderboardEntry> {
+        return apiFetch<LeaderboardEntry>(`${LEADERBOARD_API_URL}/${gameType}/users/${userId}`, 'GET');
+    }
+}
+
 export class ReplayService {
-    static async fetchMyReplays(): Promise<MatchListResponse> {
-        return apiFetch<MatchListResponse>(`${REPLAY_API_URL}/me`, 'GET', null, true);
+    // One page of the user's replays, newest first; pass the previous page's nextCursor for more
+    static async fetchMyReplays(cursor?: string, limit?: number): Promise<MatchListResponse> {
+        const params = new URLSearchParams();
+        if (cursor) params.set('cursor', cursor);
+        if (limit) params.set('limit', String(limit));
+        const query = params.toString();
+        return apiFetch<MatchListResponse>(`${REPLAY_API_URL}/me${query ? `?${query}` : ''}`, 'GET', null, true);
     }
 
     static async fetchReplayById(matchId: number): Promise<MatchInfo> {
         return apiFetch<MatchInfo>(`${REPLAY_API_URL}/${matchId}`, 'GET', null, true);
     }
 
+    // Reads the NDJSON replay stream: onHeader once, then onFrames for each batch of frames as it arrives
+    static async streamReplay(
+        matchId: number,
+        onHeader: (header: ReplayStreamHeader) => void,
+        onFrames: (frames: ReplayFrame[]) => void
+    ): Promise<void> {
+        const token = AuthService.getToken();
+        if (!token) {
+            throw new Error("Authentication token not found.");
+        }
+        const res = await fetch(`${REPLAY_API_URL}/${matchId}/stream`, {
+            headers: { 'Authorization': `Bearer ${token}` },
+        });
+        if (!res.ok || !res.body) {
+            const data = await res.json().catch(() => ({}));
+            throw new Error(data.detail || `API request failed with status ${res.status}`);
+        }
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            buffered += done ? decoder.decode() : decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = done ? '' : lines.pop() || ''; // Keep a partial last line for the next read
+            const frames: ReplayFrame[] = [];
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const message = JSON.parse(line);
+                if (message.type === 'REPLAY_HEADER') onHeader(message);
+                else if (message.type === 'REPLAY_FRAME') frames.push(message);
+            }
+            if (frames.length > 0) onFrames(frames);
+            if (done) break;
+        }
+    }
+
+    // Board at one ply (the final position if omitted), without loading the rest of the replay
+    static async fetchReplayPosition(matchId: number, ply?: number): Promise<ReplayPosition> {
+        const query = ply === undefined ? '' : `?ply=${ply}`;
+        return apiFetch<ReplayPosition>(`${REPLAY_API_URL}/${matchId}/position${query}`, 'GET', null, true);
+    }
+
     static async deleteReplay(matchId: number): Promise<void> {
         return apiFetch<void>(`${REPLAY_API_URL}/${matchId}`, 'DELETE', null, true);
     }
@@ -219,6 +281,13 @@ export class RemoteGameService implements IGameService {
       if (!this.currentState) throw new Error("Game not initialized");
       return this.currentState;
   }
+
+  async getFullState(gameId?: string): Promise<GameState> {
+    const id = gameId || this.gameId;
+    if (!id) throw new Error("No game started");
+    // Regular responses leave history out; ask for it explicitly
+    return apiFetch<GameState>(`${GAME_API_URL}/${id}/state?include_history=true`, 'GET', null, true);
+  }
 }
 
 // Factory to get the appropriate service
@@ -42,6 +42,10 @@ export class LocalGameService implements IGameService {
     return { ...this.state };
   }
 
+  async getFullState(): Promise<GameState> {
+    return { ...this.state };
+  }
+
   async makeMove(x: number, y: number): Promise<MoveResult> {
     if (this.state.isGameOver) return { success: false, error: "Game is over" };
     if (this.state.grid[y][x] !== null) return { success: false, error: "Occupied" };
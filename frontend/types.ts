@@ -27,13 +27,35 @@ export interface GameConfig {
   aiLevel: AILevel; // Default/Legacy
   blackAILevel?: AILevel;
   whiteAILevel?: AILevel;
+  timeControl?: TimeControl; // Only used when both players are human
+}
+
+export interface TimeControl {
+  mainTime: number; // Seconds
+  increment: number; // Seconds added after each move made in main time
+  byoyomiPeriods: number;
+  byoyomiTime: number; // Seconds per byo-yomi period
+}
+
+export interface PlayerClock {
+  mainTime: number;
+  periods: number;
+  periodTime: number;
+}
+
+// Sent with GAME_STATE / GAME_DELTA of timed games; count the running clock down from it
+export interface ClockState {
+  black: PlayerClock;
+  white: PlayerClock;
+  running: Player | null;
 }
 
 export interface GameState {
   gameId: string;
   grid: BoardGrid;
   currentPlayer: Player;
-  history: BoardGrid[]; 
+  history: BoardGrid[]; // Empty unless requested (see IGameService.getFullState)
+  historyLength?: number;
   prisoners: {
     [Player.BLACK]: number;
     [Player.WHITE]: number;
@@ -67,6 +89,7 @@ export interface IGameService {
   resign(currentPlayer: Player): Promise<GameState>;
   loadGame(savedGame: SavedGame): Promise<GameState>;
   getGameState(): GameState;
+  getFullState(gameId?: string): Promise<GameState>; // Including the full history, e.g. for saving
 }
 
 export interface UserCreate {
@@ -98,8 +121,44 @@ export interface MatchInfo {
   movesJson: any;
 }
 
+// First line of /api/replays/{id}/stream, followed by one ReplayFrame per ply
+export interface ReplayStreamHeader extends MatchInfo {
+  plyCount: number;
+  boardSize: number;
+}
+
+export interface ReplayFrame {
+  ply: number;
+  grid: BoardGrid;
+}
+
+export interface ReplayPosition extends ReplayFrame {
+  id: number;
+  plyCount: number;
+  boardSize: number;
+}
+
 export interface MatchListResponse {
   matches: MatchInfo[];
+  nextCursor?: string | null; // Set when there is another page
+}
+
+export interface LeaderboardEntry {
+  rank: number; // Players with equal ratings share a rank
+  userId: number;
+  username: string;
+  gameType: GameType;
+  rating: number;
+  games: number;
+  wins: number;
+  losses: number;
+  draws: number;
+}
+
+export interface LeaderboardResponse {
+  gameType: GameType;
+  entries: LeaderboardEntry[];
+  totalPlayers: number;
 }
 
 export interface RoomSession {
@@ -110,4 +169,5 @@ export interface RoomSession {
   white_ready: boolean;
   config: GameConfig;
   swap_request_from?: number; // Added
+  away_player_ids?: number[]; // Disconnected players whose seat is held (reconnect grace)
 }